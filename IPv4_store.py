@@ -0,0 +1,434 @@
+import array
+import bisect
+import socket
+import struct
+import sys
+
+IPv4_struct = struct.Struct("!I")
+
+def IPv4_to_int(IP):
+
+	"""
+	Function which convert an IPv4 to its 32 bits integer.
+
+		Parameters:
+			IP (str): IPv4, for example : "127.0.0.1"
+
+		Returns:
+			int: integer of the IPv4, for example : 2130706433
+	"""
+
+	return IPv4_struct.unpack(socket.inet_pton(socket.AF_INET, IP))[0]
+
+def int_to_IPv4(address):
+
+	"""
+	Function which convert a 32 bits integer to its IPv4.
+
+		Parameters:
+			address (int): integer of the IPv4, for example : 2130706433
+
+		Returns:
+			str: IPv4, for example : "127.0.0.1"
+	"""
+
+	return socket.inet_ntoa(IPv4_struct.pack(address))
+
+def CIDR_to_range(block):
+
+	"""
+	Function which convert a CIDR block to the integers of its first and last IPv4, an IPv4 without prefix is a /32.
+
+		Parameters:
+			block (str): CIDR block, for example : "10.0.0.0/30"
+
+		Returns:
+			int: integer of the first IPv4, for example : 167772160
+			int: integer of the last IPv4, for example : 167772163
+
+		Raises:
+			OSError: the IPv4 of the block is invalid (an IPv6 for example)
+			ValueError: the prefix of the block isn't between 0 and 32
+	"""
+
+	IP, _, prefix = block.partition("/")
+	if not 0 <= int(prefix or 32) <= 32:
+		raise ValueError("invalid prefix of the CIDR block {0}".format(block))
+	block_size = 1 << (32 - int(prefix or 32))
+	first_address = IPv4_to_int(IP) & ~(block_size - 1)
+	return first_address, first_address + block_size - 1
+
+def range_to_CIDR(first_address, last_address, max_size = 1 << 32):
+
+	"""
+	Generator which split a range of IPv4 in the fewest CIDR blocks.
+
+		Parameters:
+			first_address (int): integer of the first IPv4 of the range
+			last_address (int): integer of the last IPv4 of the range
+			max_size (int): maximum number of IPv4 of a block, for example : 65536 for a /16
+
+		Yields:
+			str: CIDR block, for example : "10.0.0.0/30"
+			int: number of IPv4 of the block, for example : 4
+	"""
+
+	while first_address <= last_address:
+		# Largest block aligned on the first IPv4 which doesn't go beyond the last one nor the maximum size
+		block_size = first_address & -first_address if first_address > 0 else 1 << 32
+		while block_size > last_address - first_address + 1 or block_size > max_size:
+			block_size >>= 1
+		yield "{0}/{1}".format(int_to_IPv4(first_address), 33 - block_size.bit_length()), block_size
+		first_address += block_size
+
+class IPv4ScoreStore:
+
+	"""
+	Compact store of IPv4 and their score.
+	IPv4 are kept as 32 bits integers in a sorted array, with their score at the same index in a second array, so an entry costs 8 bytes instead of a string key and a dict.
+	Set operations between two stores (difference, intersection, join) are done in a single merge pass over the sorted arrays.
+
+	The store trades CPU for memory : the conversions between IPv4 and integers, the sorts and the merge passes make its operations several times slower than the same ones on a dict of strings.
+	Only the sort of the pending entries is a bulk operation (see sort_arrays()), the merge passes stay loops over the entries : a temporary set or dict of integers to replace them
+	isn't faster in CPython and would cost the memory this store saves.
+
+	New entries are appended to pending arrays and sorted with the others on the next read, the last score added for an IPv4 wins.
+
+		Attributes:
+			addresses (array.array): sorted integers of the IPv4
+			scores (array.array): score of each IPv4
+			updated_at (str): last update date of the IPv4 added ("" if unknown), for example : "2023-03-01T12:00:00.000Z"
+	"""
+
+	def __init__(self, IPs = None):
+
+		"""
+			Parameters:
+				IPs (dict): IPv4 and their score to add in the store, for example : {"127.0.0.1": 50}
+		"""
+
+		self.addresses = array.array('I')
+		self.scores = array.array('i')
+		self.updated_at = ""
+		self.pending_addresses = array.array('I')
+		self.pending_scores = array.array('i')
+
+		if IPs is not None:
+			for IP, score in IPs.items():
+				self.add(IP, score)
+
+	@classmethod
+	def from_arrays(cls, addresses, scores, updated_at = ""):
+
+		"""
+		Function which create a store from arrays which are already sorted and without duplicates.
+		"""
+
+		IPs_store = cls()
+		IPs_store.addresses = addresses
+		IPs_store.scores = scores
+		IPs_store.updated_at = updated_at
+		return IPs_store
+
+	@classmethod
+	def from_CIDR(cls, blocks):
+
+		"""
+		Function which create a store with every IPv4 of CIDR blocks, with the score of their block.
+
+			Parameters:
+				blocks (dict): CIDR blocks and their score, for example : {"10.0.0.0/30": 80}
+		"""
+
+		IPs_store = cls()
+		for block, score in blocks.items():
+			first_address, last_address = CIDR_to_range(block)
+			IPs_store.pending_addresses.extend(range(first_address, last_address + 1))
+			IPs_store.pending_scores.extend([int(score)] * (last_address - first_address + 1))
+		return IPs_store
+
+	def add(self, IP, score, updated_at = ""):
+
+		"""
+		Function which add an IPv4 in the store (its score is replaced if it is already in the store).
+
+			Parameters:
+				IP (str): IPv4, for example : "127.0.0.1"
+				score (int or str): score of the IPv4, for example : 50
+				updated_at (str): last update date of the IPv4 ("" if unknown)
+
+			Returns:
+				bool: True if the IPv4 is added, False if it isn't a valid IPv4 (like a CIDR range)
+		"""
+
+		try:
+			address = IPv4_to_int(IP)
+		except (OSError, TypeError):
+			return False
+
+		self.pending_addresses.append(address)
+		self.pending_scores.append(int(score))
+
+		if updated_at and updated_at > self.updated_at:
+			self.updated_at = updated_at
+
+		return True
+
+	def finalize(self):
+
+		"""
+		Function which sort the pending entries and merge them in the sorted arrays, it is called before each read.
+		"""
+
+		if len(self.pending_addresses) == 0:
+			return
+
+		# A dict of the pending entries keeps the last score of a duplicated IPv4, then they are sorted in a single sort of integers
+		pending_IPs = dict(zip(self.pending_addresses, self.pending_scores))
+		pending_addresses, pending_scores = sort_arrays(array.array('I', pending_IPs.keys()), array.array('i', pending_IPs.values()))
+		del pending_IPs
+
+		self.pending_addresses = array.array('I')
+		self.pending_scores = array.array('i')
+
+		# Merge the pending entries with the sorted ones, pending scores win
+		if len(self.addresses) == 0:
+			self.addresses, self.scores = pending_addresses, pending_scores
+		else:
+			self.addresses, self.scores = merge_arrays(self.addresses, self.scores, pending_addresses, pending_scores, "union")
+
+	def __len__(self):
+		self.finalize()
+		return len(self.addresses)
+
+	def __contains__(self, IP):
+		return self.get(IP) is not None
+
+	def __iter__(self):
+		return self.keys()
+
+	def get(self, IP, default = None):
+
+		"""
+		Function which returns the score of an IPv4, or default if the IPv4 isn't in the store.
+		"""
+
+		self.finalize()
+		try:
+			address = IPv4_to_int(IP)
+		except (OSError, TypeError):
+			return default
+		index = bisect.bisect_left(self.addresses, address)
+		if index < len(self.addresses) and self.addresses[index] == address:
+			return self.scores[index]
+		return default
+
+	def keys(self):
+
+		"""
+		Generator which yields the IPv4 of the store in ascending order.
+		"""
+
+		self.finalize()
+		yield from map(int_to_IPv4, self.addresses)
+
+	def items(self):
+
+		"""
+		Generator which yields the IPv4 of the store and their score in ascending order, for example : ("127.0.0.1", 50)
+		"""
+
+		self.finalize()
+		yield from zip(map(int_to_IPv4, self.addresses), self.scores)
+
+	def ranges(self):
+
+		"""
+		Generator which yields the runs of contiguous IPv4 with the same score in ascending order.
+
+			Yields:
+				int: integer of the first IPv4 of the run
+				int: integer of the last IPv4 of the run
+				int: score of the IPv4 of the run
+		"""
+
+		self.finalize()
+		if len(self.addresses) == 0:
+			return
+
+		first_address, last_address, last_score = self.addresses[0], self.addresses[0], self.scores[0]
+		for address, score in zip(self.addresses, self.scores):
+			if address == last_address + 1 and score == last_score:
+				last_address = address
+			elif address != first_address:
+				yield first_address, last_address, last_score
+				first_address, last_address, last_score = address, address, score
+		yield first_address, last_address, last_score
+
+	def aggregate(self, min_size, max_size = 1 << 32):
+
+		"""
+		Function which split the store in CIDR blocks of contiguous IPv4 with the same score and the IPv4 left apart.
+		Each run of IPv4 (see ranges()) is split in the fewest CIDR blocks, the blocks smaller than min_size are left as single IPv4.
+
+			Parameters:
+				min_size (int): minimum number of IPv4 of a block, for example : 16 for a /28
+				max_size (int): maximum number of IPv4 of a block, the larger runs are split in several blocks
+
+			Returns:
+				dict: CIDR blocks and their score, for example : {"10.0.0.0/28": 80}
+				IPv4ScoreStore: IPv4 which aren't in a block, with their score
+		"""
+
+		blocks = {}
+		addresses = array.array('I')
+		scores = array.array('i')
+
+		for first_address, last_address, score in self.ranges():
+			for block, block_size in range_to_CIDR(first_address, last_address, max_size):
+				if block_size >= min_size:
+					blocks[block] = score
+				else:
+					block_address = CIDR_to_range(block)[0]
+					addresses.extend(range(block_address, block_address + block_size))
+					scores.extend([score] * block_size)
+
+		return blocks, IPv4ScoreStore.from_arrays(addresses, scores, self.updated_at)
+
+	def update(self, other):
+
+		"""
+		Function which add all the entries of another store, the scores of the other store win.
+		"""
+
+		self.finalize()
+		other.finalize()
+		self.addresses, self.scores = merge_arrays(self.addresses, self.scores, other.addresses, other.scores, "union")
+		self.updated_at = max(self.updated_at, other.updated_at)
+
+	def difference(self, other):
+
+		"""
+		Function which returns a new store with the entries of this store whose IPv4 isn't in the other store.
+		"""
+
+		self.finalize()
+		other.finalize()
+		return IPv4ScoreStore.from_arrays(*merge_arrays(self.addresses, self.scores, other.addresses, other.scores, "difference"))
+
+	def intersection(self, other):
+
+		"""
+		Function which returns a new store with the entries of this store whose IPv4 is in the other store (with the scores of this store).
+		"""
+
+		self.finalize()
+		other.finalize()
+		return IPv4ScoreStore.from_arrays(*merge_arrays(self.addresses, self.scores, other.addresses, other.scores, "intersection"))
+
+	def join(self, other, outer = False):
+
+		"""
+		Generator which walks this store and the other one together in a single merge pass.
+
+			Parameters:
+				other (IPv4ScoreStore): store joined with this one
+				outer (bool): also yields the IPv4 of this store which aren't in the other one (with None as other score)
+
+			Yields:
+				str: IPv4
+				int: score of the IPv4 in this store
+				int: score of the IPv4 in the other store (None if it isn't in the other store)
+		"""
+
+		self.finalize()
+		other.finalize()
+		other_index = 0
+		other_count = len(other.addresses)
+		for address, score in zip(self.addresses, self.scores):
+			# Skip the IPv4 of the other store which are lower than the current one
+			while other_index < other_count and other.addresses[other_index] < address:
+				other_index += 1
+			if other_index < other_count and other.addresses[other_index] == address:
+				yield int_to_IPv4(address), score, other.scores[other_index]
+			elif outer:
+				yield int_to_IPv4(address), score, None
+
+def sort_arrays(addresses, scores):
+
+	"""
+	Function which sort arrays of IPv4 (with their scores) with a single sort of integers.
+	Each entry is packed in a 64 bits integer, its IPv4 in the high half and the bits of its score in the low half, so the sort orders the IPv4 and carries their score.
+
+		Parameters:
+			addresses, scores (array.array): arrays in any order, without duplicated IPv4
+
+		Returns:
+			array.array: sorted addresses
+			array.array: scores of the addresses
+	"""
+
+	# Interleave the IPv4 and the bits of the scores in an array of 32 bits integers, read again as 64 bits integers
+	high, low = (1, 0) if sys.byteorder == "little" else (0, 1)
+	entries = array.array('I', bytes(8 * len(addresses)))
+	entries[high::2] = addresses
+	entries[low::2] = array.array('I', scores.tobytes())
+	packed = array.array('Q')
+	packed.frombytes(entries.tobytes())
+
+	packed = array.array('Q', sorted(packed))
+	entries = array.array('I')
+	entries.frombytes(packed.tobytes())
+	return entries[high::2], array.array('i', entries[low::2].tobytes())
+
+def merge_arrays(addresses_a, scores_a, addresses_b, scores_b, operation):
+
+	"""
+	Function which merge two sorted arrays of IPv4 (with their scores) in a single pass.
+
+		Parameters:
+			addresses_a, scores_a (array.array): first sorted arrays
+			addresses_b, scores_b (array.array): second sorted arrays
+			operation (str): "union" (scores of b win), "difference" (entries of a not in b) or "intersection" (entries of a in b)
+
+		Returns:
+			array.array: sorted addresses of the result
+			array.array: scores of the result
+	"""
+
+	addresses = array.array('I')
+	scores = array.array('i')
+	index_a, index_b = 0, 0
+	count_a, count_b = len(addresses_a), len(addresses_b)
+
+	while index_a < count_a and index_b < count_b:
+		address_a, address_b = addresses_a[index_a], addresses_b[index_b]
+		if address_a < address_b:
+			if operation != "intersection":
+				addresses.append(address_a)
+				scores.append(scores_a[index_a])
+			index_a += 1
+		elif address_a > address_b:
+			if operation == "union":
+				addresses.append(address_b)
+				scores.append(scores_b[index_b])
+			index_b += 1
+		else:
+			if operation == "union":
+				addresses.append(address_b)
+				scores.append(scores_b[index_b])
+			elif operation == "intersection":
+				addresses.append(address_a)
+				scores.append(scores_a[index_a])
+			index_a += 1
+			index_b += 1
+
+	# Add what remains of the arrays regarding the operation
+	if operation != "intersection":
+		addresses.extend(addresses_a[index_a:])
+		scores.extend(scores_a[index_a:])
+	if operation == "union":
+		addresses.extend(addresses_b[index_b:])
+		scores.extend(scores_b[index_b:])
+
+	return addresses, scores
@@ -1,442 +1,2197 @@
 from importlib import util
 import argparse
+import json
+import logging
+import sys
+import threading
 
-DEBUG = "INFO"
+# Logger of the script, its level and its output are set by configure_logging() (see the verbosity arguments)
+logger = logging.getLogger("OpenCTI_QRadar")
+
+# Logging levels of the pprint() levels and of the verbosity arguments
+LOG_LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "ERROR": logging.ERROR, "ERRORONLY": logging.ERROR, "": logging.CRITICAL + 1}
+
+# Progress bars are hidden when the script runs without output
+PROGRESS_BARS = True
+
+# Persistent HTTP sessions shared by all the requests, one per API (see get_HTTP_session())
+HTTP_sessions = {}
+HTTP_sessions_lock = threading.Lock()
+
+# Rate limiter of each API session, created with the session (see send_request())
+HTTP_rate_limiters = {}
+
+# CIDR blocks written in the QRadar reference sets with their score, by set (see read_CIDR_index())
+CIDR_index = {}
+CIDR_index_lock = threading.Lock()
 
 argument_parser = argparse.ArgumentParser()
 verbosity_group = argument_parser.add_mutually_exclusive_group()
 verbosity_group.add_argument("-v", "--verbosity", type=str, choices=["DEBUG", "INFO", "ERRORONLY"], default="INFO", help="increase output verbosity")
 verbosity_group.add_argument("-q", "--quiet", action="store_true", help="run script without output")
 argument_parser.add_argument("-d", "--ndays", type=int, default=1, help="specify number of days to request (0 < ndays < 7)")
+argument_parser.add_argument("--plan-only", action="store_true", help="display the synchronization plans without writing anything in QRadar")
+argument_parser.add_argument("-i", "--incremental", action="store_true", help="request only IPv4 updated since the last successful run (ndays is used on the first run)")
+argument_parser.add_argument("-s", "--stream", action="store_true", help="upload OpenCTI pages in QRadar while they are retrieved")
+argument_parser.add_argument("--daemon", action="store_true", help="keep running after the synchronization and apply the events of the OpenCTI live stream in QRadar")
+argument_parser.add_argument("-c", "--checkpoint", action="store_true", help="journal the OpenCTI pages retrieved, so a run stopped by an error is resumed by the next one")
+argument_parser.add_argument("-p", "--partitions", type=int, default=None, help="split the OpenCTI request in time windows retrieved concurrently (variables.OpenCTI_partitions by default)")
+argument_parser.add_argument("--metrics-file", type=str, default=None, help="write the durations, counters and API latencies of the run in this file")
+argument_parser.add_argument("--metrics-format", type=str, choices=["json", "prometheus"], default="json", help="format of the metrics file (JSON run summary or Prometheus textfile)")
+argument_parser.add_argument("--log-format", type=str, choices=["text", "json"], default="text", help="output the messages as text or as one JSON object per line")
+
+class LazyMessage:
+
+	"""
+	Message of a log record which is only formatted when the record is emitted, so the messages of a disabled level cost nothing.
+
+		Attributes:
+			string (str): template of the message, formatted with str.format() if there are arguments
+			args (tuple): arguments of the template
+			center (str): character used to center the message on 100 columns (None to keep it as is)
+	"""
+
+	def __init__(self, string, args, center = None):
+		self.string = string
+		self.args = args
+		self.center = center
+
+	def text(self):
+		return self.string.format(*self.args) if self.args else self.string
+
+	def __str__(self):
+		if self.center is None:
+			return self.text()
+		return self.text().center(100, self.center)
+
+class JSONLogFormatter(logging.Formatter):
+
+	"""
+	Formatter which output a log record as a JSON object on one line, without the banner characters, for example :
+	{"time": "2023-03-01T12:00:00", "level": "INFO", "function": "main", "message": "Retrieval of IPv4 in QRadar : Success"}
+	"""
+
+	def format(self, record):
+		JSON_record = {
+			"time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+			"level": record.levelname,
+			"function": record.funcName,
+			"message": (record.msg.text() if isinstance(record.msg, LazyMessage) else record.getMessage()).strip()
+		}
+		if isinstance(record.msg, LazyMessage) and record.msg.args:
+			JSON_record["args"] = [arg if isinstance(arg, (int, float, bool)) else str(arg) for arg in record.msg.args]
+		return json.dumps(JSON_record)
+
+def configure_logging(verbosity = "INFO", log_format = "text"):
+
+	"""
+	Function which set the level and the output of the logger of the script.
+
+		Parameters:
+			verbosity (str): level of the messages displayed ("DEBUG", "INFO", "ERRORONLY", or "" to run without output)
+			log_format (str): "text" to print the messages as they are, "json" to print one JSON object per message
+	"""
+
+	global PROGRESS_BARS
+
+	logger.setLevel(LOG_LEVELS[verbosity])
+	logger.propagate = False
+
+	# Replace the handler of a previous configuration
+	for log_handler in list(logger.handlers):
+		logger.removeHandler(log_handler)
+
+	log_handler = logging.StreamHandler(sys.stdout)
+	log_handler.setFormatter(JSONLogFormatter() if log_format == "json" else logging.Formatter("%(message)s"))
+	logger.addHandler(log_handler)
+
+	PROGRESS_BARS = verbosity != ""
+
+def pprint(string, level, *args, center = None):
+
+	"""
+	Function which log a message, the message is only formatted if its level is displayed.
+
+		Parameters:
+			string (str): message, or template of the message formatted with args, for example : " Number of IPv4 retrieve : {0} "
+			level (str): level of the message ("DEBUG", "INFO" or "ERROR")
+			*args: arguments of the template
+			center (str): character used to center the message on 100 columns, for example : "="
+	"""
+
+	if logger.isEnabledFor(LOG_LEVELS[level]):
+		logger.log(LOG_LEVELS[level], LazyMessage(string, args, center), stacklevel=2)
+
+configure_logging()
+
+def get_HTTP_session(endpoint):
+
+	"""
+	Function which returns the persistent HTTP session of an API, the session is created on the first call and then shared by all the requests.
+	It keeps connections alive in a pool so each request doesn't pay a new TCP and TLS handshake, and it carries the authentication headers of the API.
+
+		Parameters:
+			endpoint (str): API of the session ("OpenCTI", "QRadar" for the default console or "QRadar <console>" for a console of variables.QRadar_instances)
+
+		Returns:
+			requests.Session: session configured for the API
+	"""
+
+	with HTTP_sessions_lock:
+
+		# Return the session if it is already created
+		if endpoint in HTTP_sessions:
+			return HTTP_sessions[endpoint]
+
+		HTTP_session = requests.Session()
+
+		# Mount an adapter with a connection pool sized for the number of parallel requests
+		HTTP_adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=variables.HTTP_pool_size)
+		HTTP_session.mount("https://", HTTP_adapter)
+		HTTP_session.mount("http://", HTTP_adapter)
+
+		# Record the status, the sizes and the latency of every response of the session in the run metrics
+		HTTP_session.hooks["response"].append(lambda HTTP_response, *args, **kwargs: record_HTTP_response(endpoint, HTTP_response))
+
+		# If/Else to configure headers of the API (with their TOKEN)
+		if endpoint == "OpenCTI":
+			HTTP_session.headers.update({'Authorization': 'Bearer {0}'.format(secrets.OpenCTI_TOKEN)})
+			# Ask OpenCTI for gzip compressed responses, they are decompressed by requests
+			HTTP_session.headers.update({'Accept-Encoding': 'gzip' if variables.OpenCTI_compression else 'identity'})
+		else:
+			# The token of the other QRadar consoles is the variable of secrets.py named in variables.QRadar_instances
+			QRadar_token = secrets.QRadar_TOKEN if endpoint == "QRadar" else getattr(secrets, variables.QRadar_instances[endpoint[len("QRadar "):]]["token"])
+			# QRadar is requested without SSL, so we ignore SSL Warning
+			urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+			HTTP_session.verify = False
+			HTTP_session.headers.update({
+			    'SEC':'{0}'.format(QRadar_token),
+			    'Content-Type':'application/json',
+			    'accept':'application/json'
+			})
+
+		# Each API (and each QRadar console) has its own rate and its own number of requests in flight, bounded by the connection pool
+		HTTP_rate_limiters[endpoint] = AdaptiveRateLimiter(variables.HTTP_rate_limits.get(endpoint.split(" ")[0]), variables.HTTP_rate_burst, variables.HTTP_pool_size, variables.HTTP_latency_target)
+
+		# The session carries the name of its API and its rate limiter, so send_request() doesn't have to look for them while sessions are created by other threads
+		HTTP_session.endpoint = endpoint
+		HTTP_session.rate_limiter = HTTP_rate_limiters[endpoint]
+
+		HTTP_sessions[endpoint] = HTTP_session
+
+	return HTTP_session
+
+def get_QRadar_API(QRadar_instance = "default"):
+
+	"""
+	Function which returns the session and the URL of a QRadar console.
+	The "default" console is the one of variables.QRadar_URL and secrets.QRadar_TOKEN, the other ones are configured in variables.QRadar_instances.
+
+		Parameters:
+			QRadar_instance (str): name of the console ("default" or a key of variables.QRadar_instances)
+
+		Returns:
+			requests.Session: session of the console (see get_HTTP_session())
+			str: URL of the API of the console, for example : "https://192.168.1.174/api/{0}"
+	"""
+
+	if QRadar_instance == "default":
+		return get_HTTP_session("QRadar"), variables.QRadar_URL
+	return get_HTTP_session("QRadar " + QRadar_instance), variables.QRadar_instances[QRadar_instance]["URL"]
+
+def record_HTTP_response(endpoint, HTTP_response):
+
+	"""
+	Function which record an API response in the run metrics, it is called by the sessions for every response (see get_HTTP_session()).
+	The latency measured by requests stops at the response headers, so the download of the body is added to it.
+	The size received is the size on the network, before the decompression of the compressed responses.
+	The body of the OpenCTI live stream never ends, so only its status is recorded (see iterate_OpenCTI_stream()).
+
+		Parameters:
+			endpoint (str): API of the session ("OpenCTI", "QRadar" or "QRadar <console>")
+			HTTP_response (requests.Response): response received
+	"""
+
+	if HTTP_response.headers.get("Content-Type", "").startswith("text/event-stream"):
+		run_metrics.increment("requests_total", api=endpoint, method=HTTP_response.request.method, status=HTTP_response.status_code)
+		return
+
+	download_start = time.perf_counter()
+	HTTP_response_size = len(HTTP_response.content)
+	HTTP_request_duration = HTTP_response.elapsed.total_seconds() + time.perf_counter() - download_start
+
+	# The raw response counts the bytes read on the network (not available with every transport)
+	try:
+		HTTP_response_size = HTTP_response.raw.tell() or HTTP_response_size
+	except (AttributeError, OSError):
+		pass
+
+	HTTP_request_method = HTTP_response.request.method
+	HTTP_request_body = HTTP_response.request.body or b""
+
+	run_metrics.increment("requests_total", api=endpoint, method=HTTP_request_method, status=HTTP_response.status_code)
+	run_metrics.increment("request_sent_bytes_total", len(HTTP_request_body), api=endpoint, method=HTTP_request_method)
+	run_metrics.increment("request_received_bytes_total", HTTP_response_size, api=endpoint, method=HTTP_request_method)
+	run_metrics.observe("request_duration_seconds", HTTP_request_duration, api=endpoint, method=HTTP_request_method)
+
+def get_retry_after(HTTP_response):
+
+	"""
+	Function which returns the delay asked by the Retry-After header of a response, in seconds or as a date.
+
+		Parameters:
+			HTTP_response (requests.Response): response received
+
+		Returns:
+			float: delay in seconds before the next request (None if the response has no valid Retry-After header)
+	"""
+
+	HTTP_retry_after = HTTP_response.headers.get("Retry-After")
+	if HTTP_retry_after is None:
+		return None
+
+	try:
+		return max(0, float(HTTP_retry_after))
+	except ValueError:
+		pass
+
+	try:
+		return max(0, (email.utils.parsedate_to_datetime(HTTP_retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+	except (TypeError, ValueError):
+		return None
+
+def send_request(session, method, URL, retries = 0, **kwargs):
+
+	"""
+	Function which send a request through an API session and retry it when it fails with an error which can be temporary (connection error, timeout, error code 429 or 5xx).
+	The request waits for the rate limiter of the API first (see get_HTTP_session()), and its outcome adapts the number of requests in flight.
+	The retries wait with an exponential backoff and a random jitter, so the workers don't retry all at the same time, or the delay of the Retry-After header of the API.
+
+		Parameters:
+			session (requests.Session): session of the API (see get_HTTP_session())
+			method (str): HTTP method of the request ("GET", "POST", "DELETE")
+			URL (str): URL requested
+			retries (int): number of retries after the first attempt
+			**kwargs: parameters passed to the request (params, data, json, headers)
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			str: description of the last error ("" if execution is successful)
+			requests.Response: last response received (None if there is none)
+	"""
+
+	HTTP_request_error = ""
+	HTTP_request = None
+	HTTP_retry_after = None
+
+	# Name of the API of the session used by the run metrics, and its rate limiter (a session which isn't created by get_HTTP_session() has none)
+	endpoint = getattr(session, "endpoint", "")
+	HTTP_rate_limiter = getattr(session, "rate_limiter", None)
+
+	# Loop over the first attempt and the retries
+	for HTTP_request_attempt in range(retries + 1):
+		if HTTP_request_attempt > 0:
+			run_metrics.increment("request_retries_total", api=endpoint, method=method)
+			# Wait half of the backoff at least, and a random part of the other half
+			HTTP_backoff = min(variables.HTTP_backoff_max, variables.HTTP_backoff_base * 2 ** (HTTP_request_attempt - 1))
+			HTTP_backoff = HTTP_backoff / 2 + random.uniform(0, HTTP_backoff / 2)
+			if HTTP_retry_after is not None:
+				HTTP_backoff = min(variables.HTTP_backoff_max, HTTP_retry_after)
+			run_metrics.increment("request_backoff_seconds_total", HTTP_backoff, api=endpoint, method=method)
+			time.sleep(HTTP_backoff)
+
+		if HTTP_rate_limiter is not None:
+			run_metrics.increment("request_throttled_seconds_total", HTTP_rate_limiter.acquire(), api=endpoint, method=method)
+		HTTP_request_start = time.perf_counter()
+		HTTP_retry_after = None
+
+		try:
+			HTTP_request = session.request(method, URL, timeout=variables.HTTP_timeout, **kwargs)
+		except requests.exceptions.RequestException as error:
+			if HTTP_rate_limiter is not None:
+				HTTP_rate_limiter.release(time.perf_counter() - HTTP_request_start, congested = True)
+			HTTP_request_error = "exception : {0}".format(type(error).__name__)
+			run_metrics.increment("request_errors_total", api=endpoint, method=method, error=type(error).__name__)
+			pprint(""" Request : Failed (attempt {0}/{1}) | {2} """, "DEBUG", HTTP_request_attempt + 1, retries + 1, HTTP_request_error)
+			continue
+
+		# An API which is overloaded answers with 429 or 5xx
+		HTTP_request_congested = HTTP_request.status_code == 429 or HTTP_request.status_code >= 500
+		if HTTP_rate_limiter is not None:
+			HTTP_rate_limiter.release(time.perf_counter() - HTTP_request_start, congested = HTTP_request_congested)
+
+		if HTTP_request.status_code == 200:
+			return True, "", HTTP_request
+
+		HTTP_request_error = "error code : {0}".format(HTTP_request.status_code)
+		pprint(""" Request : Failed (attempt {0}/{1}) | {2} """, "DEBUG", HTTP_request_attempt + 1, retries + 1, HTTP_request_error)
+		pprint("{0}", "DEBUG", HTTP_request.text)
+
+		# Other client errors (like 404 when the entry doesn't exist) won't change with a retry
+		if not HTTP_request_congested:
+			break
+
+		# The delay asked by the API pauses all the requests of the API, not only this one
+		HTTP_retry_after = get_retry_after(HTTP_request)
+		if HTTP_retry_after is not None and HTTP_rate_limiter is not None:
+			HTTP_rate_limiter.pause(min(variables.HTTP_backoff_max, HTTP_retry_after))
+
+	return False, HTTP_request_error, HTTP_request
+
+def execute_concurrently(function, arguments, max_workers):
+
+	"""
+	Generator which calls a function on every argument with a bounded pool of threads.
+	Only a few calls are submitted in advance of the workers, so even a long list of arguments doesn't create all its tasks at once.
+
+		Parameters:
+			function (function): function called with one argument
+			arguments (iterable): arguments of the calls
+			max_workers (int): number of calls executed at the same time
+
+		Yields:
+			object: argument of the call
+			object: value returned by the call
+	"""
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+		futures = {}
+		for argument in arguments:
+			# Wait for a call to complete before submitting a new one when enough calls are pending
+			if len(futures) >= max_workers * 2:
+				done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					yield futures.pop(future), future.result()
+			futures[executor.submit(function, argument)] = argument
+
+		# Yield the remaining calls as soon as they complete
+		for future in concurrent.futures.as_completed(futures):
+			yield futures[future], future.result()
+
+def split_in_chunks(iterable, chunk_size):
+
+	"""
+	Generator which split an iterable in lists of at most chunk_size elements.
+
+		Parameters:
+			iterable (iterable): elements to split
+			chunk_size (int): maximum number of elements per chunk
+
+		Yields:
+			list: next chunk of elements
+	"""
+
+	iterator = iter(iterable)
+	chunk = list(itertools.islice(iterator, chunk_size))
+	while chunk:
+		yield chunk
+		chunk = list(itertools.islice(iterator, chunk_size))
+
+def put_until_stopped(bounded_queue, element, stop):
+
+	"""
+	Function which put an element in a bounded queue, waiting for a free place unless a stop event is set.
+	The producers use it so a consumer which stops reading the queue doesn't block them forever.
+
+		Parameters:
+			bounded_queue (queue.Queue): queue of the producer
+			element (object): element put in the queue
+			stop (threading.Event): event set when the consumer asks to stop
+
+		Returns:
+			bool: True if the element has been put in the queue, False if the consumer asked to stop.
+	"""
+
+	# Check the stop event every second while the queue is full
+	while not stop.is_set():
+		try:
+			bounded_queue.put(element, timeout=1)
+			return True
+		except queue.Full:
+			continue
+	return False
+
+def iterate_OpenCTI_pages(flag = "", filters = "[]", page_size = None, profile = None, observable_type = "IPv4-Addr"):
+
+	"""
+	Generator which walks the OpenCTI pagination of an IPv4 request, one page at a time.
+	It doesn't keep any page in memory, each page is yielded as soon as it is received.
+	Only the fields of the query profile are requested, and globalCount is only requested on the first page.
+	When the run is journaled (see CheckpointJournal), each page is recorded, and the pages retrieved by an interrupted attempt are replayed before the pagination continues after their last cursor.
+
+		Parameters:
+			flag (str): cursor from which the pagination starts ("" for the first page).
+			filters (str): filters you want to apply to your request. Please the the OpenCTI GraphQL documentation if you want to know how.
+			page_size (int): number of observables requested per page (variables.OpenCTI_page_size by default)
+			profile (str): fields of the observables requested, "sync" or "full" (variables.query_profile by default, see variables.query_profiles)
+			observable_type (str): OpenCTI type of the observables requested, for example : "IPv4-Addr", "Domain-Name"
+
+		Yields:
+			bool: True if the page has been retrieved successfully, False otherwise (the generator stops after a failure).
+			dict: "stixCyberObservables" part of the API response :
+				{
+					"pageInfo": {str: ...},			"globalCount" is only in the first page
+					"edges": [{"node": {str: ...}}]
+				}
+	"""
+
+	if page_size is None:
+		page_size = variables.OpenCTI_page_size
+	if profile is None:
+		profile = variables.query_profile
+
+	OpenCTI_request_fields = variables.query_profiles[profile]
+	OpenCTI_request_first_page_fields = variables.query_IPv4_first_page_fields
+	OpenCTI_request_types = json.dumps([observable_type])
+
+	# Replay the pages of the request retrieved by an interrupted attempt of the run, and continue after the last one
+	OpenCTI_request_key = run_checkpoint.request_key(observable_type, filters, profile)
+	for OpenCTI_request_page in run_checkpoint.pages(OpenCTI_request_key):
+		yield True, OpenCTI_request_page
+		if not OpenCTI_request_page["pageInfo"]["hasNextPage"]:
+			return
+		flag = OpenCTI_request_page["pageInfo"]["endCursor"]
+		OpenCTI_request_first_page_fields = ""
+
+	# Display debug information before the first page
+	pprint(""" URL requested : {0} """, "DEBUG", variables.OpenCTI_URL, center='-')
+	pprint(""" Query of the request : """, "DEBUG", center='-')
+	pprint(variables.query_IPv4, "DEBUG", flag, filters, page_size, OpenCTI_request_first_page_fields, OpenCTI_request_fields, OpenCTI_request_types)
+
+	# Loop over the pages while the API tells us there is a next one
+	while True:
+
+		# Configure parameters of the post request, the next pages don't request globalCount again
+		OpenCTI_request_URL = variables.OpenCTI_URL
+		OpenCTI_request_query = {'query': variables.query_IPv4.format(flag, filters, page_size, OpenCTI_request_first_page_fields, OpenCTI_request_fields, OpenCTI_request_types)}
+		OpenCTI_request_first_page_fields = ""
+		OpenCTI_request_execution, OpenCTI_request_error, OpenCTI_request = send_request(get_HTTP_session("OpenCTI"), "POST", OpenCTI_request_URL, variables.OpenCTI_retries, json=OpenCTI_request_query)
+
+		# If/Else regarding the status of the request, the temporary errors have already been retried
+		if not OpenCTI_request_execution:
+			pprint(""" Request : Failed | {0} """, "ERROR", OpenCTI_request_error, center='!')
+			if OpenCTI_request is not None:
+				pprint("{0}", "ERROR", OpenCTI_request.text)
+			yield False, {}
+			return
+
+		# Converting request response to json format
+		OpenCTI_request_json = json.loads(OpenCTI_request.text)
+
+		# Catch regarding the API response (you can have an http 200 but the API returns errors)
+		try:
+			OpenCTI_request_json_error_message = OpenCTI_request_json["errors"][0]["message"]
+			OpenCTI_request_json_error_code = OpenCTI_request_json["errors"][0]["data"]["http_status"]
+		except KeyError:
+			pass
+		else:
+			pprint(""" Request : Failed | error code : {0} """, "ERROR", OpenCTI_request_json_error_code, center='!')
+			pprint("{0}", "ERROR", OpenCTI_request_json_error_message)
+			yield False, {}
+			return
+
+
+		"""
+		Response format example :
+		"data": {
+		    "stixCyberObservables": {
+		      "pageInfo": {
+		        "startCursor": <str>,
+		        "endCursor": <str>,
+		        "hasNextPage": <bool>,
+		        "hasPreviousPage": <bool>,
+		        "globalCount": <int>
+		      },
+		      "edges": [
+		        {
+		          "node": {
+		            "id": <str>,
+		            "entity_type": <str>,
+		            "created_at": <str>,
+		            "updated_at": <str>,
+		            "observable_value": <str>,
+		            "x_opencti_score": <int>,
+		            "creator": {
+		              "entity_type": <str>,
+		              "name": <str>
+		            },
+		            "objectLabel": {
+		              "edges": [
+		                {
+		                  "node": {
+		                    "value": <str>
+		                  }
+		                }
+		              ]
+		            }
+		          }
+		        }
+		      ]
+		    }
+		  }
+		}
+		"""
+
+
+		# Retrieve macro datas of the response and eventuals errors
+		try :
+			OpenCTI_request_page = OpenCTI_request_json["data"]["stixCyberObservables"]
+			OpenCTI_request_hasNextPage = OpenCTI_request_page["pageInfo"]["hasNextPage"]
+			OpenCTI_request_endCursor = OpenCTI_request_page["pageInfo"]["endCursor"]
+		except (KeyError, TypeError) as error:
+			pprint(""" Cannot find the key : {0} """, "ERROR", error, center='!')
+			yield False, {}
+			return
+
+		run_metrics.increment("pages_total", api="OpenCTI")
+		run_checkpoint.record_page(OpenCTI_request_key, flag, OpenCTI_request_page)
+		yield True, OpenCTI_request_page
+
+		# Stop at the last page, otherwise set the flag parameter for the next one
+		if not OpenCTI_request_hasNextPage:
+			return
+		flag = OpenCTI_request_endCursor
+
+def merge_OpenCTI_page(OpenCTI_page, IPs):
+
+	"""
+	Function which add the observables of an OpenCTI page in a store.
+	Observables which can't be stored (like a CIDR range in an IPv4 store) are skipped.
+
+		Parameters:
+			OpenCTI_page (dict): "stixCyberObservables" part of the API response (see iterate_OpenCTI_pages())
+			IPs (IPv4ScoreStore or ObservableScoreStore): store in which the observables are added (see get_OpenCTI_IPv4())
+
+		Returns:
+			int: number of observables of the page
+	"""
+
+	# Loop into the results of this page
+	for OpenCTI_edge in OpenCTI_page["edges"]:
+		IP_score = OpenCTI_edge["node"]["x_opencti_score"]
+
+		# Sometimes you don't have score for an IP, you can set a fix value like 50
+		if IP_score is None:
+			IP_score = 50
+
+		# Add the IP in the aggregate store with its score and its last update date
+		if not IPs.add(OpenCTI_edge["node"]["observable_value"], IP_score, OpenCTI_edge["node"]["updated_at"]):
+			pprint(""" Observable skipped, it can't be stored : {0} """, "DEBUG", OpenCTI_edge["node"]["observable_value"])
+
+	run_metrics.increment("IPv4_retrieved_total", len(OpenCTI_page["edges"]), api="OpenCTI")
+
+	return len(OpenCTI_page["edges"])
+
+def get_OpenCTI_IPv4(flag = "", filters = "[]", IPs = None, progress_bar = None, page_size = None, observable_type = "IPv4-Addr"):
+
+	"""
+	Function which retrieve IPv4 information in OpenCTI.
+	Pages are walked iteratively and every observable is merged in place into a single compact store, so the memory used stays proportional to the number of IPv4 retrieved.
+
+		Parameters:
+			flag (str): cursor from which the pagination starts ("" for the first page).
+			filters (str): filters you want to apply to your request. Please the the OpenCTI GraphQL documentation if you want to know how.
+			IPs (IPv4ScoreStore): store in which the results are merged (a new one is created if None).
+			progress_bar (tqdm): progress bar display during the retrieval of datas (a new one is created if None)
+			page_size (int): number of observables requested per page (variables.OpenCTI_page_size by default)
+			observable_type (str): OpenCTI type of the observables requested, the IPv4 are kept in an IPv4ScoreStore and the other types in an ObservableScoreStore
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: datas get from OpenCTI, the IPv4 and their score, with the last update date of the IPv4 in IPs.updated_at
+				for example :
+				"127.0.0.1": 50
+	"""
+
+	if IPs is None:
+		IPs = new_score_store(observable_type)
+
+	# Number of observables announced by the API, number of observables received and number of pages walked
+	OpenCTI_request_globalCount = 0
+	OpenCTI_request_elementsCount = 0
+	OpenCTI_request_pagesCount = 0
+
+	# The progress bar is only closed at the end if it is created by this call
+	progress_bar_owned = progress_bar is None
+
+	# Loop into the pages returned by the generator
+	for OpenCTI_page_execution, OpenCTI_page in iterate_OpenCTI_pages(flag, filters, page_size, observable_type = observable_type):
+
+		if not OpenCTI_page_execution:
+			if progress_bar_owned and progress_bar is not None:
+				progress_bar.close()
+			return False, IPs
+
+		# Use the global count of the first page to init the progress bar
+		if OpenCTI_request_pagesCount == 0:
+			OpenCTI_request_globalCount = OpenCTI_page["pageInfo"]["globalCount"]
+			pprint(""" Number of IPv4 retrieve : {0} """, "DEBUG", OpenCTI_request_globalCount, center='-')
+			if progress_bar_owned:
+				progress_bar = tqdm(total=OpenCTI_request_globalCount, disable=not PROGRESS_BARS)
+		OpenCTI_request_pagesCount += 1
+
+		# Add the results of this page in the aggregate store
+		OpenCTI_request_elementsCount += merge_OpenCTI_page(OpenCTI_page, IPs)
+
+		# Update the progress bar with the elements of the page
+		progress_bar.update(len(OpenCTI_page["edges"]))
+
+	if progress_bar_owned and progress_bar is not None:
+		progress_bar.close()
+
+	# For the boolean returns value, we check if the number of observables received is the same as the number return in the API response
+	return (OpenCTI_request_elementsCount == OpenCTI_request_globalCount), IPs
+
+def partition_OpenCTI_filters(filters, key, start, partitions, end = None):
+
+	"""
+	Function which split an OpenCTI request in time windows which can be retrieved concurrently.
+	The range between start and end is split in windows of the same duration on the key date. The filters of the request are kept in every window,
+	the first window has no lower bound and the last one has no upper bound, so no observable is lost at the edges (or created during the retrieval).
+
+		Parameters:
+			filters (str): filters of the request (see variables.default_query_filter)
+			key (str): date on which the request is split ("created_at" or "updated_at")
+			start (str): start date of the request, for example : "2023-03-01" or "2023-03-01T12:00:00.000Z"
+			partitions (int): number of windows
+			end (str): end date of the split (now by default), a resumed run splits its requests like its first attempt (see CheckpointJournal)
+
+		Returns:
+			list: filters of each window, from the oldest to the newest (only the filters of the request if partitions is 1)
+				[
+					str
+				]
+	"""
+
+	if partitions <= 1:
+		return [filters]
+
+	# Dates without timezone are considered as UTC, like OpenCTI does
+	start_date = datetime.datetime.fromisoformat(start.replace("Z", "+00:00"))
+	if start_date.tzinfo is None:
+		start_date = start_date.replace(tzinfo=datetime.timezone.utc)
+	end_date = datetime.datetime.now(datetime.timezone.utc) if end is None else datetime.datetime.fromisoformat(end.replace("Z", "+00:00"))
+	window_duration = (end_date - start_date) / partitions
+
+	# Bounds between the windows, in the date format of OpenCTI, for example : "2023-03-01T12:00:00.000Z"
+	windows_bounds = [(start_date + window_duration * index).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z" for index in range(1, partitions)]
+
+	windows_filters = []
+	for index in range(partitions):
+		window_filters = [filters]
+		if index > 0:
+			window_filters.append(variables.window_query_filter.format(key, "gte", windows_bounds[index - 1]))
+		if index < partitions - 1:
+			window_filters.append(variables.window_query_filter.format(key, "lt", windows_bounds[index]))
+		windows_filters.append(", ".join(window_filters))
+
+	return windows_filters
+
+def get_OpenCTI_IPv4_windows(windows_filters, max_workers = None, observable_type = "IPv4-Addr"):
+
+	"""
+	Function which retrieve IPv4 information in OpenCTI from several time windows, the pagination of each window is walked concurrently.
+	The IPv4 of the windows are merged from the oldest window to the newest, so an observable updated during the retrieval keeps its last score.
+
+		Parameters:
+			windows_filters (list): filters of each window, from the oldest to the newest (see partition_OpenCTI_filters())
+			max_workers (int): number of windows retrieved at the same time (variables.OpenCTI_partitions_workers by default)
+			observable_type (str): OpenCTI type of the observables requested
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: datas get from OpenCTI (see get_OpenCTI_IPv4())
+	"""
+
+	if max_workers is None:
+		max_workers = variables.OpenCTI_partitions_workers
+
+	# The windows share the same progress bar
+	progress_bar = tqdm(disable=not PROGRESS_BARS)
+
+	def get_OpenCTI_IPv4_window(window):
+		return get_OpenCTI_IPv4(filters = window[1], progress_bar = progress_bar, observable_type = observable_type)
+
+	# Retrieve the windows as soon as a worker is free, and keep them by index to merge them in order
+	windows_IPs = {}
+	windows_failed = 0
+	for window, (get_OpenCTI_IPv4_execution, window_IPs) in execute_concurrently(get_OpenCTI_IPv4_window, enumerate(windows_filters), max_workers):
+		if not get_OpenCTI_IPv4_execution:
+			windows_failed += 1
+		windows_IPs[window[0]] = window_IPs
+
+	progress_bar.close()
+
+	if windows_failed > 0:
+		pprint(""" Retrieve IPv4 datas on OpenCTI : Failed ({0}/{1} window(s) in error) """, "ERROR", windows_failed, len(windows_filters), center="!")
+
+	# Merge the windows, an IPv4 retrieved in several windows is kept once
+	IPs = new_score_store(observable_type)
+	for index in sorted(windows_IPs.keys()):
+		IPs.update(windows_IPs.pop(index))
+
+	return windows_failed == 0, IPs
+
+def iterate_QRadar_pages(endpoint, page_size = None, QRadar_instance = "default"):
+
+	"""
+	Generator which retrieve the elements of a QRadar reference collection (map or set) page by page, using the Range header of QRadar API ("items=<first>-<last>").
+	Only one page of the collection is in memory at a time.
+
+		Parameters:
+			endpoint (str): API endpoint of the collection, for example : "reference_data/maps/Malicious - IP" or "reference_data/sets/Malicious - CIDR"
+			page_size (int): number of elements requested per page (variables.QRadar_page_size by default)
+			QRadar_instance (str): QRadar console of the collection (see get_QRadar_API())
+
+		Yields:
+			bool: True if the page has been retrieved successfully, False otherwise (the generator stops after a failure).
+			dict or list: "data" of the page, a dict by key for a map and a list for a set (empty after a failure)
+	"""
+
+	if page_size is None:
+		page_size = variables.QRadar_page_size
+
+	# All the pages share the keep-alive connections of the QRadar session
+	QRadar_session, QRadar_URL = get_QRadar_API(QRadar_instance)
+	QRadar_request_URL = QRadar_URL.format(endpoint)
+
+	pprint(""" URL requested : {0}""", "DEBUG", QRadar_URL.format(""), center='-')
+	pprint(""" API endpoint : {0}""", "DEBUG", endpoint, center='-')
+
+	# Loop over the pages until the number of elements of the collection is reached
+	QRadar_request_first_item = 0
+	while True:
+
+		# Request QRadar API endpoint through the QRadar session (without SSL verification)
+		QRadar_request_range = "items={0}-{1}".format(QRadar_request_first_item, QRadar_request_first_item + page_size - 1)
+		QRadar_request_execution, QRadar_request_error, QRadar_request = send_request(QRadar_session, "GET", QRadar_request_URL, variables.QRadar_read_retries, headers={'Range': QRadar_request_range})
+
+		# If/Else regarding the status of the request, the temporary errors have already been retried
+		if not QRadar_request_execution:
+			pprint(""" Request : Failed | {0} """, "ERROR", QRadar_request_error, center='!')
+			if QRadar_request is not None:
+				pprint("{0}", "ERROR", QRadar_request.text)
+			yield False, {}
+			return
+
+		# Converting request response to json format
+		QRadar_request_json = QRadar_request.json()
+
+		"""
+		Response format example of a map :
+		{
+		  "timeout_type": "FIRST_SEEN",
+		  "number_of_elements": <int>,
+		  "data": {
+		    "<IP>": {
+		      "last_seen": <EPOCH TIME>,
+		      "first_seen": <EPOCH TIME>,
+		      "source": "reference data api",
+		      "value": "<IP Score>"
+		    },
+		  "creation_time": <EPOCH TIME>,
+		  "value_label": "Risk Score",
+		  "name": "map_name",
+		  "element_type": "NUM"
+		}
+		The data of a set is a list of elements, for example : [{"last_seen": <EPOCH TIME>, "first_seen": <EPOCH TIME>, "source": "reference data api", "value": "<CIDR>"}]
+		"""
+
+		# The data key doesn't exist when the collection (or the range) contains 0 element
+		QRadar_request_data = QRadar_request_json.get("data", {})
+		run_metrics.increment("pages_total", api="QRadar")
+		yield True, QRadar_request_data
+
+		# Stop at the last page (an empty or partial page also means the end if the range is ignored)
+		QRadar_request_first_item += page_size
+		if QRadar_request_first_item >= QRadar_request_json["number_of_elements"] or len(QRadar_request_data) < page_size:
+			return
+
+def upload_QRadar_chunks(elements, endpoint, format_chunk, batch_size, max_workers, retries, QRadar_instance = "default"):
+
+	"""
+	Generator which upload elements to a QRadar bulk_load endpoint.
+	Elements are split in chunks which are serialized in JSON and uploaded by a bounded pool of workers, each chunk being retried on errors.
+	A chunk in error doesn't stop the upload of the others.
+
+		Parameters:
+			elements (iterable): elements to upload, chunks are only built when a worker is ready for them
+			endpoint (str): bulk_load endpoint of the collection, for example : "reference_data/maps/bulk_load/Malicious - IP"
+			format_chunk (function): function which returns the payload of a chunk of elements, for example : {"127.0.0.1": "50"} for a map or ["10.0.0.0/28"] for a set
+			batch_size (int): maximum number of elements per chunk
+			max_workers (int): number of chunks uploaded at the same time
+			retries (int): number of retries of a chunk in error
+			QRadar_instance (str): QRadar console of the collection (see get_QRadar_API())
+
+		Yields:
+			int: number of the chunk, from 1
+			list: elements of the chunk
+			bool: True if the chunk has been uploaded, False otherwise.
+			str: description of the error ("" if the chunk has been uploaded)
+	"""
+
+	# All the chunks share the keep-alive connections of the QRadar session
+	QRadar_session, QRadar_URL = get_QRadar_API(QRadar_instance)
+	QRadar_request_URL = QRadar_URL.format(endpoint)
+
+	pprint(""" URL requested : {0}""", "DEBUG", QRadar_URL.format(""), center='-')
+	pprint(""" API endpoint : {0}""", "DEBUG", endpoint, center='-')
+
+	def upload_QRadar_chunk(elements_chunk):
+		QRadar_request_payload = format_chunk(elements_chunk[1])
+
+		pprint(""" Data of the request (chunk {0}) : """, "DEBUG", elements_chunk[0], center='-')
+		pprint("{0}", "DEBUG", QRadar_request_payload)
+
+		# Request QRadar API endpoint through the QRadar session (without SSL verification)
+		QRadar_request_execution, QRadar_request_error, QRadar_request = send_request(QRadar_session, "POST", QRadar_request_URL, retries, data=json.dumps(QRadar_request_payload))
+		return QRadar_request_execution, QRadar_request_error
+
+	# Number the chunks so the report can tell which ones failed, and yield them as soon as a worker completes them
+	for elements_chunk, (QRadar_request_execution, QRadar_request_error) in execute_concurrently(upload_QRadar_chunk, enumerate(split_in_chunks(elements, batch_size), 1), max_workers):
+		yield elements_chunk[0], elements_chunk[1], QRadar_request_execution, QRadar_request_error
+
+def delete_QRadar_elements(elements, format_endpoint, max_workers, retries, QRadar_instance = "default"):
+
+	"""
+	Generator which delete elements of a QRadar reference collection, the API can only delete them one by one.
+	Deletions are sent concurrently by a bounded pool of workers, each one retried on errors.
+
+		Parameters:
+			elements (iterable): elements to delete
+			format_endpoint (function): function which returns the API endpoint and the parameters of the deletion of an element, for example : ("reference_data/maps/Malicious%20-%20IP/127.0.0.1", {"value": 50})
+			max_workers (int): number of deletions sent at the same time
+			retries (int): number of retries of a deletion in error
+			QRadar_instance (str): QRadar console of the collection (see get_QRadar_API())
+
+		Yields:
+			object: element deleted
+			bool: True if the element has been deleted, False otherwise.
+			str: description of the error ("" if the element has been deleted)
+	"""
+
+	# All the deletions share the keep-alive connections of the QRadar session
+	QRadar_session, QRadar_URL = get_QRadar_API(QRadar_instance)
+
+	pprint(""" URL requested : {0}""", "DEBUG", QRadar_URL.format(""), center='-')
+
+	def delete_QRadar_element(element):
+		# Setup the URL for each deletion because you pass the key (and the value of a map) in the URL
+		QRadar_request_endpoint, QRadar_request_params = format_endpoint(element)
+		# Request QRadar API endpoint through the QRadar session (without SSL verification)
+		QRadar_request_execution, QRadar_request_error, QRadar_request = send_request(QRadar_session, "DELETE", QRadar_URL.format(QRadar_request_endpoint), retries, params=QRadar_request_params)
+		return QRadar_request_execution, QRadar_request_error
+
+	# Yield the deletions as soon as a worker completes them
+	for element, (QRadar_request_execution, QRadar_request_error) in execute_concurrently(delete_QRadar_element, elements, max_workers):
+		yield element, QRadar_request_execution, QRadar_request_error
+
+def iterate_QRadar_IPv4(map_name = "Malicious - IP", page_size = None, QRadar_instance = "default"):
+
+	"""
+	Generator which retrieve dataset of a QRadar referential page by page (see iterate_QRadar_pages()).
+	Only one page of the referential is in memory at a time.
+
+		Parameters:
+			map_name (str): Name of the referential name in QRadar environment
+			page_size (int): number of entries requested per page (variables.QRadar_page_size by default)
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Yields:
+			bool: True if the page has been retrieved successfully, False otherwise (the generator stops after a failure).
+			dict: datas of the page in the following format :
+				{
+					str: int
+				}
+				for example :
+				{
+					"127.0.0.1": 50
+				}
+	"""
+
+	for QRadar_page_execution, QRadar_page_data in iterate_QRadar_pages("reference_data/maps/" + map_name, page_size, QRadar_instance):
+		if not QRadar_page_execution:
+			yield False, {}
+			return
+		run_metrics.increment("IPv4_retrieved_total", len(QRadar_page_data), api="QRadar")
+		yield True, {IP:QRadar_page_data[IP]["value"] for IP in QRadar_page_data.keys()}
+
+def get_QRadar_IPv4(map_name = "Malicious - IP", page_size = None, observable_type = "IPv4-Addr", QRadar_instance = "default"):
+
+	"""
+	Function which retrieve dataset of a QRadar referential.
+	The referential is read page by page (see iterate_QRadar_IPv4()) so a large referential doesn't need a single long request, and it is kept in a compact store.
+
+		Parameters:
+			map_name (str): Name of the referential name in QRadar environment
+			page_size (int): number of entries requested per page (variables.QRadar_page_size by default)
+			observable_type (str): OpenCTI type of the observables stored in the referential
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: datas of the referential, the IPv4 and their value
+				for example :
+				"127.0.0.1": 50
+	"""
+
+	QRadar_IPs = new_score_store(observable_type)
+
+	# Loop into the pages and add them in the store, QRadar values are strings so they are converted
+	for QRadar_page_execution, QRadar_page_IPs in iterate_QRadar_IPv4(map_name, page_size, QRadar_instance):
+		if not QRadar_page_execution:
+			return False, new_score_store(observable_type)
+		for IP, IP_value in QRadar_page_IPs.items():
+			if not QRadar_IPs.add(IP, int(float(IP_value))):
+				pprint(""" Entry skipped, it can't be stored : {0} """, "DEBUG", IP)
+
+	return True, QRadar_IPs
+
+def upload_IPv4_to_QRadar(IPs_to_upload, map_name = "Malicious - IP", batch_size = None, max_workers = None, retries = None, QRadar_instance = "default"):
+
+	"""
+	Function which upload IPv4 to a QRadar referential.
+	IPv4 are split in chunks uploaded concurrently (see upload_QRadar_chunks()), a chunk in error doesn't stop the upload of the others.
+
+		Parameters:
+			IPs_to_upload (IPv4ScoreStore): IPv4 to upload in QRadar with their score
+				for example :
+				"127.0.0.1": 50
+			map_name (str): Name of the referential name in QRadar environment
+			batch_size (int): maximum number of IPv4 per chunk (variables.QRadar_upload_batch_size by default)
+			max_workers (int): number of chunks uploaded at the same time (variables.QRadar_upload_workers by default)
+			retries (int): number of retries of a chunk in error (variables.QRadar_upload_retries by default)
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: IPv4 which couldn't be uploaded, with their score
+	"""
+
+	if batch_size is None:
+		batch_size = variables.QRadar_upload_batch_size
+	if max_workers is None:
+		max_workers = variables.QRadar_upload_workers
+	if retries is None:
+		retries = variables.QRadar_upload_retries
+
+	# Nothing to send if there is no IPv4 to upload
+	if len(IPs_to_upload) == 0:
+		return True, type(IPs_to_upload)()
+
+	IPs_to_upload_chunks_count = (len(IPs_to_upload) + batch_size - 1) // batch_size
+	pprint(""" Upload of {0} IP(s) in {1} chunk(s) with {2} worker(s) :""", "DEBUG", len(IPs_to_upload), IPs_to_upload_chunks_count, max_workers)
+
+	def format_IPv4_chunk(IPs_chunk):
+		"""
+		Format data payload for the post request using the following format :
+		{
+			str: str
+		}
+		for example :
+		{
+			"127.0.0.1": "50"
+		}
+		"""
+		return {IP:str(IP_score) for IP, IP_score in IPs_chunk}
+
+	# Aggregate the IPv4 of the chunks in error
+	IPs_not_uploaded = type(IPs_to_upload)()
+	IPs_chunks_failed = 0
+
+	progress_bar = tqdm(total=len(IPs_to_upload), disable=not PROGRESS_BARS)
+
+	# Loop into the chunks as soon as a worker completes them
+	for IPs_chunk_number, IPs_chunk, QRadar_request_execution, QRadar_request_error in upload_QRadar_chunks(IPs_to_upload.items(), "reference_data/maps/bulk_load/" + map_name, format_IPv4_chunk, batch_size, max_workers, retries, QRadar_instance):
+		run_metrics.increment("IPv4_written_total", len(IPs_chunk), action="upload", result="success" if QRadar_request_execution else "failure")
+		if QRadar_request_execution:
+			pprint(""" Chunk {0}/{1} : {2} IP(s) uploaded """, "DEBUG", IPs_chunk_number, IPs_to_upload_chunks_count, len(IPs_chunk))
+		else:
+			pprint(""" Chunk {0}/{1} : Failed | {2} """, "ERROR", IPs_chunk_number, IPs_to_upload_chunks_count, QRadar_request_error, center='!')
+			IPs_chunks_failed += 1
+			for IP, IP_score in IPs_chunk:
+				IPs_not_uploaded.add(IP, IP_score)
+		progress_bar.update(len(IPs_chunk))
+
+	progress_bar.close()
+
+	# If/Else regarding the failures, with the partial success of the upload
+	if IPs_chunks_failed > 0:
+		pprint(""" Upload : {0}/{1} chunk(s) failed, {2}/{3} IP(s) uploaded """, "ERROR", IPs_chunks_failed, IPs_to_upload_chunks_count, len(IPs_to_upload) - len(IPs_not_uploaded), len(IPs_to_upload), center='!')
+		return False, IPs_not_uploaded
+
+	return True, type(IPs_to_upload)()
+
+def delete_QRadar_IPv4(IPs_to_delete, map_name = "Malicious - IP", max_workers = None, retries = None, QRadar_instance = "default"):
+
+	"""
+	Function which delete entry in QRadar referential pass in parameter.
+	Deletion API endpoint can only suppress entry one by one and you need to specify the key correct value to do the suppression.
+	Deletions are sent concurrently (see delete_QRadar_elements()), and the failures are aggregated in a report at the end.
+
+		Parameters:
+			IPs_to_delete (IPv4ScoreStore): IPv4 you want to delete (the referential keys) with their value in the referential
+				for example :
+				"127.0.0.1": 50
+			map_name (str): Name of the referential name in QRadar environment
+			max_workers (int): number of deletions sent at the same time (variables.QRadar_delete_workers by default)
+			retries (int): number of retries of a deletion in error (variables.QRadar_delete_retries by default)
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: IPv4 which couldn't be deleted, with their value in the referential
+	"""
+
+	if max_workers is None:
+		max_workers = variables.QRadar_delete_workers
+	if retries is None:
+		retries = variables.QRadar_delete_retries
+
+	pprint(""" API endpoint : reference_data/maps/{0}/<IP>?value=<SCORE>""", "DEBUG", map_name, center='-')
+
+	# Setup the maximum value for the loop deletion
+	IPs_to_delete_count = len(IPs_to_delete)
+	pprint(""" Suppression of {0} IP(s) of "{1}" referential with {2} worker(s) :""", "DEBUG", IPs_to_delete_count, map_name, max_workers)
+
+	progress_bar = tqdm(total=IPs_to_delete_count, disable=not PROGRESS_BARS)
+
+	def format_IPv4_deletion(IP_to_delete):
+		# The key is encoded, the characters of an URL or a file name (like "/", "?" or "#") aren't separators of the URL path
+		return "reference_data/maps/{0}/{1}".format(urllib.parse.quote(map_name, safe=""), urllib.parse.quote(IP_to_delete[0], safe="")), {'value': IP_to_delete[1]}
+
+	# Aggregate the failed deletions by error, for example : {"error code : 404": [("127.0.0.1", 50)]}
+	IPs_not_deleted = {}
+	IPs_not_deleted_count = 0
+
+	# Loop into the deletions as soon as a worker completes them
+	for IP_to_delete, QRadar_request_execution, QRadar_request_error in delete_QRadar_elements(IPs_to_delete.items(), format_IPv4_deletion, max_workers, retries, QRadar_instance):
+		run_metrics.increment("IPv4_written_total", action="delete", result="success" if QRadar_request_execution else "failure")
+		if not QRadar_request_execution:
+			IPs_not_deleted.setdefault(QRadar_request_error, []).append(IP_to_delete)
+			IPs_not_deleted_count += 1
+		progress_bar.update(1)
+
+	progress_bar.close()
+
+	# If/Else regarding the failures, with a report of the failed deletions grouped by error
+	if IPs_not_deleted_count > 0:
+		pprint(""" Deletion : {0}/{1} IP(s) failed """, "ERROR", IPs_not_deleted_count, IPs_to_delete_count, center='!')
+		for QRadar_request_error, IPs in IPs_not_deleted.items():
+			pprint(""" {0} : {1} IP(s) """, "ERROR", QRadar_request_error, len(IPs))
+			pprint("{0}", "DEBUG", IPs)
+		return False, type(IPs_to_delete)({IP: IP_value for IPs in IPs_not_deleted.values() for IP, IP_value in IPs})
+
+	return True, type(IPs_to_delete)()
+
+def get_QRadar_CIDR(set_name, page_size = None, QRadar_instance = "default"):
+
+	"""
+	Function which retrieve the CIDR blocks of a QRadar reference set, page by page (see iterate_QRadar_pages()).
+
+		Parameters:
+			set_name (str): Name of the reference set in QRadar environment, its element type is CIDR
+			page_size (int): number of blocks requested per page (variables.QRadar_page_size by default)
+			QRadar_instance (str): QRadar console of the reference set (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			list: CIDR blocks of the reference set, for example : ["10.0.0.0/28"]
+	"""
+
+	QRadar_blocks = []
+	for QRadar_page_execution, QRadar_page_data in iterate_QRadar_pages("reference_data/sets/" + set_name, page_size, QRadar_instance):
+		if not QRadar_page_execution:
+			return False, []
+		QRadar_blocks.extend(QRadar_element["value"] for QRadar_element in QRadar_page_data)
+
+	return True, QRadar_blocks
+
+def upload_CIDR_to_QRadar(blocks_to_upload, set_name, batch_size = None, max_workers = None, retries = None, QRadar_instance = "default"):
+
+	"""
+	Function which upload CIDR blocks to a QRadar reference set, by chunks uploaded concurrently (see upload_QRadar_chunks()).
+
+		Parameters:
+			blocks_to_upload (list): CIDR blocks to upload, for example : ["10.0.0.0/28"]
+			set_name (str): Name of the reference set in QRadar environment
+			batch_size (int): maximum number of blocks per chunk (variables.QRadar_upload_batch_size by default)
+			max_workers (int): number of chunks uploaded at the same time (variables.QRadar_upload_workers by default)
+			retries (int): number of retries of a chunk in error (variables.QRadar_upload_retries by default)
+			QRadar_instance (str): QRadar console of the reference set (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			list: CIDR blocks which couldn't be uploaded
+	"""
+
+	if batch_size is None:
+		batch_size = variables.QRadar_upload_batch_size
+	if max_workers is None:
+		max_workers = variables.QRadar_upload_workers
+	if retries is None:
+		retries = variables.QRadar_upload_retries
+
+	# The payload of a reference set is a list of values, for example : ["10.0.0.0/28"]
+	blocks_not_uploaded = []
+	for blocks_chunk_number, blocks_chunk, QRadar_request_execution, QRadar_request_error in upload_QRadar_chunks(blocks_to_upload, "reference_data/sets/bulk_load/" + set_name, list, batch_size, max_workers, retries, QRadar_instance):
+		run_metrics.increment("CIDR_written_total", len(blocks_chunk), action="upload", result="success" if QRadar_request_execution else "failure")
+		if not QRadar_request_execution:
+			pprint(""" Upload of {0} CIDR block(s) : Failed | {1} """, "ERROR", len(blocks_chunk), QRadar_request_error, center='!')
+			blocks_not_uploaded.extend(blocks_chunk)
+
+	return len(blocks_not_uploaded) == 0, blocks_not_uploaded
+
+def delete_QRadar_CIDR(blocks_to_delete, set_name, max_workers = None, retries = None, QRadar_instance = "default"):
+
+	"""
+	Function which delete CIDR blocks of a QRadar reference set, one request per block sent concurrently (see delete_QRadar_elements()).
+
+		Parameters:
+			blocks_to_delete (list): CIDR blocks to delete, for example : ["10.0.0.0/28"]
+			set_name (str): Name of the reference set in QRadar environment
+			max_workers (int): number of deletions sent at the same time (variables.QRadar_delete_workers by default)
+			retries (int): number of retries of a deletion in error (variables.QRadar_delete_retries by default)
+			QRadar_instance (str): QRadar console of the reference set (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			list: CIDR blocks which couldn't be deleted
+	"""
+
+	if max_workers is None:
+		max_workers = variables.QRadar_delete_workers
+	if retries is None:
+		retries = variables.QRadar_delete_retries
+
+	pprint(""" API endpoint : reference_data/sets/{0}/<CIDR>""", "DEBUG", set_name, center='-')
+
+	def format_CIDR_deletion(block_to_delete):
+		# The slash of the block is encoded, it isn't a separator of the URL path
+		return "reference_data/sets/{0}/{1}".format(urllib.parse.quote(set_name, safe=""), urllib.parse.quote(block_to_delete, safe="")), None
+
+	blocks_not_deleted = []
+	for block_to_delete, QRadar_request_execution, QRadar_request_error in delete_QRadar_elements(blocks_to_delete, format_CIDR_deletion, max_workers, retries, QRadar_instance):
+		run_metrics.increment("CIDR_written_total", action="delete", result="success" if QRadar_request_execution else "failure")
+		if not QRadar_request_execution:
+			pprint(""" Deletion of the CIDR block {0} : Failed | {1} """, "ERROR", block_to_delete, QRadar_request_error, center='!')
+			blocks_not_deleted.append(block_to_delete)
+
+	return len(blocks_not_deleted) == 0, blocks_not_deleted
+
+def plan_IPv4_sync(OpenCTI_IPs, QRadar_IPs, threshold = None):
+
+	"""
+	Function which compute the writes needed to synchronize QRadar referential with OpenCTI datas.
+	Only IPv4 of OpenCTI_IPs are planned, the other IPv4 of QRadar referential are left untouched.
+
+		Parameters:
+			OpenCTI_IPs (IPv4ScoreStore): datas get from OpenCTI, for example :
+				"127.0.0.1": 50
+			QRadar_IPs (IPv4ScoreStore): datas of the referential, for example :
+				"127.0.0.1": 50
+			threshold (int): IPv4 with a score bellow or equal the threshold are not kept in QRadar (variables.QRadar_score_threshold by default)
+
+		Returns:
+			dict: plan of the synchronization, each action is an IPv4ScoreStore :
+				{
+					"add": IPv4ScoreStore,			IPv4 to upload which aren't in QRadar (with their OpenCTI score)
+					"update": IPv4ScoreStore,		IPv4 to upload which have a new score (with their OpenCTI score)
+					"delete": IPv4ScoreStore,		IPv4 to remove from QRadar, score bellow or equal the threshold (with their QRadar value)
+					"unchanged": IPv4ScoreStore,	IPv4 already in QRadar with the same score
+					"ignored": IPv4ScoreStore,		IPv4 which aren't in QRadar and have a score bellow or equal the threshold
+					"missing": IPv4ScoreStore		IPv4 of QRadar which don't exist in OpenCTI anymore, only filled by verifiy_IPv4_score() (with their QRadar value)
+				}
+	"""
+
+	if threshold is None:
+		threshold = variables.QRadar_score_threshold
+
+	IPs_sync_plan = {IPs_sync_action: type(OpenCTI_IPs)() for IPs_sync_action in ("add", "update", "delete", "unchanged", "ignored", "missing")}
+
+	# Walk the OpenCTI IPv4 and the QRadar referential together in a single pass over the sorted stores
+	for IP, new_score, QRadar_score in OpenCTI_IPs.join(QRadar_IPs, outer = True):
+		# Switch/case for the IPv4 which are only in OpenCTI, they are added if their score is above the threshold
+		if QRadar_score is None:
+			if new_score <= threshold:
+				IPs_sync_plan["ignored"].add(IP, new_score)
+			else:
+				IPs_sync_plan["add"].add(IP, new_score)
+		# Switch/case to remove IPv4 from referential if the score is bellow or equal the threshold, update the score in QRadar if the new score is different from the older or do nothing
+		elif new_score <= threshold:
+			IPs_sync_plan["delete"].add(IP, QRadar_score)
+		elif QRadar_score != new_score:
+			IPs_sync_plan["update"].add(IP, new_score)
+		else:
+			IPs_sync_plan["unchanged"].add(IP, new_score)
+
+	return IPs_sync_plan
+
+def count_IPv4_sync_plan(IPs_sync_plan, IPs_sync_counts = None):
+
+	"""
+	Function which count the IPv4 of each action of a synchronization plan.
+
+		Parameters:
+			IPs_sync_plan (dict): plan of the synchronization (see plan_IPv4_sync())
+			IPs_sync_counts (dict): counts to which the plan is added, used to aggregate several plans (new counts if None)
+
+		Returns:
+			dict: number of IPv4 of each action, for example : {"add": 10, "update": 2, "delete": 1, "unchanged": 50, "ignored": 3, "missing": 0}
+	"""
+
+	if IPs_sync_counts is None:
+		IPs_sync_counts = {IPs_sync_action: 0 for IPs_sync_action in IPs_sync_plan.keys()}
+
+	for IPs_sync_action in IPs_sync_plan.keys():
+		IPs_sync_counts[IPs_sync_action] += len(IPs_sync_plan[IPs_sync_action])
+		run_metrics.increment("IPv4_planned_total", len(IPs_sync_plan[IPs_sync_action]), action=IPs_sync_action)
+
+	return IPs_sync_counts
+
+def print_IPv4_sync_plan(IPs_sync_counts, map_name = "Malicious - IP"):
+
+	"""
+	Function which display the number of IPv4 of each action of a synchronization plan.
+
+		Parameters:
+			IPs_sync_counts (dict): number of IPv4 of each action (see count_IPv4_sync_plan())
+			map_name (str): Name of the referential name in QRadar environment
+	"""
+
+	pprint(""" Synchronization plan of "{0}" referential """, "INFO", map_name, center='-')
+	for IPs_sync_action in ("add", "update", "delete", "unchanged", "ignored", "missing"):
+		pprint(""" {0} : {1} IP(s) """, "INFO", IPs_sync_action, IPs_sync_counts[IPs_sync_action])
+
+def execute_IPv4_sync_plan(IPs_sync_plan, map_name = "Malicious - IP", QRadar_instance = "default"):
+
+	"""
+	Function which apply the writes of a synchronization plan in QRadar referential, nothing is sent for the unchanged and ignored IPv4.
+
+		Parameters:
+			IPs_sync_plan (dict): plan of the synchronization (see plan_IPv4_sync())
+			map_name (str): Name of the referential name in QRadar environment
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+	"""
+
+	# Delete IPv4 of the plan by calling the delete_QRadar_IPv4() function
+	# The failed deletions are reported by delete_QRadar_IPv4() and don't prevent the upload
+	delete_QRadar_IPv4_execution = True
+	if len(IPs_sync_plan["delete"]) > 0:
+		delete_QRadar_IPv4_execution, IPv4_not_removed = delete_QRadar_IPv4(IPs_sync_plan["delete"], map_name, QRadar_instance = QRadar_instance)
+		if not delete_QRadar_IPv4_execution:
+			pprint(""" IPv4 deletion in QRadar : Failed ({0} IP(s) not deleted) """, "ERROR", len(IPv4_not_removed), center="!")
+		else:
+			pprint(""" IPv4 deletion in QRadar : Success """, "DEBUG", center="=")
+
+	# Upload new IPv4 and updated scores of the plan together by calling the upload_IPv4_to_QRadar() function
+	upload_IPv4_to_QRadar_execution = True
+	IPv4_to_upload = type(IPs_sync_plan["add"])()
+	IPv4_to_upload.update(IPs_sync_plan["add"])
+	IPv4_to_upload.update(IPs_sync_plan["update"])
+	if len(IPv4_to_upload) > 0:
+		upload_IPv4_to_QRadar_execution, IPv4_not_uploaded = upload_IPv4_to_QRadar(IPv4_to_upload, map_name, QRadar_instance = QRadar_instance)
+		if not upload_IPv4_to_QRadar_execution:
+			pprint(""" IPv4 upload in QRadar : Failed ({0} IP(s) not uploaded) """, "ERROR", len(IPv4_not_uploaded), center="!")
+		else:
+			pprint(""" IPv4 upload in QRadar : Success """, "DEBUG", center="=")
+
+	return delete_QRadar_IPv4_execution and upload_IPv4_to_QRadar_execution
+
+def plan_IPv4_verification(IPs_to_verify, batch_size = None, max_workers = None, observable_type = "IPv4-Addr", threshold = None):
+
+	"""
+	Function which compute the writes needed to verify IPv4 datas of QRadar referential with their current score in OpenCTI.
+	IPv4 are looked up in OpenCTI by batches requested concurrently, and IPv4 which don't exist in OpenCTI anymore are deleted if variables.QRadar_delete_missing is True.
+	IPv4 checked in OpenCTI less than variables.score_cache_ttl seconds ago are taken from the score cache instead (see score_cache.py).
+
+		Parameters:
+			IPs_to_verify (IPv4ScoreStore): IPv4 in the QRadar referential you want to verify, for example :
+				"127.0.0.1": 50
+			batch_size (int): maximum number of IPv4 looked up per OpenCTI request (variables.OpenCTI_verify_batch_size by default)
+			max_workers (int): number of OpenCTI requests sent at the same time (variables.OpenCTI_verify_workers by default)
+			observable_type (str): OpenCTI type of the observables stored in the referential
+			threshold (int): IPv4 with a score bellow or equal the threshold are deleted (variables.QRadar_score_threshold by default)
+
+		Returns:
+			bool: True if every IPv4 has been verified, False otherwise (the IPv4 of the batches in error are left out of the plan).
+			dict: plan of the verification (see plan_IPv4_sync())
+	"""
+
+	if batch_size is None:
+		batch_size = variables.OpenCTI_verify_batch_size
+	if max_workers is None:
+		max_workers = variables.OpenCTI_verify_workers
+
+	# Only the IPv4 which aren't up to date in the score cache are looked up in OpenCTI
+	IPs_cached, IPs_cached_missing = score_cache.get_fresh(IPs_to_verify, observable_type)
+	IPs_to_lookup = IPs_to_verify.difference(IPs_cached).difference(IPs_cached_missing)
+	run_metrics.increment("score_cache_total", len(IPs_to_verify) - len(IPs_to_lookup), result="hit")
+	run_metrics.increment("score_cache_total", len(IPs_to_lookup), result="miss")
+	pprint(""" Score cache : {0} IPv4 up to date, {1} IPv4 to look up in OpenCTI """, "DEBUG", len(IPs_to_verify) - len(IPs_to_lookup), len(IPs_to_lookup), center='-')
+
+	# The batches share the same progress bar
+	progress_bar = tqdm(total=len(IPs_to_lookup), disable=not PROGRESS_BARS)
+
+	def get_OpenCTI_IPv4_batch(IPs_batch):
+		# Format OpenCTI filter with JSON to have double quotes, here an example : ["IP1", "IP2"]
+		OpenCTI_request_filters = variables.IP_query_filter.format(json.dumps(IPs_batch))
+		return get_OpenCTI_IPv4(filters = OpenCTI_request_filters, progress_bar = progress_bar, observable_type = observable_type)
+
+	# Merge the OpenCTI informations of the batches with the cached ones and keep the IPv4 of the batches in error apart
+	get_OpenCTI_IPv4_IPs = IPs_cached
+	IPs_unverified = new_score_store(observable_type)
+	IPs_batches_failed = 0
+
+	# Retrieve OpenCTI informations for all IPv4 in QRadar referential, batch by batch as soon as they complete
+	for IPs_batch, (get_OpenCTI_IPv4_execution, get_OpenCTI_IPv4_batch_IPs) in execute_concurrently(get_OpenCTI_IPv4_batch, split_in_chunks(IPs_to_lookup.keys(), batch_size), max_workers):
+		# If/Else regarding the status of the execution, IPv4 of a batch in error are left untouched
+		if not get_OpenCTI_IPv4_execution:
+			IPs_batches_failed += 1
+			for IP in IPs_batch:
+				IPs_unverified.add(IP, 0)
+			continue
+		get_OpenCTI_IPv4_IPs.update(get_OpenCTI_IPv4_batch_IPs)
+		# The IPv4 of the batch which aren't returned by OpenCTI are cached as missing
+		score_cache.put(get_OpenCTI_IPv4_batch_IPs.items(), [IP for IP in IPs_batch if IP not in get_OpenCTI_IPv4_batch_IPs], observable_type)
+
+	progress_bar.close()
+
+	if IPs_batches_failed > 0:
+		pprint(""" Retrieve IPv4 datas on OpenCTI : Failed ({0} batch(es) in error) """, "ERROR", IPs_batches_failed, center="!")
+	else:
+		pprint(""" Retrieve IPv4 datas on OpenCTI : Success """, "DEBUG", center="=")
+
+	# Compute the IPv4 to remove from QRadar referential and the IPv4 whose score need update
+	IPs_sync_plan = plan_IPv4_sync(get_OpenCTI_IPv4_IPs, IPs_to_verify, threshold)
+
+	# IPv4 which don't exist in OpenCTI anymore are removed too if it is configured
+	IPs_sync_plan["missing"] = IPs_to_verify.difference(get_OpenCTI_IPv4_IPs).difference(IPs_unverified)
+	if variables.QRadar_delete_missing:
+		IPs_sync_plan["delete"].update(IPs_sync_plan["missing"])
+
+	return IPs_batches_failed == 0, IPs_sync_plan
+
+def verifiy_IPv4_score(IPs_to_verify, map_name = "Malicious - IP", plan_only = False, batch_size = None, max_workers = None, observable_type = "IPv4-Addr", threshold = None, QRadar_instance = "default"):
+
+	"""
+	Function which verify IPv4 datas in QRadar referential. It delete IPv4 with a score bellow or equal the threshold and update score which are changed.
+	The writes are planned by plan_IPv4_verification(), then applied in QRadar referential.
+
+		Parameters:
+			IPs_to_verify (IPv4ScoreStore): IPv4 in the QRadar referential you want to verify, for example :
+				"127.0.0.1": 50
+			map_name (str): Name of the referential name in QRadar environment
+			plan_only (bool): only display the plan of the verification, without writing anything in QRadar
+			batch_size (int): maximum number of IPv4 looked up per OpenCTI request (variables.OpenCTI_verify_batch_size by default)
+			max_workers (int): number of OpenCTI requests sent at the same time (variables.OpenCTI_verify_workers by default)
+			observable_type (str): OpenCTI type of the observables stored in the referential
+			threshold (int): IPv4 with a score bellow or equal the threshold are deleted (variables.QRadar_score_threshold by default)
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+	"""
+
+	plan_IPv4_verification_execution, IPs_sync_plan = plan_IPv4_verification(IPs_to_verify, batch_size, max_workers, observable_type, threshold)
+
+	print_IPv4_sync_plan(count_IPv4_sync_plan(IPs_sync_plan), get_mapping_name({"map": map_name, "instance": QRadar_instance}))
+
+	if plan_only:
+		return plan_IPv4_verification_execution
+
+	return execute_IPv4_sync_plan(IPs_sync_plan, map_name, QRadar_instance) and plan_IPv4_verification_execution
+
+def start_OpenCTI_pages_producer(windows_filters, queue_size = None, max_workers = None, observable_type = "IPv4-Addr"):
+
+	"""
+	Function which start a thread retrieving the pages of an OpenCTI request in background.
+	Pages are put in a bounded queue, so the thread waits when the consumer is late (backpressure) and only a few pages are kept in memory.
+	When the request is split in time windows, the windows are walked concurrently and their pages are put in the same queue.
+
+		Parameters:
+			windows_filters (list): filters of each window of the request (see partition_OpenCTI_filters()), a single element to walk a single cursor chain
+			queue_size (int): maximum number of pages waiting in the queue (variables.pipeline_queue_size by default)
+			max_workers (int): number of windows retrieved at the same time (variables.OpenCTI_partitions_workers by default)
+			observable_type (str): OpenCTI type of the observables requested
+
+		Returns:
+			queue.Queue: queue of the pages, each element has the following format :
+				(bool, IPv4ScoreStore)	True and the IPv4 of a page (see get_OpenCTI_IPv4()), or the status of the retrieval and None for the last element
+			threading.Event: event to set to stop the thread before the end of the pages
+	"""
+
+	if queue_size is None:
+		queue_size = variables.pipeline_queue_size
+	if max_workers is None:
+		max_workers = variables.OpenCTI_partitions_workers
+
+	OpenCTI_pages_queue = queue.Queue(maxsize=queue_size)
+	OpenCTI_producer_stop = threading.Event()
+
+	def produce_OpenCTI_window(filters):
+		OpenCTI_request_globalCount = None
+		OpenCTI_request_elementsCount = 0
+
+		# Loop into the pages returned by the generator
+		for OpenCTI_page_execution, OpenCTI_page in iterate_OpenCTI_pages(filters = filters, observable_type = observable_type):
+			if not OpenCTI_page_execution:
+				return False
+
+			if OpenCTI_request_globalCount is None:
+				OpenCTI_request_globalCount = OpenCTI_page["pageInfo"]["globalCount"]
+				pprint(""" Number of IPv4 retrieve : {0} """, "DEBUG", OpenCTI_request_globalCount, center='-')
+
+			IPs = new_score_store(observable_type)
+			OpenCTI_request_elementsCount += merge_OpenCTI_page(OpenCTI_page, IPs)
+			score_cache.put(IPs.items(), observable_type = observable_type)
+			if not put_until_stopped(OpenCTI_pages_queue, (True, IPs), OpenCTI_producer_stop):
+				return False
+
+		# Check if the number of observables received is the same as the number return in the API response
+		return OpenCTI_request_elementsCount == (OpenCTI_request_globalCount or 0)
+
+	def produce_OpenCTI_pages():
+		OpenCTI_windows_execution = True
+		for window_filters, OpenCTI_window_execution in execute_concurrently(produce_OpenCTI_window, windows_filters, max_workers):
+			OpenCTI_windows_execution = OpenCTI_windows_execution and OpenCTI_window_execution
+
+		# The last element tells if every window has been retrieved
+		put_until_stopped(OpenCTI_pages_queue, (OpenCTI_windows_execution, None), OpenCTI_producer_stop)
+
+	threading.Thread(target=produce_OpenCTI_pages, name="OpenCTI_producer", daemon=True).start()
+
+	return OpenCTI_pages_queue, OpenCTI_producer_stop
+
+def split_OpenCTI_pages_queue(OpenCTI_pages_queue, consumers_count, stop, queue_size = None):
+
+	"""
+	Function which start a thread copying the pages of a producer (see start_OpenCTI_pages_producer()) in a queue per consumer, so several QRadar referentials are synchronized from a single OpenCTI retrieval.
+	The queues are bounded, so the slowest consumer slows down the copy and then the producer. The stores of the pages are shared by the consumers, which only read them.
+	A consumer which stops reading its queue before the last element (after an error) has to set the stop event, shared with the producer : the producer and the copy stop,
+	and the other consumers get a failed retrieval instead of waiting forever.
+
+		Parameters:
+			OpenCTI_pages_queue (queue.Queue): queue of the pages filled by the producer
+			consumers_count (int): number of consumers of the pages
+			stop (threading.Event): stop event of the producer, set when a consumer fails
+			queue_size (int): maximum number of pages waiting in each queue (variables.pipeline_queue_size by default)
+
+		Returns:
+			list: queue of each consumer, with the same elements as OpenCTI_pages_queue
+	"""
+
+	# A single consumer reads the queue of the producer
+	if consumers_count == 1:
+		return [OpenCTI_pages_queue]
+
+	if queue_size is None:
+		queue_size = variables.pipeline_queue_size
+
+	OpenCTI_pages_queues = [queue.Queue(maxsize=queue_size) for consumer in range(consumers_count)]
+
+	def copy_OpenCTI_pages():
+		while not stop.is_set():
+			try:
+				OpenCTI_page_element = OpenCTI_pages_queue.get(timeout=1)
+			except queue.Empty:
+				continue
+			if not all(put_until_stopped(OpenCTI_consumer_queue, OpenCTI_page_element, stop) for OpenCTI_consumer_queue in OpenCTI_pages_queues):
+				break
+			# The last element gives the status of the retrieval
+			if OpenCTI_page_element[1] is None:
+				return
+
+		# The pages waiting in the queues are dropped, so every consumer gets the failed retrieval at once
+		for OpenCTI_consumer_queue in OpenCTI_pages_queues:
+			while not OpenCTI_consumer_queue.empty():
+				try:
+					OpenCTI_consumer_queue.get_nowait()
+				except queue.Empty:
+					break
+			OpenCTI_consumer_queue.put((False, None))
+
+	threading.Thread(target=copy_OpenCTI_pages, name="OpenCTI_pages_copy", daemon=True).start()
+
+	return OpenCTI_pages_queues
+
+def gather_OpenCTI_pages(OpenCTI_pages_queue, observable_type = "IPv4-Addr"):
+
+	"""
+	Function which read the OpenCTI pages of a producer (see start_OpenCTI_pages_producer()) until the last one and gather them in a single store.
+
+		Parameters:
+			OpenCTI_pages_queue (queue.Queue): queue of the pages filled by the producer
+			observable_type (str): OpenCTI type of the observables requested
+
+		Returns:
+			bool: True if every OpenCTI page has been retrieved, False otherwise.
+			IPv4ScoreStore: observables of the pages with their score
+	"""
+
+	OpenCTI_IPs = new_score_store(observable_type)
+	while True:
+		OpenCTI_page_execution, OpenCTI_page_IPs = OpenCTI_pages_queue.get()
+		if OpenCTI_page_IPs is None:
+			return OpenCTI_page_execution, OpenCTI_IPs
+		OpenCTI_IPs.update(OpenCTI_page_IPs)
+
+def stream_IPv4_to_QRadar(OpenCTI_pages_queue, QRadar_IPs, map_name = "Malicious - IP", plan_only = False, batch_size = None, threshold = None, QRadar_instance = "default"):
+
+	"""
+	Function which consume the OpenCTI pages of a producer (see start_OpenCTI_pages_producer()) and synchronize them in QRadar referential batch by batch.
+	Each batch is planned and written while the producer keeps retrieving the next pages, so OpenCTI and QRadar requests overlap.
+
+		Parameters:
+			OpenCTI_pages_queue (queue.Queue): queue of the pages filled by the producer
+			QRadar_IPs (IPv4ScoreStore): datas of the referential
+			map_name (str): Name of the referential name in QRadar environment
+			plan_only (bool): only display the synchronization plan, without writing anything in QRadar
+			batch_size (int): number of IPv4 accumulated before planning and writing a batch (variables.QRadar_upload_batch_size by default)
+			threshold (int): IPv4 with a score bellow or equal the threshold are not kept in QRadar (variables.QRadar_score_threshold by default)
+			QRadar_instance (str): QRadar console of the referential (see get_QRadar_API())
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			dict: report of the synchronization :
+				{
+					"retrieved": bool,			True if every OpenCTI page has been retrieved
+					"written": bool,			True if every write of the batches succeeded
+					"synchronized": IPv4ScoreStore,	IPv4 of QRadar referential which have been synchronized with OpenCTI
+					"updated_at": str			last update date of the IPv4 retrieved ("" if no IPv4)
+				}
+	"""
+
+	if batch_size is None:
+		batch_size = variables.QRadar_upload_batch_size
+
+	IPs_stream_report = {"retrieved": False, "written": True, "synchronized": type(QRadar_IPs)(), "updated_at": ""}
+	IPs_sync_counts = None
+	IPs_batch = type(QRadar_IPs)()
 
-def pprint(string, level):
+	progress_bar = tqdm(disable=not PROGRESS_BARS)
 
-	if DEBUG == "DEBUG":
-		print(string)
-	elif DEBUG == "INFO" and level in ("INFO", "ERROR"):
-		print(string)
-	elif DEBUG == "ERRORONLY" and level in ("ERROR"):
-		print(string)
-	else:
-		pass
+	def synchronize_IPv4_batch(IPs_batch):
+		# Plan and write the batch, and keep what is needed by the next steps
+		IPs_sync_plan = plan_IPv4_sync(IPs_batch, QRadar_IPs, threshold)
+		if not plan_only:
+			IPs_stream_report["written"] = execute_IPv4_sync_plan(IPs_sync_plan, map_name, QRadar_instance) and IPs_stream_report["written"]
+		IPs_stream_report["synchronized"].update(QRadar_IPs.intersection(IPs_batch))
+		IPs_stream_report["updated_at"] = max(IPs_stream_report["updated_at"], IPs_batch.updated_at)
+		return IPs_sync_plan
+
+	# Loop into the pages as soon as the producer retrieves them
+	while True:
+		OpenCTI_page_execution, OpenCTI_page_IPs = OpenCTI_pages_queue.get()
+
+		# The last element of the queue gives the status of the retrieval
+		if OpenCTI_page_IPs is None:
+			IPs_stream_report["retrieved"] = OpenCTI_page_execution
+			break
+
+		IPs_batch.update(OpenCTI_page_IPs)
+		progress_bar.update(len(OpenCTI_page_IPs))
+
+		# Synchronize the batch as soon as it is full
+		if len(IPs_batch) >= batch_size:
+			IPs_sync_counts = count_IPv4_sync_plan(synchronize_IPv4_batch(IPs_batch), IPs_sync_counts)
+			IPs_batch = type(QRadar_IPs)()
+
+	# Synchronize the last batch, unless the retrieval failed
+	if IPs_stream_report["retrieved"] and len(IPs_batch) > 0:
+		IPs_sync_counts = count_IPv4_sync_plan(synchronize_IPv4_batch(IPs_batch), IPs_sync_counts)
+
+	progress_bar.close()
 
-def get_OpenCTI_IPv4(flag = "", filters = "[]", IPs = {}, progress_bar = None):
+	if IPs_sync_counts is not None:
+		print_IPv4_sync_plan(IPs_sync_counts, get_mapping_name({"map": map_name, "instance": QRadar_instance}))
+
+	return IPs_stream_report["retrieved"] and IPs_stream_report["written"], IPs_stream_report
+
+def read_watermark(watermark_file):
 
 	"""
-	Function which retrieve IPv4 information in OpenCTI.
+	Function which read the watermarks of the incremental synchronization, it is the last update date of the OpenCTI observables already synchronized for each observable type.
+	A watermark file written before the multi types synchronization only has the date of the IPv4, it is read as the watermark of "IPv4-Addr".
 
 		Parameters:
-			flag (str): flag which is used in the pagination of API response.
-			filters (str): filters you want to apply to your request. Please the the OpenCTI GraphQL documentation if you want to know how.
-			IPs (dict): dictionary used in the recursivity of the function to aggregate all the result.
-			progress_bar (tqdm): progress bar display during the retrieval of datas
+			watermark_file (str): path of the file storing the watermarks
 
 		Returns:
 			bool: True if execution is successful, False otherwise.
-			dict: datas get from OpenCTI :
-				{
-					str: {str: int}
-				}
-				for example :
-				{
-					"127.0.0.1": {"score": 50}
-				}
+			dict: last update date synchronized of each observable type (empty if there is no watermark yet), for example : {"IPv4-Addr": "2023-03-01T12:00:00.000Z"}
 	"""
 
-	# If/Else to display debug information on the first recursion
-	if flag == "":
-		pprint(""" URL requested : {0} """.format(variables.OpenCTI_URL).center(100, '-'), "DEBUG")
-		pprint(""" Query of the request : """.center(100, '-'), "DEBUG")
-		pprint("{0}".format(variables.query_IPv4.format(flag, filters)), "DEBUG")
-
-	# Configure parameters of the post request
-	OpenCTI_request_URL = variables.OpenCTI_URL
-	OpenCTI_request_query = {'query': variables.query_IPv4.format(flag, filters)}
-	OpenCTI_request_headers = {'Authorization': 'Bearer {0}'.format(secrets.OpenCTI_TOKEN)}
-	OpenCTI_request = requests.post(OpenCTI_request_URL, json=OpenCTI_request_query, headers=OpenCTI_request_headers)
+	# No watermark file means that it's the first incremental run
+	if not os.path.exists(watermark_file):
+		return True, {}
 
-	# If/Else regarding the status code response
-	if OpenCTI_request.status_code != 200:
-		pprint(""" Request : Failed | error code : {0} """.format(OpenCTI_request.status_code).center(100, '!'), "ERROR")
-		pprint("{0}".format(OpenCTI_request.text), "ERROR")
+	try:
+		with open(watermark_file, "r") as watermark:
+			watermarks = json.load(watermark)
+		if "updated_at" in watermarks:
+			return True, {"IPv4-Addr": watermarks["updated_at"]}
+		return True, dict(watermarks["watermarks"])
+	except (OSError, ValueError, KeyError, TypeError) as error:
+		pprint(""" Cannot read the watermark {0} : {1} """, "ERROR", watermark_file, error, center='!')
 		return False, {}
 
-	# Converting request response to json format
-	OpenCTI_request_json = json.loads(OpenCTI_request.text)
+def write_watermark(watermark_file, watermarks):
+
+	"""
+	Function which save the watermarks of the incremental synchronization.
+	The file is replaced atomically, so an interrupted run can't leave a corrupted watermark.
+
+		Parameters:
+			watermark_file (str): path of the file storing the watermarks
+			watermarks (dict): last update date synchronized of each observable type, for example : {"IPv4-Addr": "2023-03-01T12:00:00.000Z"}
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+	"""
 
-	# Catch regarding the API response (you can have an http 200 but the API returns errors)
 	try:
-		OpenCTI_request_json_error_message = OpenCTI_request_json["errors"][0]["message"]
-		OpenCTI_request_json_error_code = OpenCTI_request_json["errors"][0]["data"]["http_status"]
-	except KeyError:
-		pass
-	else:
-		pprint(""" Request : Failed | error code : {0} """.format(OpenCTI_request_json_error_code).center(100, '!'), "ERROR")
-		pprint("{0}".format(OpenCTI_request_json_error_message), "ERROR")
+		write_file_atomically(watermark_file, json.dumps({"watermarks": watermarks}))
+	except OSError as error:
+		pprint(""" Cannot write the watermark {0} : {1} """, "ERROR", watermark_file, error, center='!')
+		return False
+
+	return True
+
+def read_CIDR_index(CIDR_index_file):
+
+	"""
+	Function which read the index of the CIDR blocks written in the QRadar reference sets, it gives the OpenCTI score of the IPv4 of each block.
+	A reference set only stores the blocks, the index is what makes a block reversible to its IPv4 and their score, so they can be verified and cleaned.
+	It also tells which blocks have been written by the synchronization, the other blocks of the reference sets are never modified.
+
+		Parameters:
+			CIDR_index_file (str): path of the file storing the index
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			dict: score of the blocks of each reference set (see get_mapping_name()), empty if there is no index yet, for example : {"Malicious - CIDR": {"10.0.0.0/28": 80}}
+	"""
+
+	# No index file means that no block has been written yet, the blocks found in the reference sets are left untouched
+	if not os.path.exists(CIDR_index_file):
+		return True, {}
+
+	try:
+		with open(CIDR_index_file, "r") as CIDR_index_content:
+			return True, {CIDR_set: dict(CIDR_blocks) for CIDR_set, CIDR_blocks in json.load(CIDR_index_content)["CIDR_sets"].items()}
+	except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+		pprint(""" Cannot read the CIDR index {0} : {1} """, "ERROR", CIDR_index_file, error, center='!')
 		return False, {}
 
+def write_CIDR_index(CIDR_index_file, CIDR_sets):
 
 	"""
-	Response format example :
-	"data": {
-	    "stixCyberObservables": {
-	      "pageInfo": {
-	        "startCursor": <str>,
-	        "endCursor": <str>,
-	        "hasNextPage": <bool>,
-	        "hasPreviousPage": <bool>,
-	        "globalCount": <int>
-	      },
-	      "edges": [
-	        {
-	          "node": {
-	            "id": <str>,
-	            "entity_type": <str>,
-	            "created_at": <str>,
-	            "updated_at": <str>,
-	            "observable_value": <str>,
-	            "x_opencti_score": <int>,
-	            "creator": {
-	              "entity_type": <str>,
-	              "name": <str>
-	            },
-	            "objectLabel": {
-	              "edges": [
-	                {
-	                  "node": {
-	                    "value": <str>
-	                  }
-	                }
-	              ]
-	            }
-	          }
-	        }
-	      ]
-	    }
-	  }
-	}
-	"""
-
-
-	# Retrieve macro datas of the response and eventuals errors
-	try :
-		OpenCTI_request_hasNextPage = OpenCTI_request_json["data"]["stixCyberObservables"]["pageInfo"]["hasNextPage"]
-		OpenCTI_request_elementsCount = len(OpenCTI_request_json["data"]["stixCyberObservables"]["edges"])
-		OpenCTI_request_globalCount = OpenCTI_request_json["data"]["stixCyberObservables"]["pageInfo"]["globalCount"]
-	except KeyError as error:
-		pprint(""" Cannot find the key : {0} """.format(error).center(100, '!'), "ERROR")
-
-	# If/Else to display debug information on the first recursion and use the correct progress bar init
-	if flag == "":
-		pprint(""" Number of IPv4 retrieve : {0} """.format(OpenCTI_request_globalCount).center(100, '-'), "DEBUG")
-		progress_bar_tmp = tqdm(total=OpenCTI_request_globalCount)
-	else:
-		progress_bar_tmp = progress_bar
+	Function which save the index of the CIDR blocks written in the QRadar reference sets.
+	The file is replaced atomically, so an interrupted run can't leave a corrupted index.
 
-	
-	# Make a copy of the aggregate IPv4 dict so you can add datas
-	IPs_tmp = IPs.copy()
+		Parameters:
+			CIDR_index_file (str): path of the file storing the index
+			CIDR_sets (dict): score of the blocks of each reference set, for example : {"Malicious - CIDR": {"10.0.0.0/28": 80}}
 
-	# Loop into the results of this recursion response
-	for IP in range(OpenCTI_request_elementsCount):
-		IP_score = OpenCTI_request_json["data"]["stixCyberObservables"]["edges"][IP]["node"]["x_opencti_score"]
+		Returns:
+			bool: True if execution is successful, False otherwise.
+	"""
 
-		# Sometimes you don't have score for an IP, you can set a fix value like 50
-		if IP_score is None:
-			IP_score = 50
+	try:
+		write_file_atomically(CIDR_index_file, json.dumps({"CIDR_sets": CIDR_sets}))
+	except OSError as error:
+		pprint(""" Cannot write the CIDR index {0} : {1} """, "ERROR", CIDR_index_file, error, center='!')
+		return False
+
+	return True
+
+def get_mapping_name(mapping):
 
-		# Add the IP in the aggregate dict with a dict containing the score as value
-		IPs_tmp[OpenCTI_request_json["data"]["stixCyberObservables"]["edges"][IP]["node"]["observable_value"]] = {'score' : IP_score}
+	"""
+	Function which returns the name of the QRadar referential of a mapping used in the logs and the timings, with its console when it isn't the default one.
 
-		# Update the progress bar of 1 element
-		progress_bar_tmp.update(1)
+		Parameters:
+			mapping (dict): mapping of variables.sync_mappings, for example : {"type": "IPv4-Addr", "map": "Malicious - IP", "instance": "tenant_b"}
 
-	# If/Else to recurse or not regarding the API response
-	if OpenCTI_request_hasNextPage:
-		# Set the flag parameter for the next recursion
-		OpenCTI_request_endCursor = OpenCTI_request_json["data"]["stixCyberObservables"]["pageInfo"]["endCursor"]
-		return get_OpenCTI_IPv4(OpenCTI_request_endCursor, filters, IPs_tmp, progress_bar_tmp)
+		Returns:
+			str: name of the referential, for example : "Malicious - IP" or "tenant_b/Malicious - IP"
+	"""
 
-	# For the boolean returns value, we check if the number of keys in the dict is the same as the number return in the API response
-	return (len(IPs_tmp.keys()) == OpenCTI_request_globalCount), IPs_tmp
+	if mapping.get("instance", "default") == "default":
+		return mapping["map"]
+	return "{0}/{1}".format(mapping["instance"], mapping["map"])
 
-def get_QRadar_IPv4(map_name = "Malicious - IP"):
+def check_sync_mappings(mappings):
 
 	"""
-	Function which retrieve dataset of a QRadar referential.
+	Function which check the QRadar console and the CIDR aggregation of each mapping before the synchronization, so a mistake in the configuration doesn't fail in the middle of a run.
 
 		Parameters:
-			map_name (str): Name of the referential name in QRadar environment
+			mappings (list): observable types synchronized and their QRadar referential (see variables.sync_mappings)
 
 		Returns:
-			bool: True if execution is successful, False otherwise.
-			dict: datas of the referential in the following format :
-				{
-					str: int
-				}
-				for example :
-				{
-					"127.0.0.1": 50
-				}
+			bool: True if every mapping is valid, False otherwise.
+			str: description of the first error ("" if every mapping is valid)
 	"""
-	
-	# Ignore SSL Warning
-	urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning) 
-	pprint(""" URL requested : {0}""".format(variables.QRadar_URL.format("")).center(100, '-'), "DEBUG")
-	pprint(""" API endpoint : {0}""".format("reference_data/maps/" + map_name).center(100, '-'), "DEBUG")
-
-	# Configure header with QRadar TOKEN
-	QRadar_request_headers = {
-	    'SEC':'{0}'.format(secrets.QRadar_TOKEN),
-	    'Content-Type':'application/json',
-	    'accept':'application/json'
-	}
-
-	pprint(""" Request headers : """.center(100, '-').format(str(QRadar_request_headers)), "DEBUG")
-
-	# Request QRadar API endpoint without SSL
-	QRadar_request_URL = variables.QRadar_URL.format("reference_data/maps/" + map_name)
-	QRadar_request = requests.get(QRadar_request_URL, headers=QRadar_request_headers, verify=False)
-
-	# If/Else regarding the status code response
-	if QRadar_request.status_code != 200:
-		pprint(""" Request : Failed | error code : {0} """.format(QRadar_request.status_code).center(100, '!'), "ERROR")
-		pprint("{0}".format(QRadar_request.text), "ERROR")
-		return False, {}
 
-	# Converting request response to json format
-	# QRadar_request_json = json.loads(QRadar_request.text)
-	QRadar_request_json = QRadar_request.json()
-
-	"""
-	Response format example :
-	{
-	  "timeout_type": "FIRST_SEEN",
-	  "number_of_elements": <int>,
-	  "data": {
-	    "<IP>": {
-	      "last_seen": <EPOCH TIME>,
-	      "first_seen": <EPOCH TIME>,
-	      "source": "reference data api",
-	      "value": "<IP Score>"
-	    },
-	  "creation_time": <EPOCH TIME>,
-	  "value_label": "Risk Score",
-	  "name": "map_name",
-	  "element_type": "NUM"
-	}
-	"""
-
-	# If/Else regarding if referential contains 0 element
-	if QRadar_request_json["number_of_elements"] == 0:
-		return True, {}
+	CIDR_sets = set()
+	for mapping in mappings:
+		QRadar_instance = mapping.get("instance", "default")
+		# The blocks of a reference set are indexed with the score of a single mapping
+		if mapping.get("cidr_set"):
+			if mapping["type"] != "IPv4-Addr":
+				return False, "the CIDR aggregation of {0} is only available for IPv4-Addr".format(get_mapping_name(mapping))
+			if not 1 <= mapping.get("cidr_min_size", variables.CIDR_min_size) <= variables.CIDR_max_size:
+				return False, "the cidr_min_size of {0} must be between 1 and CIDR_max_size ({1})".format(get_mapping_name(mapping), variables.CIDR_max_size)
+			if get_mapping_name({"map": mapping["cidr_set"], "instance": QRadar_instance}) in CIDR_sets:
+				return False, "the reference set {0} of {1} is used by another mapping".format(mapping["cidr_set"], get_mapping_name(mapping))
+			CIDR_sets.add(get_mapping_name({"map": mapping["cidr_set"], "instance": QRadar_instance}))
+		if QRadar_instance == "default":
+			continue
+		if QRadar_instance not in variables.QRadar_instances:
+			return False, "the QRadar console {0} of {1} isn't in variables.QRadar_instances".format(QRadar_instance, get_mapping_name(mapping))
+		if not hasattr(secrets, variables.QRadar_instances[QRadar_instance]["token"]):
+			return False, "the token {0} of the QRadar console {1} isn't in secrets.py".format(variables.QRadar_instances[QRadar_instance]["token"], QRadar_instance)
 
-	return True, {IP:QRadar_request_json["data"][IP]["value"] for IP in QRadar_request_json["data"].keys()}
-	
-def upload_IPv4_to_QRadar(IPs_to_upload, map_name = "Malicious - IP"):
+	return True, ""
+
+def get_QRadar_mapping_IPv4(mapping, observable_type = "IPv4-Addr"):
 
 	"""
-	Function which upload IPv4 to a QRadar referential.
+	Function which retrieve dataset of the QRadar referential of a mapping.
+	When the mapping aggregates IPv4 in CIDR blocks, the blocks of its reference set are read too and the CIDR index is aligned on them : the blocks of the index which aren't in the reference set anymore are dropped.
+	Only the blocks of the index, written by the synchronization, are managed. The other blocks of the reference set (added by an analyst or another feed, or larger than variables.CIDR_max_size) are logged and left untouched, they are never expanded nor deleted.
 
 		Parameters:
-			IPs_to_upload (dict): List of the IP to upload in QRadar
-				{
-					str: {str: int}
-				}
-				for example :
-				{
-					"127.0.0.1": {"score": 50}
-				}
-			map_name (str): Name of the referential name in QRadar environment
+			mapping (dict): mapping of variables.sync_mappings, for example : {"type": "IPv4-Addr", "map": "Malicious - IP", "cidr_set": "Malicious - CIDR"}
+			observable_type (str): OpenCTI type of the observables stored in the referential
 
 		Returns:
 			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: datas of the referential (without the IPv4 of the CIDR blocks)
 	"""
 
-	# Ignore SSL Warning
-	urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-	pprint(""" URL requested : {0}""".format(variables.QRadar_URL.format("")).center(100, '-'), "DEBUG")
-	pprint(""" API endpoint : {0}""".format("reference_data/maps/bulk_load/" + map_name).center(100, '-'), "DEBUG")
+	QRadar_instance = mapping.get("instance", "default")
+	get_QRadar_IPv4_execution, QRadar_IPs = get_QRadar_IPv4(mapping["map"], observable_type = observable_type, QRadar_instance = QRadar_instance)
+	if not get_QRadar_IPv4_execution or not mapping.get("cidr_set"):
+		return get_QRadar_IPv4_execution, QRadar_IPs
+
+	get_QRadar_CIDR_execution, QRadar_blocks = get_QRadar_CIDR(mapping["cidr_set"], QRadar_instance = QRadar_instance)
+	if not get_QRadar_CIDR_execution:
+		return False, new_score_store(observable_type)
+
+	CIDR_set_name = get_mapping_name({"map": mapping["cidr_set"], "instance": QRadar_instance})
+	blocks_unmanaged = []
+	with CIDR_index_lock:
+		CIDR_set_index = CIDR_index.get(CIDR_set_name, {})
+		CIDR_index[CIDR_set_name] = {}
+		for block in QRadar_blocks:
+			# Only the blocks written by the synchronization are parsed, a block which can't be (an IPv6 or a malformed block added by an analyst) is unmanaged
+			if CIDR_set_index.get(block) is None:
+				blocks_unmanaged.append(block)
+				continue
+			try:
+				first_address, last_address = CIDR_to_range(block)
+			except (OSError, ValueError):
+				blocks_unmanaged.append(block)
+				continue
+			if last_address - first_address < variables.CIDR_max_size:
+				CIDR_index[CIDR_set_name][block] = CIDR_set_index[block]
+			else:
+				blocks_unmanaged.append(block)
+
+	if blocks_unmanaged:
+		pprint(""" {0} CIDR block(s) of "{1}" aren't managed by the synchronization, they are left untouched """, "INFO", len(blocks_unmanaged), CIDR_set_name)
+		pprint("{0}", "DEBUG", blocks_unmanaged)
+
+	return True, QRadar_IPs
+
+def get_CIDR_blocks(mapping):
 
 	"""
-	Format data payload for the post request using the following format :
-	{
-		str: str
-	}
-	for example :
-	{
-		"127.0.0.1": "50"
-	}
+	Function which returns the CIDR blocks managed in the reference set of a mapping with their score, as known by the CIDR index.
+
+		Parameters:
+			mapping (dict): mapping of variables.sync_mappings with a "cidr_set"
+
+		Returns:
+			dict: score of each block, for example : {"10.0.0.0/28": 80}
 	"""
-	IPs_to_upload_format = {IP:str(IPs_to_upload[IP]['score']) for IP in IPs_to_upload.keys()}
 
-	pprint(""" Data of the request : """.center(100, '-'), "DEBUG")
-	pprint("{0}".format(IPs_to_upload_format), "DEBUG")
+	with CIDR_index_lock:
+		return dict(CIDR_index.get(get_mapping_name({"map": mapping["cidr_set"], "instance": mapping.get("instance", "default")}), {}))
 
-	# Configure header with QRadar TOKEN
-	QRadar_request_headers = {
-	    'SEC':'{0}'.format(secrets.QRadar_TOKEN),
-	    'Content-Type':'application/json',
-	    'accept':'application/json'
-	}
+def get_CIDR_IPv4(QRadar_IPs, QRadar_blocks):
 
-	pprint(""" Request headers : """.format(str(QRadar_request_headers)).center(100, '-'), "DEBUG")
+	"""
+	Function which returns every IPv4 held by a CIDR mapping in QRadar : the IPv4 of its referential and the IPv4 of its managed CIDR blocks, with the score of their block.
 
-	# Request QRadar API endpoint without SSL
-	QRadar_request_URL = variables.QRadar_URL.format("reference_data/maps/bulk_load/" + map_name)
-	QRadar_request = requests.post(QRadar_request_URL, data=str(IPs_to_upload_format), headers=QRadar_request_headers, verify=False)
+		Parameters:
+			QRadar_IPs (IPv4ScoreStore): datas of the referential
+			QRadar_blocks (dict): score of the CIDR blocks of the reference set (see get_CIDR_blocks())
 
-	# If/Else regarding the status code response
-	if QRadar_request.status_code != 200:
-		pprint(""" Request : Failed | error code : {0} """.format(QRadar_request.status_code).center(100, '!'), "ERROR")
-		pprint("{0}".format(QRadar_request.text), "ERROR")
-		return False
+		Returns:
+			IPv4ScoreStore: IPv4 held by the referential and the reference set with their score
+	"""
 
-	return True
+	IPs_held = IPv4ScoreStore.from_CIDR(QRadar_blocks)
+	IPs_held.update(QRadar_IPs)
+	return IPs_held
 
-def delete_QRadar_IPv4(IPs_to_delete, IPs_in_QRadar, map_name = "Malicious - IP"):
+def apply_IPv4_sync_plan(IPs, IPs_sync_plan):
 
 	"""
-	Function which delete entry in QRadar referential pass in parameter.
-	Deletion API endpoint can only suppress entry one by one and you need to specify the key correct value to do the suppression.
+	Function which returns the IPv4 of a referential once a synchronization plan is applied, without writing anything in QRadar.
 
 		Parameters:
-			IPs_to_delete (list): List of IPv4 you want to delete (the referential keys)
-				[
-					str
-				]
-				for example :
-				[
-					"127.0.0.1"
-				]
-			IPs_in_QRadar (dict): datas of the referential in the following format :
-				{
-					str: int
-				}
-				for example :
-				{
-					"127.0.0.1": 50
-				}
-			map_name (str): Name of the referential name in QRadar environment
+			IPs (IPv4ScoreStore): IPv4 before the plan
+			IPs_sync_plan (dict): plan of the synchronization (see plan_IPv4_sync())
 
 		Returns:
-			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: IPv4 after the plan
 	"""
 
-	# Ignore SSL Warning
-	urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-	pprint(""" URL requested : {0}""".format(variables.QRadar_URL.format("")).center(100, '-'), "DEBUG")
-	pprint(""" API endpoint : reference_data/maps/{0}/<IP>?value=<SCORE>""".format(map_name).center(100, '-'), "DEBUG")
+	IPs_applied = IPs.difference(IPs_sync_plan["delete"])
+	IPs_applied.update(IPs_sync_plan["add"])
+	IPs_applied.update(IPs_sync_plan["update"])
+	return IPs_applied
 
-	# Configure header with QRadar TOKEN
-	QRadar_request_headers = {
-	    'SEC':'{0}'.format(secrets.QRadar_TOKEN),
-	    'Content-Type':'application/json',
-	    'accept':'application/json'
-	}
+def write_CIDR_IPv4(IPs_final, QRadar_IPs, QRadar_blocks, mapping, plan_only = False):
 
-	pprint(""" Request headers : """.format(str(QRadar_request_headers)).center(100, '-'), "DEBUG")
+	"""
+	Function which write the IPv4 of a CIDR mapping in QRadar, the contiguous IPv4 with the same score in CIDR blocks and the other ones in the referential.
+	The IPv4 are aggregated (see IPv4ScoreStore.aggregate()) and only the differences with what QRadar holds are written :
+	the new blocks are uploaded first, then the referential is written and the old blocks are deleted last, so an IPv4 kept is never missing in QRadar.
+	A block whose score changes is only updated in the CIDR index, the reference set only stores the blocks. Only the blocks of QRadar_blocks can be deleted.
 
-	# Setup the maximum value for the loop deletion
-	IPs_to_delete_count = len(IPs_to_delete)
-	pprint(""" Suppression of {0} IP(s) of "{1}" referential :""".format(IPs_to_delete_count,map_name), "DEBUG")
+		Parameters:
+			IPs_final (IPv4ScoreStore): IPv4 which QRadar has to hold with their score
+			QRadar_IPs (IPv4ScoreStore): datas of the referential
+			QRadar_blocks (dict): score of the managed blocks of the reference set (see get_CIDR_blocks())
+			mapping (dict): mapping of variables.sync_mappings with a "cidr_set"
+			plan_only (bool): only display the writes, without writing anything in QRadar
+
+		Returns:
+			bool: True if execution is successful, False otherwise.
+			IPv4ScoreStore: datas of the referential after the writes (None if they failed, the referential has to be read again)
+	"""
 
-	progress_bar = tqdm(total=IPs_to_delete_count)
+	map_name, set_name, QRadar_instance = mapping["map"], mapping["cidr_set"], mapping.get("instance", "default")
+	CIDR_set_name = get_mapping_name({"map": set_name, "instance": QRadar_instance})
+
+	# Split the IPv4 in blocks and single IPv4, then compare them with the blocks of the reference set and the referential
+	CIDR_blocks, IPs_single = IPs_final.aggregate(mapping.get("cidr_min_size", variables.CIDR_min_size), variables.CIDR_max_size)
+	blocks_to_upload = [block for block in CIDR_blocks if block not in QRadar_blocks]
+	blocks_to_delete = [block for block in QRadar_blocks if block not in CIDR_blocks]
+	IPs_sync_plan = plan_IPv4_sync(IPs_single, QRadar_IPs, float("-inf"))
+	IPs_sync_plan["delete"] = QRadar_IPs.difference(IPs_single)
+
+	pprint(""" CIDR aggregation of "{0}" : {1} IPv4 in {2} block(s) of "{3}", {4} single IPv4 """, "INFO", get_mapping_name(mapping), len(IPs_final) - len(IPs_single), len(CIDR_blocks), CIDR_set_name, len(IPs_single))
+	pprint(""" Writes : {0} block(s) to upload and {1} to delete, {2} IP(s) to upload and {3} to delete """, "INFO", len(blocks_to_upload), len(blocks_to_delete), len(IPs_sync_plan["add"]) + len(IPs_sync_plan["update"]), len(IPs_sync_plan["delete"]))
+
+	if plan_only:
+		return True, QRadar_IPs
+
+	# The blocks are recorded in the index before they are uploaded, so a block of a chunk in error which has reached QRadar is still managed
+	# The blocks of the index which aren't in the reference set are dropped by its next read (see get_QRadar_mapping_IPv4())
+	with CIDR_index_lock:
+		CIDR_index.setdefault(CIDR_set_name, {}).update(CIDR_blocks)
+		if not write_CIDR_index(variables.CIDR_index_file, CIDR_index):
+			return False, None
+
+	upload_CIDR_execution, blocks_not_uploaded = True, []
+	if blocks_to_upload:
+		upload_CIDR_execution, blocks_not_uploaded = upload_CIDR_to_QRadar(blocks_to_upload, set_name, QRadar_instance = QRadar_instance)
+		if not upload_CIDR_execution:
+			pprint(""" CIDR upload in QRadar : Failed ({0} block(s) not uploaded) """, "ERROR", len(blocks_not_uploaded), center="!")
+		else:
+			pprint(""" CIDR upload in QRadar : Success """, "DEBUG", center="=")
 
-	# Loop into all the IPv4 you have to delete
-	for IP_to_delete in IPs_to_delete:
-		# Setup the URL for each iteration because you pass the key and value in the URL
-		QRadar_request_URL = variables.QRadar_URL.format("reference_data/maps/{0}/{1}?value={2}".format(map_name, IP_to_delete, IPs_in_QRadar[IP_to_delete]))
-		# Request QRadar API endpoint without SSL
-		QRadar_request = requests.delete(QRadar_request_URL, headers=QRadar_request_headers, verify=False)
+	execute_IPv4_sync_plan_execution = execute_IPv4_sync_plan(IPs_sync_plan, map_name, QRadar_instance)
 
-		# If/Else regarding the status code response
-		if QRadar_request.status_code != 200:
-			pprint(""" Request : Failed | error code : {0} """.format(QRadar_request.status_code).center(100, '!'), "ERROR")
-			pprint("{0}".format(QRadar_request.text), "ERROR")
+	# The old blocks are only deleted once the IPv4 they hold are written elsewhere
+	delete_CIDR_execution, blocks_not_deleted = True, []
+	if blocks_to_delete:
+		if not upload_CIDR_execution or not execute_IPv4_sync_plan_execution:
+			delete_CIDR_execution, blocks_not_deleted = False, blocks_to_delete
+			pprint(""" CIDR deletion in QRadar : Postponed ({0} block(s) kept until their IPv4 are written) """, "ERROR", len(blocks_not_deleted), center="!")
+		else:
+			delete_CIDR_execution, blocks_not_deleted = delete_QRadar_CIDR(blocks_to_delete, set_name, QRadar_instance = QRadar_instance)
+			if not delete_CIDR_execution:
+				pprint(""" CIDR deletion in QRadar : Failed ({0} block(s) not deleted) """, "ERROR", len(blocks_not_deleted), center="!")
+			else:
+				pprint(""" CIDR deletion in QRadar : Success """, "DEBUG", center="=")
 
-		progress_bar.update(1)
+	# The deleted blocks leave the index
+	with CIDR_index_lock:
+		CIDR_set_index = CIDR_index.setdefault(CIDR_set_name, {})
+		for block in blocks_to_delete:
+			if block not in blocks_not_deleted:
+				CIDR_set_index.pop(block, None)
+		write_CIDR_index_execution = write_CIDR_index(variables.CIDR_index_file, CIDR_index)
 
-	return True
+	write_CIDR_IPv4_execution = upload_CIDR_execution and delete_CIDR_execution and execute_IPv4_sync_plan_execution and write_CIDR_index_execution
+	return write_CIDR_IPv4_execution, IPs_single if execute_IPv4_sync_plan_execution else None
 
-def verifiy_IPv4_score(IPs_to_verify, map_name = "Malicious - IP"):
+def synchronize_CIDR_IPv4(OpenCTI_IPs, QRadar_IPs, mapping, plan_only = False, observable_type = "IPv4-Addr"):
 
 	"""
-	Function which verify IPv4 datas in QRadar referential. It delete IPv4 with a score bellow or equal 50 and update score which are changed.
+	Function which synchronize and verify a CIDR mapping, the IPv4 of its referential and of its CIDR blocks are handled as a whole.
+	The IPv4 retrieved in OpenCTI are planned against them, the other ones are verified in OpenCTI (see plan_IPv4_verification()), then the result is written by write_CIDR_IPv4().
 
 		Parameters:
-			IPs_to_verify (dict): Dict of IPv4 in the QRadar referential you want to verify
-				{
-					str: int
-				}
-				for example :
-				{
-					"127.0.0.1": 50
-				}
-			map_name (str): Name of the referential name in QRadar environment
+			OpenCTI_IPs (IPv4ScoreStore): datas get from OpenCTI (an empty store to only verify the mapping)
+			QRadar_IPs (IPv4ScoreStore): datas of the referential
+			mapping (dict): mapping of variables.sync_mappings with a "cidr_set"
+			plan_only (bool): only display the plans, without writing anything in QRadar
+			observable_type (str): OpenCTI type of the observables stored in the referential
 
 		Returns:
 			bool: True if execution is successful, False otherwise.
 	"""
 
-	# Format OpenCTI filter and replace single quote with double, here an example : ["IP1", "IP2"]
-	OpenCTI_request_filters = variables.IP_query_filter.format(str([IP for IP in IPs_to_verify.keys()])).replace('\'', '\"')
+	threshold = mapping.get("threshold")
+	QRadar_blocks = get_CIDR_blocks(mapping)
+	IPs_held = get_CIDR_IPv4(QRadar_IPs, QRadar_blocks)
 
-	# Retrieve OpenCTI informations for all IPv4 in QRadar referential
-	get_OpenCTI_IPv4_execution, get_OpenCTI_IPv4_IPs = get_OpenCTI_IPv4(filters = OpenCTI_request_filters)
-	# If/Else regarding the status of the execution
-	if not get_OpenCTI_IPv4_execution:
-		pprint(""" Retrieve IPv4 datas on OpenCTI : Failed """.center(100, "!"), "ERROR")
-		return False
-	pprint(""" Retrieve IPv4 datas on OpenCTI : Success """.center(100, "="), "DEBUG")
-
-	# Setup the list of IPv4 to remove from QRadar referential and the dict of IPv4 and score that need update
-	IPv4_to_remove = []
-	IPv4_to_update = {} # We use a dict to fit the upload_IPv4_to_QRadar() parameter
-	# Loop into all the IPv4
-	for IP in get_OpenCTI_IPv4_IPs.keys():
-		# Setup variables for old IPv4 score and the new one
-		old_score = IPs_to_verify[IP]
-		new_score = get_OpenCTI_IPv4_IPs[IP]['score']
-		# Switch/case to remove IPv4 from referential if the score is bellow or equal 50, update the score in QRadar if the new score is different from the older or do nothing
-		if new_score <= 50:
-			IPv4_to_remove.append(IP)
-		elif old_score != new_score:
-			IPv4_to_update[IP] = {'score': new_score}
-		else:
+	# Plan the IPv4 retrieved in OpenCTI, then verify the other ones
+	IPs_sync_plan = plan_IPv4_sync(OpenCTI_IPs, IPs_held, threshold)
+	plan_IPv4_verification_execution, IPs_verification_plan = plan_IPv4_verification(IPs_held.difference(OpenCTI_IPs), observable_type = observable_type, threshold = threshold)
+
+	IPs_sync_counts = count_IPv4_sync_plan(IPs_sync_plan)
+	print_IPv4_sync_plan(count_IPv4_sync_plan(IPs_verification_plan, IPs_sync_counts), get_mapping_name(mapping))
+
+	IPs_final = apply_IPv4_sync_plan(apply_IPv4_sync_plan(IPs_held, IPs_sync_plan), IPs_verification_plan)
+
+	# The referential after the writes is only needed by the daemon, which keeps it between the events
+	write_CIDR_IPv4_execution, _ = write_CIDR_IPv4(IPs_final, QRadar_IPs, QRadar_blocks, mapping, plan_only)
+	return write_CIDR_IPv4_execution and plan_IPv4_verification_execution
+
+def synchronize_observable_type(observable_type, mappings, ndays = 1, plan_only = False, watermark = None, stream = False, partitions = None, timings = None):
+
+	'''
+	Function which synchronize an OpenCTI observable type in its QRadar referentials, it executes the steps 2 to 5 of main().
+	The observables are retrieved once in OpenCTI, then each referential is planned, written and cleaned concurrently with its own threshold.
+
+		Parameters:
+			observable_type (str): OpenCTI type of the observables synchronized, for example : "IPv4-Addr", "Domain-Name"
+			mappings (list): QRadar referentials of the type (see variables.sync_mappings), for example : [{"type": "IPv4-Addr", "map": "Malicious - IP"}, {"type": "IPv4-Addr", "map": "Malicious - IP high", "threshold": 80}]
+			ndays (int): Number of day you want to have in your OpenCTI research
+			plan_only (bool): only display the synchronization plans, without writing anything in QRadar
+			watermark (str): request only observables updated since this date ("" for the last n days of updates), None to request the observables created in the last n days
+			stream (bool): synchronize OpenCTI pages in QRadar while they are retrieved, with a bounded memory
+			partitions (int): number of time windows retrieved concurrently in OpenCTI (variables.OpenCTI_partitions by default)
+			timings (dict): filled with the duration in seconds of each step, prefixed by the observable type (and the referential for the steps of a referential), for example : {"IPv4-Addr OpenCTI retrieval": 2.1, "IPv4-Addr Malicious - IP upload": 1.3}
+
+		Returns:
+			bool: True if every observable retrieved has been written in every referential (or planned), False otherwise.
+			str: last update date of the observables retrieved in OpenCTI ("" if unknown)
+	'''
+
+	if timings is None:
+		timings = {}
+	if partitions is None:
+		partitions = variables.OpenCTI_partitions
+
+	# Filters of the third step, they are computed first so the streaming mode can retrieve OpenCTI pages during the second step
+
+	# Get the date of n days ago in the correct format
+	date_last_ndays = (datetime.date.today() - datetime.timedelta(days = ndays)).strftime("%Y-%m-%d") 
+	OpenCTI_request_filters = variables.default_query_filter.format(date_last_ndays)
+	OpenCTI_request_key, OpenCTI_request_start = "created_at", date_last_ndays
+
+	# In incremental mode, request observables updated since the watermark (or in the last n days if there is no watermark yet)
+	if watermark is not None:
+		pprint(""" Get {0} of OpenCTI updated since {1} """, "INFO", observable_type, watermark if watermark else date_last_ndays, center="=")
+		OpenCTI_request_filters = variables.incremental_query_filter.format(watermark if watermark else date_last_ndays)
+		OpenCTI_request_key, OpenCTI_request_start = "updated_at", watermark if watermark else date_last_ndays
+
+	# Split the request in time windows retrieved concurrently if it is configured
+	OpenCTI_request_windows = partition_OpenCTI_filters(OpenCTI_request_filters, OpenCTI_request_key, OpenCTI_request_start, partitions, run_checkpoint.started_at or None)
+
+	if stream:
+		OpenCTI_pages_queue, OpenCTI_producer_stop = start_OpenCTI_pages_producer(OpenCTI_request_windows, observable_type = observable_type)
+
+	# Second step, get QRadar observables list of each referential
+
+	def get_QRadar_mapping(mapping):
+		pprint(""" Get {0} of QRadar stored in {1} """, "INFO", observable_type, get_mapping_name(mapping), center="=")
+		step_start = time.perf_counter()
+		get_QRadar_IPv4_result = get_QRadar_mapping_IPv4(mapping, observable_type)
+		timings["{0} {1} QRadar retrieval".format(observable_type, get_mapping_name(mapping))] = time.perf_counter() - step_start
+		return get_QRadar_IPv4_result
+
+	# A referential which can't be read is left aside, the other ones are synchronized
+	QRadar_maps = []
+	for mapping, (get_QRadar_IPv4_execution, QRadar_IPs) in execute_concurrently(get_QRadar_mapping, mappings, len(mappings)):
+		if not get_QRadar_IPv4_execution:
+			pprint("""Retrieval of {0} in QRadar {1} : Failed """, "ERROR", observable_type, get_mapping_name(mapping), center='!')
 			continue
+		pprint(""" Retrieval of {0} in QRadar {1} : Success """, "INFO", observable_type, get_mapping_name(mapping), center="=")
+		QRadar_maps.append((mapping, QRadar_IPs))
 
-	# Delete IPv4 aggregate in the list by calling the delete_QRadar_IPv4() function
-	delete_QRadar_IPv4_execution = delete_QRadar_IPv4(IPv4_to_remove, IPs_to_verify, map_name)
-	if not delete_QRadar_IPv4_execution:
-		pprint(""" IPv4 deletion in QRadar : Failed """.center(100, "!"), "ERROR")
-		return False
-	pprint(""" IPv4 deletion in QRadar : Success """.center(100, "="), "DEBUG")
+	if not QRadar_maps:
+		if stream:
+			OpenCTI_producer_stop.set()
+		return False, ""
 
-	# Update IPv4 aggregate in the dict by calling the upload_IPv4_to_QRadar() function
-	upload_IPv4_to_QRadar_execution = upload_IPv4_to_QRadar(IPv4_to_update, map_name)
-	if not upload_IPv4_to_QRadar_execution:
-		pprint(""" IPv4 upload in QRadar : Failed """.center(100, "!"), "ERROR")
-		return False
-	pprint(""" IPv4 upload in QRadar : Success """.center(100, "="), "DEBUG")
+	if stream:
 
-	return True
+		# Third step, the OpenCTI pages are retrieved in background and copied for each referential
+		OpenCTI_pages_queues = iter(split_OpenCTI_pages_queue(OpenCTI_pages_queue, len(QRadar_maps), OpenCTI_producer_stop))
+		QRadar_maps = [(mapping, QRadar_IPs, next(OpenCTI_pages_queues)) for mapping, QRadar_IPs in QRadar_maps]
+
+	else:
+
+		# Third step, get last n days observables in OpenCTI database, once for all the referentials
+
+		step_start = time.perf_counter()
+		if len(OpenCTI_request_windows) > 1:
+			get_OpenCTI_IPv4_execution, OpenCTI_IPs = get_OpenCTI_IPv4_windows(OpenCTI_request_windows, observable_type = observable_type)
+		else:
+			get_OpenCTI_IPv4_execution, OpenCTI_IPs = get_OpenCTI_IPv4(filters = OpenCTI_request_filters, observable_type = observable_type)
+		timings[observable_type + " OpenCTI retrieval"] = time.perf_counter() - step_start
+		if not get_OpenCTI_IPv4_execution:
+			pprint(""" Retrieval of {0} in OpenCTI : Failed """, "ERROR", observable_type, center="!")
+			return False, ""
+		pprint(""" Retrieval of {0} in OpenCTI : Success """, "INFO", observable_type, center="=")
+
+		# The observables retrieved are up to date, the next verifications don't need to look them up again
+		score_cache.put(OpenCTI_IPs.items(), observable_type = observable_type)
+
+		QRadar_maps = [(mapping, QRadar_IPs, None) for mapping, QRadar_IPs in QRadar_maps]
+
+	def synchronize_QRadar_mapping(QRadar_map):
+		mapping, QRadar_IPs, OpenCTI_pages_queue = QRadar_map
+		map_name, QRadar_instance, threshold = mapping["map"], mapping.get("instance", "default"), mapping.get("threshold")
+		timings_prefix = "{0} {1} ".format(observable_type, get_mapping_name(mapping))
+
+		if mapping.get("cidr_set"):
+
+			# Third to fifth steps of a CIDR mapping, the blocks are built from every observable so the pages of the streaming mode are gathered first
+
+			step_start = time.perf_counter()
+			OpenCTI_IPs_mapping = OpenCTI_IPs if OpenCTI_pages_queue is None else None
+			if OpenCTI_IPs_mapping is None:
+				gather_OpenCTI_pages_execution, OpenCTI_IPs_mapping = gather_OpenCTI_pages(OpenCTI_pages_queue, observable_type)
+				if not gather_OpenCTI_pages_execution:
+					pprint(""" Retrieval of {0} in OpenCTI : Failed """, "ERROR", observable_type, center="!")
+					return False, ""
+			synchronize_CIDR_IPv4_execution = synchronize_CIDR_IPv4(OpenCTI_IPs_mapping, QRadar_IPs, mapping, plan_only, observable_type)
+			timings[timings_prefix + "CIDR synchronization"] = time.perf_counter() - step_start
+			if not synchronize_CIDR_IPv4_execution:
+				pprint(""" CIDR synchronization of {0} in QRadar {1} : Failed """, "ERROR", observable_type, get_mapping_name(mapping), center='!')
+			else:
+				pprint(""" CIDR synchronization of {0} in QRadar {1} : Success """, "INFO", observable_type, get_mapping_name(mapping), center="=")
+			return synchronize_CIDR_IPv4_execution, OpenCTI_IPs_mapping.updated_at
+
+		if stream:
+
+			# Third and fourth steps, upload OpenCTI's observables in QRadar referential while they are retrieved
+
+			step_start = time.perf_counter()
+			stream_IPv4_to_QRadar_execution, IPs_stream_report = stream_IPv4_to_QRadar(OpenCTI_pages_queue, QRadar_IPs, map_name, plan_only, threshold = threshold, QRadar_instance = QRadar_instance)
+			timings[timings_prefix + "OpenCTI retrieval and upload"] = time.perf_counter() - step_start
+			if not IPs_stream_report["retrieved"]:
+				pprint(""" Retrieval of {0} in OpenCTI : Failed """, "ERROR", observable_type, center="!")
+				return False, ""
+
+			execute_IPv4_sync_plan_execution = IPs_stream_report["written"]
+			QRadar_IPs_synchronized = IPs_stream_report["synchronized"]
+			OpenCTI_updated_at = IPs_stream_report["updated_at"]
 
-def main(ndays = 1):
+		else:
+
+			# Fourth step, upload OpenCTI's observables in QRadar referential
+
+			# Compare OpenCTI observables retrieved with QRadar referential so only the needed writes are sent
+			step_start = time.perf_counter()
+			IPs_sync_plan = plan_IPv4_sync(OpenCTI_IPs, QRadar_IPs, threshold)
+			print_IPv4_sync_plan(count_IPv4_sync_plan(IPs_sync_plan), get_mapping_name(mapping))
+
+			execute_IPv4_sync_plan_execution = True
+			if not plan_only:
+				execute_IPv4_sync_plan_execution = execute_IPv4_sync_plan(IPs_sync_plan, map_name, QRadar_instance)
+			timings[timings_prefix + "upload"] = time.perf_counter() - step_start
+
+			QRadar_IPs_synchronized = OpenCTI_IPs
+			OpenCTI_updated_at = OpenCTI_IPs.updated_at
+
+		# The writes in error don't prevent the cleaning step
+		if not plan_only:
+			if not execute_IPv4_sync_plan_execution:
+				pprint(""" Upload of {0} in QRadar {1} : Failed """, "ERROR", observable_type, get_mapping_name(mapping), center='!')
+			else:
+				pprint(""" Upload of {0} in QRadar {1} : Success """, "INFO", observable_type, get_mapping_name(mapping), center="=")
+
+		# Fifth step, clean observables in QRadar referential which aren't accurate anymore (OpenCTI score <= threshold)
+
+		# Observables retrieved in the third step are already up to date, only the other ones need to be verified
+		step_start = time.perf_counter()
+		QRadar_IPs_to_verify = QRadar_IPs.difference(QRadar_IPs_synchronized)
+
+		if len(QRadar_IPs_to_verify) > 0: # We must have at least 1 observable in QRadar referential
+			verifiy_IPv4_score_execution = verifiy_IPv4_score(QRadar_IPs_to_verify, map_name, plan_only, observable_type = observable_type, threshold = threshold, QRadar_instance = QRadar_instance)
+			timings[timings_prefix + "cleaning"] = time.perf_counter() - step_start
+			if not verifiy_IPv4_score_execution:
+				pprint(""" Cleaning of {0} in QRadar {1} : Failed """, "ERROR", observable_type, get_mapping_name(mapping), center='!')
+				return False, OpenCTI_updated_at
+			pprint(""" Cleaning of {0} in QRadar {1} : Success """, "INFO", observable_type, get_mapping_name(mapping), center="=")
+
+		return execute_IPv4_sync_plan_execution, OpenCTI_updated_at
+
+	def synchronize_QRadar_mapping_or_stop(QRadar_map):
+		# A referential in error stops reading its pages, the producer and the copy of the pages for the other referentials are stopped too (see split_OpenCTI_pages_queue())
+		try:
+			return synchronize_QRadar_mapping(QRadar_map)
+		except Exception:
+			if stream:
+				OpenCTI_producer_stop.set()
+			raise
+
+	# Fourth and fifth steps, the referentials are written and cleaned concurrently from the same observables
+	synchronize_execution = len(QRadar_maps) == len(mappings)
+	OpenCTI_updated_at = ""
+	for QRadar_map, (synchronize_QRadar_mapping_execution, QRadar_mapping_updated_at) in execute_concurrently(synchronize_QRadar_mapping_or_stop, QRadar_maps, len(QRadar_maps)):
+		synchronize_execution = synchronize_execution and synchronize_QRadar_mapping_execution
+		OpenCTI_updated_at = max(OpenCTI_updated_at, QRadar_mapping_updated_at)
+
+	return synchronize_execution, OpenCTI_updated_at
+
+def main(ndays = 1, plan_only = False, incremental = False, stream = False, timings = None, partitions = None, mappings = None, checkpoint = False):
 
 	'''
 	Main function of the program. It executes the following 5 steps :
 	1. Check modules installation
 	2. Get IPv4 list in QRadar referential (all)
-	3. Get IPv4 list in OpenCTI database (last n days)
-	4. Upload IPv4 of OpenCTI in QRadar referential (duplicates will be ignorate)
+	3. Get IPv4 list in OpenCTI database (last n days, or updated since the last run in incremental mode)
+	4. Upload IPv4 of OpenCTI in QRadar referential (only new IPv4 and changed scores are sent)
 	5. Clean QRadar IPv4's which are not accurate anymore (score is less or equal than 50 over 100)
+	In streaming mode, OpenCTI pages are retrieved in background from the start and the steps 3 and 4 are done batch by batch at the same time.
+	The steps 2 to 5 are executed for each observable type of the mappings (IPv4, IPv6, domains...), the types are synchronized concurrently over the same HTTP sessions.
+	The observables of a type are retrieved once in OpenCTI for all its referentials, which can be on several QRadar consoles and have their own threshold.
 
 		Parameters:
 			ndays (int): Number of day you want to have in your OpenCTI research. If you execute your script every day or more frequently, leave it as default (1)
+			plan_only (bool): only display the synchronization plans, without writing anything in QRadar
+			incremental (bool): request only observables updated since the watermark of their type on the last successful run (last n days of updates on the first run)
+			stream (bool): synchronize OpenCTI pages in QRadar while they are retrieved, with a bounded memory
+			partitions (int): number of time windows retrieved concurrently in OpenCTI (variables.OpenCTI_partitions by default)
+			timings (dict): filled with the duration in seconds of each step of each type and referential, for example : {"IPv4-Addr Malicious - IP QRadar retrieval": 0.5, "IPv4-Addr OpenCTI retrieval": 2.1, "IPv4-Addr Malicious - IP upload": 1.3, "IPv4-Addr Malicious - IP cleaning": 0.8} ("OpenCTI retrieval and upload" of each referential in streaming mode)
+			mappings (list): observable types synchronized and their QRadar referential (variables.sync_mappings by default), for example : [{"type": "IPv4-Addr", "map": "Malicious - IP"}, {"type": "IPv4-Addr", "map": "Malicious - IP", "instance": "tenant_b", "threshold": 80}]
+			checkpoint (bool): journal the OpenCTI pages retrieved in variables.checkpoint_file, so a run stopped by an error is resumed by the next run with the same parameters
 			debug_level (str): Level of debug logs you will have ("NONE", "INFO", "DEBUG", "ERRORONLY"). By default, it's "INFO" logging only
 	'''
 
+	if timings is None:
+		timings = {}
+	if mappings is None:
+		mappings = variables.sync_mappings
+
 	# First step, check modules installation state
 
 	# pprint(" Modules checks ".center(100, "="), "INFO")
@@ -447,65 +2202,482 @@ def main(ndays = 1):
 	# 	return
 	# pprint(""" Modules checks : Success """.center(100, '='), "INFO")
 
-	# Second step, get QRadar IPv4 list
+	check_sync_mappings_execution, check_sync_mappings_error = check_sync_mappings(mappings)
+	if not check_sync_mappings_execution:
+		pprint(""" Invalid mapping : {0} """, "ERROR", check_sync_mappings_error, center='!')
+		return
+
+	# In incremental mode, each type is requested since its own watermark
+	watermarks = {}
+	if incremental:
+		read_watermark_execution, watermarks = read_watermark(variables.watermark_file)
+		if not read_watermark_execution:
+			pprint(""" Retrieval of the watermark : Failed """, "ERROR", center="!")
+			return
+
+	# The CIDR index gives the score of the blocks already written in the reference sets
+	if any(mapping.get("cidr_set") for mapping in mappings):
+		read_CIDR_index_execution, CIDR_sets = read_CIDR_index(variables.CIDR_index_file)
+		if not read_CIDR_index_execution:
+			pprint(""" Retrieval of the CIDR index : Failed """, "ERROR", center="!")
+			return
+		with CIDR_index_lock:
+			CIDR_index.clear()
+			CIDR_index.update(CIDR_sets)
+
+	# Open the journal of the run, the journal of a previous attempt is resumed if the run has the same parameters (the same day)
+	# The watermarks aren't parameters of the run : the ones of the types which succeeded are advanced by a failed attempt, and their requests with the new filters just don't match the journal
+	if checkpoint:
+		run_key = json.dumps({"date": datetime.date.today().isoformat(), "ndays": ndays, "incremental": incremental, "partitions": partitions, "mappings": mappings}, sort_keys=True)
+		open_checkpoint_execution, open_checkpoint_error = run_checkpoint.open(variables.checkpoint_file, run_key)
+		if not open_checkpoint_execution:
+			pprint(""" Cannot open the journal {0} : {1} """, "ERROR", variables.checkpoint_file, open_checkpoint_error, center='!')
+			return
+		if run_checkpoint.resumed:
+			pprint(""" Resume the run started at {0} """, "INFO", run_checkpoint.started_at, center="=")
+
+	# The referentials of a type share the same OpenCTI retrieval
+	mappings_by_type = {}
+	for mapping in mappings:
+		mappings_by_type.setdefault(mapping["type"], []).append(mapping)
+
+	def synchronize_type(observable_type):
+		return synchronize_observable_type(observable_type, mappings_by_type[observable_type], ndays, plan_only, watermarks.get(observable_type, "") if incremental else None, stream, partitions, timings)
+
+	# Date of the first OpenCTI query, taken before it is sent (the date of the first attempt for a resumed run)
+	OpenCTI_query_start = run_checkpoint.started_at or datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+	# Synchronize the types concurrently, a type in error doesn't stop the others
+	types_failed = 0
+	for observable_type, (synchronize_execution, OpenCTI_updated_at) in execute_concurrently(synchronize_type, list(mappings_by_type.keys()), len(mappings_by_type)):
+		if not synchronize_execution:
+			types_failed += 1
+			pprint(""" Synchronization of {0} in {1} : Failed """, "ERROR", observable_type, ", ".join(get_mapping_name(mapping) for mapping in mappings_by_type[observable_type]), center='!')
+		# Advance the watermark of a type only when every observable retrieved has been written in every referential, so the failed ones are requested again on the next run
+		# The watermark never passes the first OpenCTI query : the pages are ordered by creation date, so an observable updated during the run on a page already retrieved
+		# (or on a page replayed by a resumed run) has an update date below the last one retrieved, it is requested again on the next run
+		elif OpenCTI_updated_at:
+			watermarks[observable_type] = min(OpenCTI_updated_at, OpenCTI_query_start)
+
+	# The journal is only kept when the run has to be resumed
+	if checkpoint:
+		run_checkpoint.close(remove = types_failed == 0)
+		if types_failed > 0:
+			pprint(""" Progress of the run kept in {0}, the next run will resume it """, "INFO", variables.checkpoint_file, center="=")
+
+	if incremental and not plan_only:
+		if not write_watermark(variables.watermark_file, watermarks):
+			pprint(""" Update of the watermark : Failed """, "ERROR", center='!')
+			return
+		pprint(""" Update of the watermark : {0} """, "INFO", watermarks, center="=")
+
+	if types_failed > 0:
+		pprint(""" Synchronization : {0}/{1} type(s) failed """, "ERROR", types_failed, len(mappings_by_type), center='!')
+
+def iterate_OpenCTI_stream(last_event_id = ""):
+
+	"""
+	Generator which reads the OpenCTI live stream (Server-Sent Events), one event at a time.
+	The connection stays open and OpenCTI sends heartbeats between the events, the generator stops when the connection is lost.
+
+		Parameters:
+			last_event_id (str): id of the last event received, the stream resumes after it ("" to start from now)
+
+		Yields:
+			bool: True if the event has been received successfully, False otherwise (the generator stops after a failure).
+			dict: event of the stream, or the description of the error, for example :
+				{
+					"id": "1678901234567-0",
+					"event": "update",
+					"data": '{"data": {"type": "ipv4-addr", "value": "127.0.0.1", "x_opencti_score": 50}}'
+				}
+	"""
+
+	# The events are read as soon as they arrive, so the stream isn't compressed
+	OpenCTI_stream_headers = {"Accept": "text/event-stream", "Accept-Encoding": "identity"}
+	if last_event_id:
+		OpenCTI_stream_headers["Last-Event-ID"] = last_event_id
+
+	pprint(""" URL requested : {0} (after event "{1}") """, "DEBUG", variables.OpenCTI_stream_URL, last_event_id, center='-')
 
-	pprint(""" Get IPv4 of QRadar stored in {0} """.format(variables.QRadar_referential_name).center(100, "="), "INFO")
-	get_QRadar_IPv4_execution, QRadar_IPs = get_QRadar_IPv4(variables.QRadar_referential_name)
-	if not get_QRadar_IPv4_execution:
-		pprint("""Retrieval of IPv4 in QRadar : Failed """.center(100, '!'), "ERROR")
+	try:
+		OpenCTI_stream = get_HTTP_session("OpenCTI").get(variables.OpenCTI_stream_URL, headers=OpenCTI_stream_headers, stream=True, timeout=variables.OpenCTI_stream_timeout)
+	except requests.exceptions.RequestException as error:
+		yield False, "exception : {0}".format(type(error).__name__)
 		return
-	pprint(""" Retrieval of IPv4 in QRadar : Success """.center(100, "="), "INFO")
 
-	# Third step, get last n days IPv4 in OpenCTI database
-	
-	# Get the date of n days ago in the correct format
-	date_last_ndays = (datetime.date.today() - datetime.timedelta(days = ndays)).strftime("%Y-%m-%d") 
-	get_OpenCTI_IPv4_execution, OpenCTI_IPs = get_OpenCTI_IPv4(filters = variables.default_query_filter.format(date_last_ndays))
-	if not get_OpenCTI_IPv4_execution:
-		pprint(""" Retrieval of IPv4 in OpenCTI : Failed """.center(100, "!"), "ERROR")
+	if OpenCTI_stream.status_code != 200:
+		OpenCTI_stream.close()
+		yield False, "error code : {0}".format(OpenCTI_stream.status_code)
 		return
-	pprint(""" Retrieval of IPv4 in OpenCTI : Success """.center(100, "="), "INFO")
 
-	# Fourth step, upload OpenCTI's IPv4 in QRadar referential
+	# The id of an event is kept for the next ones, like the Last-Event-ID of a browser
+	OpenCTI_stream.encoding = "utf-8"
+	OpenCTI_event = {"id": "", "event": "message", "data": []}
 
-	# For the uploading we used the OpenCTI IPv4 retrieved
-	upload_QRadar_IPv4_to_QRadar_execution = upload_IPv4_to_QRadar(OpenCTI_IPs, map_name=variables.QRadar_referential_name)
-	if not upload_QRadar_IPv4_to_QRadar_execution:
-		pprint(""" Upload of IPv4 in QRadar : Failed """.center(100, '!'), "ERROR")
+	try:
+		for OpenCTI_stream_line in OpenCTI_stream.iter_lines(chunk_size=1024, decode_unicode=True):
+
+			# An empty line ends the event, the lines starting with ":" are comments used as keep-alive
+			if not OpenCTI_stream_line:
+				if OpenCTI_event["data"]:
+					yield True, {"id": OpenCTI_event["id"], "event": OpenCTI_event["event"], "data": "\n".join(OpenCTI_event["data"])}
+				OpenCTI_event = {"id": OpenCTI_event["id"], "event": "message", "data": []}
+				continue
+			if OpenCTI_stream_line.startswith(":"):
+				continue
+
+			OpenCTI_event_field, _, OpenCTI_event_value = OpenCTI_stream_line.partition(":")
+			if OpenCTI_event_value.startswith(" "):
+				OpenCTI_event_value = OpenCTI_event_value[1:]
+			if OpenCTI_event_field == "data":
+				OpenCTI_event["data"].append(OpenCTI_event_value)
+			elif OpenCTI_event_field in ("id", "event"):
+				OpenCTI_event[OpenCTI_event_field] = OpenCTI_event_value
+
+	except requests.exceptions.RequestException as error:
+		yield False, "exception : {0}".format(type(error).__name__)
 		return
-	pprint(""" Upload of IPv4 in QRadar : Success """.center(100, "="), "INFO")
+	finally:
+		OpenCTI_stream.close()
 
-	# Fifth step, clean IPv4 in QRadar referential which aren't accurate anymore (OpenCTI score >= 50)
+	yield False, "connection closed"
 
-	if len(QRadar_IPs.keys()) > 0: # We must have at least 1 IPv4 in QRadar referential
-		verifiy_IPv4_score_execution = verifiy_IPv4_score(QRadar_IPs, variables.QRadar_referential_name)
-		if not verifiy_IPv4_score_execution:
-			pprint(""" Cleaning of IPv4 in QRadar : Failed """.center(100, '!'), "ERROR")
-			return
-		pprint(""" Cleaning of IPv4 in QRadar : Success """.center(100, "="), "INFO")
+def parse_OpenCTI_stream_event(OpenCTI_event):
+
+	"""
+	Function which read the observable of an OpenCTI live stream event.
+	The score is the x_opencti_score of the STIX object, or the score of its OpenCTI extension with the recent versions of OpenCTI.
+
+		Parameters:
+			OpenCTI_event (dict): event of the stream (see iterate_OpenCTI_stream())
+
+		Returns:
+			str: OpenCTI type of the observable ("" if the event isn't about an observable, like the heartbeats)
+			str: value of the observable
+			int: score of the observable (None if the observable is deleted)
+	"""
+
+	if OpenCTI_event["event"] not in ("create", "update", "merge", "delete"):
+		return "", "", None
+
+	try:
+		STIX_object = json.loads(OpenCTI_event["data"])["data"]
+		observable_type = variables.stream_types.get(STIX_object.get("type"), "")
+	except (ValueError, KeyError, TypeError, AttributeError):
+		pprint(""" Event skipped, it can't be read : {0} """, "DEBUG", OpenCTI_event["data"])
+		return "", "", None
+
+	# Files have no value, they are synchronized with one of their hashes
+	if STIX_object.get("type") == "file":
+		STIX_hashes = STIX_object.get("hashes", {})
+		observable_value = next((STIX_hashes[STIX_hash] for STIX_hash in variables.stream_file_hashes if STIX_hash in STIX_hashes), "")
+	else:
+		observable_value = STIX_object.get("value", "")
+
+	if OpenCTI_event["event"] == "delete":
+		return observable_type, observable_value, None
+
+	observable_score = STIX_object.get("x_opencti_score")
+	if observable_score is None:
+		observable_score = next((STIX_extension["score"] for STIX_extension in STIX_object.get("extensions", {}).values() if isinstance(STIX_extension, dict) and STIX_extension.get("score") is not None), None)
+
+	# Sometimes you don't have score for an observable, you can set a fix value like 50 (see merge_OpenCTI_page())
+	if observable_score is None:
+		observable_score = 50
+
+	return observable_type, observable_value, observable_score
+
+def start_OpenCTI_stream_producer(queue_size = None, reconnect_delay = None):
+
+	"""
+	Function which start a thread reading the OpenCTI live stream in background.
+	Events are put in a bounded queue, so the thread waits when the consumer is late (backpressure).
+	When the connection is lost, the thread reconnects after a delay and resumes after the last event received, so the events sent meanwhile aren't lost.
+
+		Parameters:
+			queue_size (int): maximum number of events waiting in the queue (variables.daemon_queue_size by default)
+			reconnect_delay (float): delay in seconds before a reconnection (variables.daemon_reconnect_delay by default)
+
+		Returns:
+			queue.Queue: queue of the events (see iterate_OpenCTI_stream())
+			threading.Event: event to set to stop the thread
+	"""
+
+	if queue_size is None:
+		queue_size = variables.daemon_queue_size
+	if reconnect_delay is None:
+		reconnect_delay = variables.daemon_reconnect_delay
 
-def check_args(arg_ndays):
+	OpenCTI_events_queue = queue.Queue(maxsize=queue_size)
+	OpenCTI_producer_stop = threading.Event()
+
+	def produce_OpenCTI_events():
+		last_event_id = ""
+
+		# Loop over the connections until the consumer asks to stop
+		while not OpenCTI_producer_stop.is_set():
+			for OpenCTI_event_execution, OpenCTI_event in iterate_OpenCTI_stream(last_event_id):
+				if OpenCTI_producer_stop.is_set():
+					return
+				if not OpenCTI_event_execution:
+					pprint(""" OpenCTI live stream interrupted ({0}), reconnection in {1} s """, "ERROR", OpenCTI_event, reconnect_delay, center='!')
+					run_metrics.increment("stream_reconnections_total")
+					break
+				if OpenCTI_event["id"]:
+					last_event_id = OpenCTI_event["id"]
+				if not put_until_stopped(OpenCTI_events_queue, OpenCTI_event, OpenCTI_producer_stop):
+					return
+			OpenCTI_producer_stop.wait(reconnect_delay)
+
+	threading.Thread(target=produce_OpenCTI_events, name="OpenCTI_stream_producer", daemon=True).start()
+
+	return OpenCTI_events_queue, OpenCTI_producer_stop
+
+def synchronize_OpenCTI_events(OpenCTI_events_batch, QRadar_maps, mappings, plan_only = False):
+
+	"""
+	Function which synchronize a micro batch of live stream events in QRadar referentials.
+	The batch is planned against the referentials kept in memory, so only the needed writes are sent, and the referentials are updated after the writes.
+	A referential is read again from QRadar after a failure, so the next plan starts from what has really been written.
+
+		Parameters:
+			OpenCTI_events_batch (dict): last score of the observables of the batch by type (None for a deletion), for example : {"IPv4-Addr": {"127.0.0.1": 50, "127.0.0.2": None}}
+			QRadar_maps (dict): datas of each referential by name (None if it has to be read, see get_mapping_name()), updated by the function
+			mappings (dict): mappings of each type (see variables.sync_mappings), for example : {"IPv4-Addr": [{"type": "IPv4-Addr", "map": "Malicious - IP"}]}
+			plan_only (bool): only display the synchronization plans, without writing anything in QRadar
+
+		Returns:
+			dict: observables which couldn't be synchronized in every referential of their type, in the same format as OpenCTI_events_batch
+	"""
+
+	OpenCTI_events_not_synchronized = {}
+
+	for observable_type, observables in OpenCTI_events_batch.items():
+
+		# Split the created and updated observables from the deleted ones
+		IPs_updated = new_score_store(observable_type)
+		IPs_deleted = new_score_store(observable_type)
+		for observable_value, observable_score in observables.items():
+			if observable_score is None:
+				IPs_deleted.add(observable_value, 0)
+			else:
+				IPs_updated.add(observable_value, observable_score)
+
+		# The events keep the score cache up to date for the reconciliations
+		score_cache.put(IPs_updated.items(), IPs_deleted.keys(), observable_type)
+
+		for mapping in mappings[observable_type]:
+			map_name, QRadar_instance, mapping_name = mapping["map"], mapping.get("instance", "default"), get_mapping_name(mapping)
+
+			# Read the referential on the first batch and after a failure
+			if QRadar_maps.get(mapping_name) is None:
+				get_QRadar_IPv4_execution, QRadar_maps[mapping_name] = get_QRadar_mapping_IPv4(mapping, observable_type)
+				if not get_QRadar_IPv4_execution:
+					pprint("""Retrieval of {0} in QRadar {1} : Failed """, "ERROR", observable_type, mapping_name, center='!')
+					QRadar_maps[mapping_name] = None
+					OpenCTI_events_not_synchronized[observable_type] = observables
+					continue
+			QRadar_IPs = QRadar_maps[mapping_name]
+
+			# The events of a CIDR mapping are applied to the IPv4 of its referential and of its managed blocks
+			if mapping.get("cidr_set"):
+				QRadar_blocks = get_CIDR_blocks(mapping)
+				IPs_held = get_CIDR_IPv4(QRadar_IPs, QRadar_blocks)
+				IPs_sync_plan = plan_IPv4_sync(IPs_updated, IPs_held, mapping.get("threshold"))
+				IPs_sync_plan["delete"].update(IPs_held.intersection(IPs_deleted))
+				IPs_sync_counts = count_IPv4_sync_plan(IPs_sync_plan)
+				pprint(""" Live stream : {0} {1} in "{2}", {3} added, {4} updated, {5} deleted """, "INFO", len(observables), observable_type, mapping_name, IPs_sync_counts["add"], IPs_sync_counts["update"], IPs_sync_counts["delete"])
+				if IPs_sync_counts["add"] + IPs_sync_counts["update"] + IPs_sync_counts["delete"] == 0:
+					continue
+
+				write_CIDR_IPv4_execution, QRadar_maps[mapping_name] = write_CIDR_IPv4(apply_IPv4_sync_plan(IPs_held, IPs_sync_plan), QRadar_IPs, QRadar_blocks, mapping, plan_only)
+				if not write_CIDR_IPv4_execution:
+					pprint(""" Live stream : synchronization of {0} in "{1}" failed, it will be retried """, "ERROR", observable_type, mapping_name, center='!')
+					QRadar_maps[mapping_name] = None
+					OpenCTI_events_not_synchronized[observable_type] = observables
+				continue
+
+			# The deleted observables are removed from QRadar with their value in the referential
+			IPs_sync_plan = plan_IPv4_sync(IPs_updated, QRadar_IPs, mapping.get("threshold"))
+			IPs_sync_plan["delete"].update(QRadar_IPs.intersection(IPs_deleted))
+			IPs_sync_counts = count_IPv4_sync_plan(IPs_sync_plan)
+			pprint(""" Live stream : {0} {1} in "{2}", {3} added, {4} updated, {5} deleted """, "INFO", len(observables), observable_type, mapping_name, IPs_sync_counts["add"], IPs_sync_counts["update"], IPs_sync_counts["delete"])
+
+			if plan_only:
+				continue
+
+			# The referentials already synchronized have nothing to write when the observables are retried
+			if execute_IPv4_sync_plan(IPs_sync_plan, map_name, QRadar_instance):
+				QRadar_IPs.update(IPs_sync_plan["add"])
+				QRadar_IPs.update(IPs_sync_plan["update"])
+				QRadar_maps[mapping_name] = QRadar_IPs.difference(IPs_sync_plan["delete"])
+			else:
+				pprint(""" Live stream : synchronization of {0} in "{1}" failed, it will be retried """, "ERROR", observable_type, mapping_name, center='!')
+				QRadar_maps[mapping_name] = None
+				OpenCTI_events_not_synchronized[observable_type] = observables
+
+	return OpenCTI_events_not_synchronized
+
+def consume_OpenCTI_stream(OpenCTI_events_queue, mappings = None, plan_only = False, stop = None, batch_size = None, batch_interval = None, reconcile_interval = None):
+
+	"""
+	Function which synchronize the events of the OpenCTI live stream in QRadar referentials by micro batches, until it is stopped.
+	A batch is written when it has batch_size observables or when its first event has waited batch_interval seconds, the last event of an observable wins.
+	The events can't tell everything (writes lost, observables deleted while the daemon was stopped...), so a full verification of the referentials (see verifiy_IPv4_score()) runs every reconcile_interval seconds.
+
+		Parameters:
+			OpenCTI_events_queue (queue.Queue): queue of the events filled by the producer (see start_OpenCTI_stream_producer())
+			mappings (list): observable types synchronized and their QRadar referential (variables.sync_mappings by default)
+			plan_only (bool): only display the synchronization plans, without writing anything in QRadar
+			stop (threading.Event): event to set to stop the synchronization (it runs until the program is stopped if None)
+			batch_size (int): maximum number of observables per batch (variables.daemon_batch_size by default)
+			batch_interval (float): maximum wait in seconds of an event before its batch is written (variables.daemon_batch_interval by default)
+			reconcile_interval (float): interval in seconds between two full verifications (variables.daemon_reconcile_interval by default)
+	"""
+
+	if mappings is None:
+		mappings = variables.sync_mappings
+	if batch_size is None:
+		batch_size = variables.daemon_batch_size
+	if batch_interval is None:
+		batch_interval = variables.daemon_batch_interval
+	if reconcile_interval is None:
+		reconcile_interval = variables.daemon_reconcile_interval
+
+	mappings_by_type = {}
+	for mapping in mappings:
+		mappings_by_type.setdefault(mapping["type"], []).append(mapping)
+	QRadar_maps = {}
+
+	# Observables of the current batch by type, for example : {"IPv4-Addr": {"127.0.0.1": 50}}, and the date when it has to be written
+	OpenCTI_events_batch = {}
+	batch_deadline = None
+	reconcile_deadline = time.monotonic() + reconcile_interval
+
+	while stop is None or not stop.is_set():
+
+		# Wait for an event until the batch has to be written, and at most a second to check the stop event
+		OpenCTI_event_timeout = 1 if batch_deadline is None else min(1, max(0, batch_deadline - time.monotonic()))
+		try:
+			OpenCTI_event = OpenCTI_events_queue.get(timeout=OpenCTI_event_timeout)
+		except queue.Empty:
+			OpenCTI_event = None
+
+		if OpenCTI_event is not None:
+			run_metrics.increment("stream_events_total", event=OpenCTI_event["event"])
+			observable_type, observable_value, observable_score = parse_OpenCTI_stream_event(OpenCTI_event)
+			if observable_type in mappings_by_type and observable_value:
+				OpenCTI_events_batch.setdefault(observable_type, {})[observable_value] = observable_score
+				if batch_deadline is None:
+					batch_deadline = time.monotonic() + batch_interval
+
+		# Write the batch when it is full or when its first event has waited enough, the observables in error stay in the next batch
+		if batch_deadline is not None and (time.monotonic() >= batch_deadline or sum(len(observables) for observables in OpenCTI_events_batch.values()) >= batch_size):
+			OpenCTI_events_batch = synchronize_OpenCTI_events(OpenCTI_events_batch, QRadar_maps, mappings_by_type, plan_only)
+			batch_deadline = time.monotonic() + batch_interval if OpenCTI_events_batch else None
+
+		# Verify the whole referentials on a slow schedule, they are read again by the next batch
+		if time.monotonic() >= reconcile_deadline:
+			for mapping in mappings:
+				pprint(""" Reconciliation of {0} stored in {1} """, "INFO", mapping["type"], get_mapping_name(mapping), center="=")
+				get_QRadar_IPv4_execution, QRadar_IPs = get_QRadar_mapping_IPv4(mapping, mapping["type"])
+				if not get_QRadar_IPv4_execution:
+					reconcile_execution = False
+				elif mapping.get("cidr_set"):
+					reconcile_execution = synchronize_CIDR_IPv4(new_score_store(mapping["type"]), QRadar_IPs, mapping, plan_only, mapping["type"])
+				else:
+					reconcile_execution = verifiy_IPv4_score(QRadar_IPs, mapping["map"], plan_only, observable_type = mapping["type"], threshold = mapping.get("threshold"), QRadar_instance = mapping.get("instance", "default"))
+				if not reconcile_execution:
+					pprint(""" Reconciliation of {0} in QRadar {1} : Failed """, "ERROR", mapping["type"], get_mapping_name(mapping), center='!')
+				QRadar_maps[get_mapping_name(mapping)] = None
+			# The score cache stays open as long as the daemon runs, its old entries are evicted on the same schedule instead of on close
+			pprint(""" {0} entries evicted from the score cache """, "DEBUG", score_cache.evict())
+			reconcile_deadline = time.monotonic() + reconcile_interval
+
+def daemon(ndays = 1, plan_only = False, incremental = False, stream = False, timings = None, partitions = None, mappings = None, checkpoint = False):
+
+	'''
+	Function of the daemon mode, it keeps QRadar referentials synchronized with the OpenCTI live stream until the program is stopped.
+	The live stream is read from the start, then a full synchronization is done (see main()) and the events received meanwhile and after are synchronized by micro batches (see consume_OpenCTI_stream()).
+
+		Parameters:
+			ndays, plan_only, incremental, stream, timings, partitions, mappings, checkpoint: parameters of the full synchronization (see main())
+	'''
+
+	global PROGRESS_BARS
+
+	OpenCTI_events_queue, OpenCTI_producer_stop = start_OpenCTI_stream_producer()
+
+	main(ndays, plan_only, incremental, stream, timings, partitions, mappings, checkpoint)
+
+	# The progress bars of the micro batches would flood the output of a long-running process
+	PROGRESS_BARS = False
+
+	pprint(""" Synchronization of the OpenCTI live stream """, "INFO", center="=")
+	try:
+		consume_OpenCTI_stream(OpenCTI_events_queue, mappings, plan_only)
+	except KeyboardInterrupt:
+		pprint(""" Daemon stopped """, "INFO", center="=")
+	finally:
+		OpenCTI_producer_stop.set()
+
+def check_args(arg_ndays, arg_partitions = None):
 	if not 0 < arg_ndays < 7:
 		raise argparse.ArgumentTypeError("0 < ndays < 7")
+	if arg_partitions is not None and arg_partitions < 1:
+		raise argparse.ArgumentTypeError("partitions >= 1")
 	return
 
 if __name__ == '__main__':
 
 	program_args = argument_parser.parse_args()
-	check_args(program_args.ndays)
+	check_args(program_args.ndays, program_args.partitions)
 	
 	if program_args.quiet:
-		DEBUG = ""
+		configure_logging("", program_args.log_format)
 	else:
-		DEBUG = program_args.verbosity
+		configure_logging(program_args.verbosity, program_args.log_format)
 	
 module_list = ["requests", "json", "secrets", "variables", "tqdm", "urllib3", "datetime"]
 try:
 	from tqdm import tqdm
-	import requests, json, secrets, variables, urllib3, datetime
+	import requests, json, secrets, variables, urllib3, urllib.parse, datetime, concurrent.futures, itertools, os, queue, time, random, email.utils
+	from observable_store import new_score_store
+	from IPv4_store import IPv4ScoreStore, CIDR_to_range
+	from metrics import run_metrics
+	from checkpoint import run_checkpoint
+	from score_cache import score_cache
+	from rate_limiter import AdaptiveRateLimiter
+	from atomic_file import write_file_atomically
 except Exception as e:
-	pprint(""" {0} """.format(e).center(100, '!'), "ERROR")
+	pprint(""" {0} """, "ERROR", e, center='!')
 else:
-	pprint(""" Script start """.center(100, "="), "INFO")
-	main(ndays=program_args.ndays)
-	pprint(""" Script end """.center(100, "="), "INFO")
\ No newline at end of file
+	# The synchronization only runs when the script is executed, so the functions can be imported (see benchmark.py)
+	if __name__ == '__main__':
+		pprint(""" Script start """, "INFO", center="=")
+		timings = {}
+
+		# The score cache is kept between the runs, the synchronization works without it if it can't be opened
+		if variables.score_cache_file:
+			open_score_cache_execution, open_score_cache_error = score_cache.open(variables.score_cache_file, variables.score_cache_ttl, variables.score_cache_max_entries)
+			if not open_score_cache_execution:
+				pprint(""" Cannot open the score cache {0} : {1} """, "ERROR", variables.score_cache_file, open_score_cache_error, center='!')
+
+		if program_args.daemon:
+			daemon(ndays=program_args.ndays, plan_only=program_args.plan_only, incremental=program_args.incremental, stream=program_args.stream, timings=timings, partitions=program_args.partitions, checkpoint=program_args.checkpoint)
+		else:
+			main(ndays=program_args.ndays, plan_only=program_args.plan_only, incremental=program_args.incremental, stream=program_args.stream, timings=timings, partitions=program_args.partitions, checkpoint=program_args.checkpoint)
+
+		# The entries older than the TTL are removed when the cache is closed
+		score_cache.close()
+
+		# Export the durations of the steps with the counters and latencies recorded during the run
+		if program_args.metrics_file:
+			run_metrics.add_phases(timings)
+			write_metrics_execution, write_metrics_error = run_metrics.write(program_args.metrics_file, program_args.metrics_format)
+			if not write_metrics_execution:
+				pprint(""" Cannot write the metrics {0} : {1} """, "ERROR", program_args.metrics_file, write_metrics_error, center='!')
+			else:
+				pprint(""" Metrics written in {0} """, "INFO", program_args.metrics_file, center="=")
+		pprint(""" Script end """, "INFO", center="=")
\ No newline at end of file
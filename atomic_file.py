@@ -0,0 +1,19 @@
+import os
+
+def write_file_atomically(file_path, content):
+
+	"""
+	Function which replace the content of a file atomically : the content is written in a temporary file next to it, which then replaces the file.
+	A reader (the next run, a metrics collector, ...) never reads a partial file, and the previous content is kept if the write fails.
+
+		Parameters:
+			file_path (str): path of the file
+			content (str): new content of the file
+
+		Raises:
+			OSError: the file cannot be written
+	"""
+
+	with open(file_path + ".tmp", "w") as temporary_file:
+		temporary_file.write(content)
+	os.replace(file_path + ".tmp", file_path)
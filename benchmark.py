@@ -0,0 +1,711 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import datetime
+import gzip
+import itertools
+import math
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import OpenCTI_QRadar
+import variables
+from IPv4_store import IPv4_to_int, int_to_IPv4, CIDR_to_range
+
+# First IPv4 of the fake dataset, the observable n is the IPv4 10.0.0.0 + n
+DATASET_FIRST_IPv4 = IPv4_to_int("10.0.0.0")
+
+# The observables of the fake dataset are created during the last day, the observable 0 is the newest
+DATASET_DURATION = datetime.timedelta(days = 1)
+
+# With --cidr-set, the first half of the dataset has the same score by ranges of DATASET_DENSE_RANGE contiguous IPv4, like the ranges of a hosting provider or a scanner
+DATASET_DENSE_RANGE = 64
+
+# Blocks of the QRadar reference set which weren't written by the synchronization (by an analyst or another feed), they must be left untouched
+# The first one covers the whole dataset and is larger than variables.CIDR_max_size, the last ones can't be parsed as IPv4 blocks
+FOREIGN_CIDR_BLOCKS = ["10.0.0.0/8", "192.168.0.0/16", "2001:db8::/32", "10.0.0.0/33"]
+
+argument_parser = argparse.ArgumentParser(description="Benchmark of the synchronization against local OpenCTI and QRadar stand-in servers")
+argument_parser.add_argument("-n", "--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="number of IPv4 in OpenCTI for each run (1000 <= size <= 1000000)")
+argument_parser.add_argument("--OpenCTI-latency", type=float, default=0, help="latency added to each OpenCTI request in milliseconds")
+argument_parser.add_argument("--QRadar-latency", type=float, default=0, help="latency added to each QRadar request in milliseconds")
+argument_parser.add_argument("--page-size", type=int, default=None, help="number of observables requested per OpenCTI page (variables.OpenCTI_page_size by default)")
+argument_parser.add_argument("--QRadar-page-size", type=int, default=None, help="number of entries requested per QRadar referential page (variables.QRadar_page_size by default)")
+argument_parser.add_argument("--prefill", type=float, default=0.1, help="part of the OpenCTI IPv4 already in QRadar referential with an outdated score")
+argument_parser.add_argument("--stale", type=float, default=0.01, help="part of IPv4 in QRadar referential which don't exist in OpenCTI, relative to the dataset size")
+argument_parser.add_argument("--plan-only", action="store_true", help="benchmark the synchronization without writing anything in QRadar")
+argument_parser.add_argument("-s", "--stream", action="store_true", help="benchmark the streaming mode")
+argument_parser.add_argument("--query-profile", type=str, choices=["sync", "full"], default=None, help="fields of the observables requested in OpenCTI (variables.query_profile by default)")
+argument_parser.add_argument("--no-compression", action="store_true", help="don't ask OpenCTI for gzip compressed responses")
+argument_parser.add_argument("-p", "--partitions", type=int, default=None, help="number of time windows retrieved concurrently in OpenCTI (variables.OpenCTI_partitions by default)")
+argument_parser.add_argument("--daemon-events", type=int, default=0, help="number of events sent in the OpenCTI live stream after the synchronization, to measure their propagation in QRadar by the daemon mode")
+argument_parser.add_argument("--events-rate", type=float, default=1000, help="number of live stream events sent per second")
+argument_parser.add_argument("--QRadar-capacity", type=int, default=None, help="number of QRadar requests in progress above which the QRadar stand-in answers 429, like an overloaded console")
+argument_parser.add_argument("--QRadar-rate-limit", type=float, default=None, help="maximum number of QRadar requests per second sent by the synchronization (variables.HTTP_rate_limits by default)")
+argument_parser.add_argument("--score-cache", action="store_true", help="after the synchronization, verify the whole QRadar referential twice with a new score cache, to measure the verification with a cold and a warm cache")
+argument_parser.add_argument("--cidr-set", action="store_true", help="aggregate the dense ranges of the dataset in CIDR blocks written in a QRadar reference set, which already holds blocks unknown to the synchronization")
+
+def dataset_score(index, dense_end = 0):
+
+	"""
+	Function which returns the OpenCTI score of an observable of the fake dataset, scores are spread between 0 and 100.
+
+		Parameters:
+			index (int): index of the observable in the dataset
+			dense_end (int): index of the first observable after the dense ranges (see DATASET_DENSE_RANGE)
+
+		Returns:
+			int: score of the observable
+	"""
+
+	if index < dense_end:
+		index -= index % DATASET_DENSE_RANGE
+	return (index * 7) % 101
+
+def dataset_date(state, index):
+
+	"""
+	Function which returns the creation (and update) date of an observable of the fake dataset, in the date format of OpenCTI.
+	"""
+
+	return (state.end_time - DATASET_DURATION * index / state.size).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+class BenchmarkState:
+
+	"""
+	Datas served by the stand-in servers and number of requests received per endpoint.
+
+		Attributes:
+			size (int): number of IPv4 in OpenCTI
+			dense_end (int): index of the first observable after the dense ranges (0 without CIDR mapping)
+			CIDR_mapping (dict): mapping of the synchronization writing the reference set (None without CIDR mapping)
+			QRadar_map (dict): QRadar referential, for example : {"127.0.0.1": "50"}
+			QRadar_set (set): QRadar reference set of CIDR blocks, for example : {"10.0.0.0/26"}
+			requests_count (dict): number of requests per endpoint, for example : {"graphql": 20, "bulk_load": 4} ("rejected" for the QRadar requests answered with 429)
+			QRadar_in_flight (int): number of QRadar requests in progress
+			stream_scores (dict): scores changed by the live stream events already sent (None for a deleted observable), for example : {12: 80}
+			stream_events (list): events of the live stream, for example : [("update", 12, 80), ("delete", 13, None)]
+			stream_latencies (list): seconds between the sending of an event and the write of its IPv4 in QRadar referential
+	"""
+
+	def __init__(self, size, prefill, stale, CIDR_mapping = None):
+
+		"""
+			Parameters:
+				size (int): number of IPv4 in OpenCTI
+				prefill (float): part of the OpenCTI IPv4 already in QRadar referential with an outdated score
+				stale (float): part of IPv4 in QRadar referential which don't exist in OpenCTI, relative to the dataset size
+				CIDR_mapping (dict): mapping of the synchronization writing the reference set, the first half of the dataset is then made of dense ranges (None for no reference set)
+		"""
+
+		self.size = size
+		self.dense_end = size // 2 if CIDR_mapping is not None else 0
+		self.CIDR_mapping = CIDR_mapping
+		self.end_time = datetime.datetime.now(datetime.timezone.utc)
+		self.QRadar_map = {}
+		self.QRadar_map_items = None
+		self.QRadar_set = set(FOREIGN_CIDR_BLOCKS) if CIDR_mapping is not None else set()
+		self.QRadar_set_items = None
+		self.requests_count = {}
+		self.QRadar_in_flight = 0
+		self.OpenCTI_bytes_count = 0
+		self.lock = threading.Lock()
+		self.stream_scores = {}
+		self.stream_events = []
+		self.stream_sent = {}
+		self.stream_latencies = []
+		self.stream_stop = threading.Event()
+
+		# IPv4 of OpenCTI already in QRadar, with a score which is never the OpenCTI one
+		if prefill > 0:
+			for index in range(0, size, max(1, round(1 / prefill))):
+				self.QRadar_map[int_to_IPv4(DATASET_FIRST_IPv4 + index)] = str(dataset_score(index, self.dense_end) + 101)
+
+		# IPv4 of QRadar which are after the last IPv4 of OpenCTI, so they don't exist in OpenCTI
+		for index in range(size, size + int(size * stale)):
+			self.QRadar_map[int_to_IPv4(DATASET_FIRST_IPv4 + index)] = "99"
+
+	def count(self, endpoint):
+		with self.lock:
+			self.requests_count[endpoint] = self.requests_count.get(endpoint, 0) + 1
+
+	def start_QRadar_request(self, capacity):
+
+		"""
+		Function which count a QRadar request in progress, like an overloaded console the request is rejected when capacity requests are already in progress.
+
+			Parameters:
+				capacity (int): maximum number of QRadar requests in progress (None for no limit)
+
+			Returns:
+				bool: True if the request is accepted, False if it has to be answered with 429
+		"""
+
+		with self.lock:
+			if capacity is not None and self.QRadar_in_flight >= capacity:
+				self.requests_count["rejected"] = self.requests_count.get("rejected", 0) + 1
+				return False
+			self.QRadar_in_flight += 1
+			return True
+
+	def end_QRadar_request(self):
+		with self.lock:
+			self.QRadar_in_flight -= 1
+
+	def score(self, index):
+
+		"""
+		Function which returns the current OpenCTI score of an observable of the fake dataset, None if it has been deleted by a live stream event.
+		"""
+
+		return self.stream_scores.get(index, dataset_score(index, self.dense_end))
+
+	def make_stream_events(self, count):
+
+		"""
+		Function which prepare the events of the live stream : score updates spread over the dataset (crossing the threshold or not) and a deletion every 5 events.
+		"""
+
+		self.stream_events = []
+		for event_index in range(count):
+			index = (event_index * 7919) % self.size
+			if event_index % 5 == 4:
+				self.stream_events.append(("delete", index, None))
+			else:
+				self.stream_events.append(("update", index, (dataset_score(index, self.dense_end) + 37 * (event_index + 1)) % 101))
+
+	def send_stream_event(self, event_id):
+
+		"""
+		Function which apply a live stream event to the dataset and returns it in the Server-Sent Events format.
+		"""
+
+		event_type, index, score = self.stream_events[event_id]
+		STIX_object = {"type": "ipv4-addr", "value": int_to_IPv4(DATASET_FIRST_IPv4 + index)}
+		if score is not None:
+			STIX_object["x_opencti_score"] = score
+		with self.lock:
+			self.stream_scores[index] = score
+			self.stream_sent[STIX_object["value"]] = time.perf_counter()
+		return "id: {0}\nevent: {1}\ndata: {2}\n\n".format(event_id, event_type, json.dumps({"data": STIX_object}))
+
+	def write_QRadar_map(self, IPs_to_write = None, IP_to_delete = None):
+
+		"""
+		Function which update the QRadar referential, the snapshot used by the paginated reads is dropped.
+
+			Returns:
+				bool: False if the IPv4 to delete isn't in the referential, True otherwise
+		"""
+
+		with self.lock:
+			self.QRadar_map_items = None
+			# Propagation time of the live stream events
+			for IP in itertools.chain(IPs_to_write or (), [IP_to_delete] if IP_to_delete is not None else ()):
+				if IP in self.stream_sent:
+					self.stream_latencies.append(time.perf_counter() - self.stream_sent.pop(IP))
+			if IPs_to_write is not None:
+				self.QRadar_map.update(IPs_to_write)
+			if IP_to_delete is not None:
+				return self.QRadar_map.pop(IP_to_delete, None) is not None
+			return True
+
+	def read_QRadar_map(self, first_item, last_item):
+
+		"""
+		Function which returns a range of the QRadar referential and the number of entries of the referential.
+		"""
+
+		with self.lock:
+			if self.QRadar_map_items is None:
+				self.QRadar_map_items = list(self.QRadar_map.items())
+			return self.QRadar_map_items[first_item:last_item + 1], len(self.QRadar_map_items)
+
+	def write_QRadar_set(self, blocks_to_write = None, block_to_delete = None):
+
+		"""
+		Function which update the QRadar reference set, the snapshot used by the paginated reads is dropped.
+
+			Returns:
+				bool: False if the block to delete isn't in the reference set, True otherwise
+		"""
+
+		with self.lock:
+			self.QRadar_set_items = None
+			# Propagation time of the live stream events written in a block
+			for block in blocks_to_write or ():
+				first_address, last_address = CIDR_to_range(block)
+				for IP in [IP for IP in self.stream_sent if first_address <= IPv4_to_int(IP) <= last_address]:
+					self.stream_latencies.append(time.perf_counter() - self.stream_sent.pop(IP))
+			if blocks_to_write is not None:
+				self.QRadar_set.update(blocks_to_write)
+			if block_to_delete is not None:
+				if block_to_delete not in self.QRadar_set:
+					return False
+				self.QRadar_set.discard(block_to_delete)
+			return True
+
+	def read_QRadar_set(self, first_item, last_item):
+
+		"""
+		Function which returns a range of the QRadar reference set and the number of blocks of the reference set.
+		"""
+
+		with self.lock:
+			if self.QRadar_set_items is None:
+				self.QRadar_set_items = sorted(self.QRadar_set)
+			return self.QRadar_set_items[first_item:last_item + 1], len(self.QRadar_set_items)
+
+	def check_QRadar_map(self, threshold):
+
+		"""
+		Function which count the entries of QRadar referential which differ from what a synchronization should give.
+		With a CIDR mapping, the IPv4 of the blocks of the reference set managed by the synchronization (see OpenCTI_QRadar.get_CIDR_blocks()) are held with the score of their block,
+		the other blocks of the reference set are ignored.
+
+			Returns:
+				int: number of IPv4 missing in QRadar, with a wrong score, held both in the referential and in a block, or which should have been deleted (the IPv4 which don't exist in OpenCTI only if variables.QRadar_delete_missing is True)
+		"""
+
+		CIDR_blocks = OpenCTI_QRadar.get_CIDR_blocks(self.CIDR_mapping) if self.CIDR_mapping is not None else {}
+
+		with self.lock:
+			# IPv4 held by the managed blocks of the reference set
+			CIDR_IPs = {}
+			for block, block_score in CIDR_blocks.items():
+				if block in self.QRadar_set:
+					first_address, last_address = CIDR_to_range(block)
+					CIDR_IPs.update((int_to_IPv4(IP_address), str(block_score)) for IP_address in range(first_address, last_address + 1))
+
+			IPs_wrong = len(CIDR_IPs.keys() & self.QRadar_map.keys())
+			for index in range(self.size):
+				IP_score = self.score(index)
+				IP = int_to_IPv4(DATASET_FIRST_IPv4 + index)
+				IP_value = self.QRadar_map.get(IP, CIDR_IPs.get(IP))
+				if IP_score is None:
+					IPs_wrong += IP_value is not None
+				elif (IP_score > threshold and IP_value != str(IP_score)) or (IP_score <= threshold and IP_value is not None):
+					IPs_wrong += 1
+			if variables.QRadar_delete_missing:
+				IPs_wrong += sum(1 for IP in itertools.chain(self.QRadar_map.keys(), CIDR_IPs.keys()) if not 0 <= IPv4_to_int(IP) - DATASET_FIRST_IPv4 < self.size)
+			return IPs_wrong
+
+def make_request_handler(state, latency, events_rate = 1000, QRadar_capacity = None):
+
+	"""
+	Function which build the request handler of a stand-in server.
+
+		Parameters:
+			state (BenchmarkState): datas served by the server
+			latency (float): latency added to each request in seconds
+			events_rate (float): number of live stream events sent per second
+			QRadar_capacity (int): number of QRadar requests in progress above which the requests are answered with 429 and a Retry-After header (None for no limit)
+
+		Returns:
+			class: request handler answering the OpenCTI GraphQL and live stream endpoints and the QRadar reference maps and sets endpoints
+	"""
+
+	class BenchmarkRequestHandler(BaseHTTPRequestHandler):
+
+		# Keep-alive connections like the real APIs, without Nagle delays on small responses
+		protocol_version = "HTTP/1.1"
+		disable_nagle_algorithm = True
+
+		def log_message(self, format, *args):
+			pass
+
+		def send_json(self, status_code, response, headers = {}):
+			response_body = json.dumps(response).encode()
+			time.sleep(latency)
+			self.send_response(status_code)
+			self.send_header("Content-Type", "application/json")
+			# Compress the response when the client accepts it, like OpenCTI does
+			if "gzip" in self.headers.get("Accept-Encoding", ""):
+				response_body = gzip.compress(response_body, compresslevel=6)
+				self.send_header("Content-Encoding", "gzip")
+			self.send_header("Content-Length", str(len(response_body)))
+			for header, value in headers.items():
+				self.send_header(header, value)
+			self.end_headers()
+			self.wfile.write(response_body)
+			return len(response_body)
+
+		def read_body(self):
+			return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+		def handle_QRadar_request(self, answer_QRadar_request):
+			# The QRadar requests beyond the capacity of the stand-in are rejected, the client is asked to wait a second
+			if not state.start_QRadar_request(QRadar_capacity):
+				self.send_json(429, {"message": "too many requests"}, {"Retry-After": "1"})
+				return
+			try:
+				answer_QRadar_request()
+			finally:
+				state.end_QRadar_request()
+
+		def do_POST(self):
+			request_path = urllib.parse.urlparse(self.path).path
+			request_body = self.read_body()
+			if request_path == "/graphql":
+				state.count("graphql")
+				state.OpenCTI_bytes_count += self.send_json(200, answer_OpenCTI_query(state, json.loads(request_body)["query"]))
+			elif request_path.startswith("/api/reference_data/maps/bulk_load/"):
+				self.handle_QRadar_request(lambda: self.answer_bulk_load(request_path, request_body))
+			elif request_path.startswith("/api/reference_data/sets/bulk_load/"):
+				self.handle_QRadar_request(lambda: self.answer_set_bulk_load(request_path, request_body))
+			else:
+				self.send_json(404, {"message": "unknown endpoint"})
+
+		def answer_bulk_load(self, request_path, request_body):
+			state.count("bulk_load")
+			state.write_QRadar_map(IPs_to_write = {IP: str(IP_value) for IP, IP_value in json.loads(request_body).items()})
+			self.send_json(200, {"name": request_path.rsplit("/", 1)[1]})
+
+		def answer_set_bulk_load(self, request_path, request_body):
+			state.count("set_bulk_load")
+			state.write_QRadar_set(blocks_to_write = json.loads(request_body))
+			self.send_json(200, {"name": request_path.rsplit("/", 1)[1]})
+
+		def send_stream(self):
+			# The live stream is sent in chunks, an event as soon as it is due, then heartbeats until the end of the benchmark
+			self.send_response(200)
+			self.send_header("Content-Type", "text/event-stream")
+			self.send_header("Transfer-Encoding", "chunked")
+			self.end_headers()
+			self.close_connection = True
+
+			def write_chunk(text):
+				chunk = text.encode()
+				self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+				self.wfile.flush()
+
+			stream_start = time.perf_counter()
+			first_event = int(self.headers.get("Last-Event-ID", "-1")) + 1
+			try:
+				write_chunk("event: connected\ndata: {}\n\n")
+				for event_id in range(first_event, len(state.stream_events)):
+					time.sleep(max(0, stream_start + (event_id - first_event) / events_rate - time.perf_counter()))
+					write_chunk(state.send_stream_event(event_id))
+				while not state.stream_stop.wait(0.5):
+					write_chunk(": heartbeat\n\n")
+				write_chunk("")
+			except (BrokenPipeError, ConnectionResetError):
+				pass
+
+		def do_GET(self):
+			request_path = urllib.parse.urlparse(self.path).path
+			if request_path == "/stream":
+				state.count("stream")
+				self.send_stream()
+				return
+			if request_path.startswith("/api/reference_data/maps/"):
+				self.handle_QRadar_request(lambda: self.answer_map_get(request_path))
+			elif request_path.startswith("/api/reference_data/sets/"):
+				self.handle_QRadar_request(lambda: self.answer_set_get(request_path))
+			else:
+				self.send_json(404, {"message": "unknown endpoint"})
+
+		def answer_map_get(self, request_path):
+			state.count("map_get")
+			first_item, last_item = 0, state.size * 2
+			if "Range" in self.headers:
+				first_item, last_item = map(int, self.headers["Range"].split("=")[1].split("-"))
+			QRadar_map_items, number_of_elements = state.read_QRadar_map(first_item, last_item)
+			self.send_json(200, {
+				"number_of_elements": number_of_elements,
+				"data": {IP: {"value": IP_value, "source": "reference data api"} for IP, IP_value in QRadar_map_items},
+				"name": request_path.rsplit("/", 1)[1],
+				"element_type": "NUM"
+			}, {"Content-Range": "items {0}-{1}/{2}".format(first_item, first_item + len(QRadar_map_items) - 1, number_of_elements)})
+
+		def answer_set_get(self, request_path):
+			state.count("set_get")
+			first_item, last_item = 0, state.size * 2
+			if "Range" in self.headers:
+				first_item, last_item = map(int, self.headers["Range"].split("=")[1].split("-"))
+			QRadar_set_items, number_of_elements = state.read_QRadar_set(first_item, last_item)
+			self.send_json(200, {
+				"number_of_elements": number_of_elements,
+				"data": [{"value": block, "source": "reference data api"} for block in QRadar_set_items],
+				"name": urllib.parse.unquote(request_path.rsplit("/", 1)[1]),
+				"element_type": "CIDR"
+			}, {"Content-Range": "items {0}-{1}/{2}".format(first_item, first_item + len(QRadar_set_items) - 1, number_of_elements)})
+
+		def do_DELETE(self):
+			request_path = urllib.parse.urlparse(self.path).path
+			if request_path.startswith("/api/reference_data/sets/"):
+				self.handle_QRadar_request(lambda: self.answer_set_delete(request_path))
+			else:
+				self.handle_QRadar_request(lambda: self.answer_delete(request_path))
+
+		def answer_delete(self, request_path):
+			state.count("delete")
+			if state.write_QRadar_map(IP_to_delete = urllib.parse.unquote(request_path.rsplit("/", 1)[1])):
+				self.send_json(200, {"name": request_path.split("/")[-2]})
+			else:
+				self.send_json(404, {"message": "value not found"})
+
+		def answer_set_delete(self, request_path):
+			state.count("set_delete")
+			if state.write_QRadar_set(block_to_delete = urllib.parse.unquote(request_path.rsplit("/", 1)[1])):
+				self.send_json(200, {"name": urllib.parse.unquote(request_path.split("/")[-2])})
+			else:
+				self.send_json(404, {"message": "value not found"})
+
+	return BenchmarkRequestHandler
+
+def answer_OpenCTI_query(state, OpenCTI_query):
+
+	"""
+	Function which answer a query_IPv4 request like the stixCyberObservables pagination of OpenCTI.
+	The cursors are the index of the observables, the created_at and updated_at filters (see variables.window_query_filter) and the value filter (see variables.IP_query_filter) are applied.
+
+		Parameters:
+			state (BenchmarkState): datas served by the server
+			OpenCTI_query (str): GraphQL query (see variables.query_IPv4)
+
+		Returns:
+			dict: API response
+	"""
+
+	OpenCTI_request_after = re.search(r'after: "(.*?)"', OpenCTI_query).group(1)
+	OpenCTI_request_first = int(re.search(r'first: (\d+)', OpenCTI_query).group(1))
+	OpenCTI_request_values = re.search(r'values: (\[.*?\])\s*operator: "eq"', OpenCTI_query, re.S)
+
+	# The dates decrease with the index, so the date filters give a range of index
+	observables_first, observables_end = 0, state.size
+	for filter_date, filter_operator in re.findall(r'values: "(.*?)"\s*operator: "(\w+)"\s*key: (?:created_at|updated_at)', OpenCTI_query):
+		filter_datetime = datetime.datetime.fromisoformat(filter_date.replace("Z", "+00:00"))
+		if filter_datetime.tzinfo is None:
+			filter_datetime = filter_datetime.replace(tzinfo=datetime.timezone.utc)
+		# Index of the observables whose date is filter_datetime
+		filter_index = (state.end_time - filter_datetime) / DATASET_DURATION * state.size
+		if filter_operator == "gt":
+			observables_end = min(observables_end, math.ceil(filter_index))
+		elif filter_operator == "gte":
+			observables_end = min(observables_end, math.floor(filter_index) + 1)
+		elif filter_operator == "lt":
+			observables_first = max(observables_first, math.floor(filter_index) + 1)
+	observables_first, observables_end = max(observables_first, 0), max(observables_end, 0)
+
+	# Index of the observables matching the filters
+	if OpenCTI_request_values is not None:
+		observables = [IPv4_to_int(IP) - DATASET_FIRST_IPv4 for IP in json.loads(OpenCTI_request_values.group(1))]
+		observables = [index for index in observables if observables_first <= index < observables_end and state.score(index) is not None]
+	else:
+		observables = range(observables_first, max(observables_first, observables_end))
+
+	page_start = int(OpenCTI_request_after) if OpenCTI_request_after else 0
+	page_end = min(page_start + OpenCTI_request_first, len(observables))
+
+	OpenCTI_request_pageInfo = {
+		"startCursor": str(page_start),
+		"endCursor": str(page_end),
+		"hasNextPage": page_end < len(observables),
+		"hasPreviousPage": page_start > 0
+	}
+	if "globalCount" in OpenCTI_query:
+		OpenCTI_request_pageInfo["globalCount"] = len(observables)
+
+	# Only the fields requested in the node selection are returned
+	OpenCTI_request_node_fields = set(re.findall(r"\w+", OpenCTI_query.split("node {", 1)[1]))
+
+	def get_node(index):
+		node = {
+			"id": str(index),
+			"entity_type": "IPv4-Addr",
+			"created_at": dataset_date(state, index),
+			"updated_at": dataset_date(state, index),
+			"observable_value": int_to_IPv4(DATASET_FIRST_IPv4 + index),
+			"x_opencti_score": state.score(index),
+			"creators": [],
+			"objectLabel": {"edges": []}
+		}
+		return {field: value for field, value in node.items() if field in OpenCTI_request_node_fields}
+
+	return {"data": {"stixCyberObservables": {
+		"pageInfo": OpenCTI_request_pageInfo,
+		"edges": [{"node": get_node(index)} for index in observables[page_start:page_end]]
+	}}}
+
+def start_server(state, latency, events_rate = 1000, QRadar_capacity = None):
+
+	"""
+	Function which start a stand-in server in background on a free local port.
+
+		Returns:
+			ThreadingHTTPServer: server started, its port is in server_address
+	"""
+
+	server = ThreadingHTTPServer(("127.0.0.1", 0), make_request_handler(state, latency, events_rate, QRadar_capacity))
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+def run_daemon_benchmark(state, events_count, timeout = 60):
+
+	"""
+	Function which send events in the live stream stand-in to a daemon consumer (see OpenCTI_QRadar.daemon()) and wait until QRadar referential is synchronized with them.
+
+		Parameters:
+			state (BenchmarkState): datas served by the servers, already synchronized
+			events_count (int): number of events sent
+			timeout (float): maximum wait in seconds after the last event
+
+		Returns:
+			float: duration in seconds between the connection to the live stream and the synchronization of the last event
+	"""
+
+	state.make_stream_events(events_count)
+	daemon_stop = threading.Event()
+	daemon_start = time.perf_counter()
+
+	OpenCTI_events_queue, OpenCTI_producer_stop = OpenCTI_QRadar.start_OpenCTI_stream_producer()
+	daemon_consumer = threading.Thread(target=OpenCTI_QRadar.consume_OpenCTI_stream, args=(OpenCTI_events_queue,), kwargs={"stop": daemon_stop}, daemon=True)
+	daemon_consumer.start()
+
+	# Wait for every event to be sent and written
+	daemon_deadline = None
+	while daemon_deadline is None or time.perf_counter() < daemon_deadline:
+		time.sleep(0.05)
+		with state.lock:
+			events_sent = len(state.stream_scores) > 0 and state.stream_events[-1][1] in state.stream_scores and state.stream_scores[state.stream_events[-1][1]] == state.stream_events[-1][2]
+		if events_sent:
+			if daemon_deadline is None:
+				daemon_deadline = time.perf_counter() + timeout
+			if state.check_QRadar_map(variables.QRadar_score_threshold) == 0:
+				break
+	daemon_duration = time.perf_counter() - daemon_start
+
+	daemon_stop.set()
+	OpenCTI_producer_stop.set()
+	state.stream_stop.set()
+	daemon_consumer.join()
+
+	return daemon_duration
+
+def run_verification_benchmark(state):
+
+	"""
+	Function which verify the whole QRadar referential twice with a new score cache (see OpenCTI_QRadar.verifiy_IPv4_score()), nothing is written in QRadar.
+	The first verification looks up every IPv4 in OpenCTI and fills the cache, the second one only reads the cache.
+
+		Parameters:
+			state (BenchmarkState): datas served by the servers, already synchronized
+
+		Returns:
+			dict: duration in seconds and number of OpenCTI requests of each verification, for example : {"cold cache": (1.2, 20), "warm cache": (0.1, 0)}
+	"""
+
+	verification_results = {}
+
+	with tempfile.TemporaryDirectory() as score_cache_directory:
+		OpenCTI_QRadar.score_cache.open(os.path.join(score_cache_directory, "score_cache.sqlite"), variables.score_cache_ttl, variables.score_cache_max_entries)
+		get_QRadar_IPv4_execution, QRadar_IPs = OpenCTI_QRadar.get_QRadar_IPv4(variables.QRadar_referential_name)
+
+		for verification in ["cold cache", "warm cache"]:
+			OpenCTI_requests_count = state.requests_count.get("graphql", 0)
+			verification_start = time.perf_counter()
+			OpenCTI_QRadar.verifiy_IPv4_score(QRadar_IPs, variables.QRadar_referential_name, plan_only = True)
+			verification_results[verification] = (time.perf_counter() - verification_start, state.requests_count.get("graphql", 0) - OpenCTI_requests_count)
+
+		OpenCTI_QRadar.score_cache.close()
+
+	return verification_results
+
+def run_benchmark(size, program_args):
+
+	"""
+	Function which run a synchronization against new stand-in servers and display its timings.
+
+		Parameters:
+			size (int): number of IPv4 in OpenCTI
+			program_args (argparse.Namespace): options of the benchmark
+
+		Returns:
+			dict: duration in seconds of each step of main() (see OpenCTI_QRadar.main())
+	"""
+
+	# With --cidr-set, the referential is synchronized with a reference set of CIDR blocks and a new CIDR index
+	CIDR_mapping, CIDR_index_directory = None, None
+	if program_args.cidr_set:
+		CIDR_mapping = {"type": "IPv4-Addr", "map": variables.QRadar_referential_name, "cidr_set": "BENCHMARK_CIDR"}
+		CIDR_index_directory = tempfile.TemporaryDirectory()
+		variables.sync_mappings = [CIDR_mapping]
+		variables.CIDR_index_file = os.path.join(CIDR_index_directory.name, "CIDR_index.json")
+
+	state = BenchmarkState(size, program_args.prefill, program_args.stale, CIDR_mapping)
+	QRadar_map_size = len(state.QRadar_map)
+	OpenCTI_server = start_server(state, program_args.OpenCTI_latency / 1000, program_args.events_rate)
+	QRadar_server = start_server(state, program_args.QRadar_latency / 1000, QRadar_capacity = program_args.QRadar_capacity)
+
+	variables.OpenCTI_URL = "http://127.0.0.1:{0}/graphql".format(OpenCTI_server.server_address[1])
+	variables.QRadar_URL = "http://127.0.0.1:{0}/api/{{0}}".format(QRadar_server.server_address[1])
+	variables.OpenCTI_stream_URL = "http://127.0.0.1:{0}/stream".format(OpenCTI_server.server_address[1])
+	if program_args.page_size is not None:
+		variables.OpenCTI_page_size = program_args.page_size
+	if program_args.QRadar_page_size is not None:
+		variables.QRadar_page_size = program_args.QRadar_page_size
+	if program_args.query_profile is not None:
+		variables.query_profile = program_args.query_profile
+	if program_args.no_compression:
+		variables.OpenCTI_compression = False
+	if program_args.QRadar_rate_limit is not None:
+		variables.HTTP_rate_limits = dict(variables.HTTP_rate_limits, QRadar=program_args.QRadar_rate_limit)
+
+	timings = {}
+	benchmark_start = time.perf_counter()
+	OpenCTI_QRadar.main(plan_only = program_args.plan_only, stream = program_args.stream, timings = timings, partitions = program_args.partitions)
+	benchmark_duration = time.perf_counter() - benchmark_start
+
+	if program_args.daemon_events > 0 and not program_args.plan_only:
+		timings["live stream convergence"] = run_daemon_benchmark(state, program_args.daemon_events)
+
+	verification_results = {}
+	if program_args.score_cache:
+		verification_results = run_verification_benchmark(state)
+		for verification, (verification_duration, OpenCTI_requests_count) in verification_results.items():
+			timings["verification, " + verification] = verification_duration
+
+	OpenCTI_server.shutdown()
+	QRadar_server.shutdown()
+
+	print(""" {0} IPv4 in OpenCTI, {1} IPv4 in QRadar """.format(size, QRadar_map_size).center(100, "="))
+	for step, duration in itertools.chain(timings.items(), [("total", benchmark_duration)]):
+		print(""" {0:<40} : {1:>8.2f} s ({2:.0f} IPv4/s) """.format(step, duration, size / duration if duration > 0 else 0))
+	print(""" Requests : {0} """.format(", ".join("{0} {1}".format(count, endpoint) for endpoint, count in sorted(state.requests_count.items()))))
+	print(""" OpenCTI responses : {0:.1f} kB """.format(state.OpenCTI_bytes_count / 1000))
+	if state.stream_latencies:
+		stream_latencies = sorted(state.stream_latencies)
+		print(""" Live stream propagation : {0} event(s), {1} write(s), p50 {2:.2f} s, p95 {3:.2f} s, max {4:.2f} s """.format(len(state.stream_events), len(stream_latencies), stream_latencies[len(stream_latencies) // 2], stream_latencies[len(stream_latencies) * 95 // 100], stream_latencies[-1]))
+	for verification, (verification_duration, OpenCTI_requests_count) in verification_results.items():
+		print(""" Verification of the referential with a {0} : {1} OpenCTI request(s) """.format(verification, OpenCTI_requests_count))
+	if CIDR_mapping is not None:
+		print(""" CIDR blocks in QRadar reference set : {0} managed, {1}/{2} foreign block(s) left untouched """.format(len(OpenCTI_QRadar.get_CIDR_blocks(CIDR_mapping)), len(state.QRadar_set.intersection(FOREIGN_CIDR_BLOCKS)), len(FOREIGN_CIDR_BLOCKS)))
+	if not program_args.plan_only:
+		print(""" Wrong entries in QRadar referential : {0} """.format(state.check_QRadar_map(variables.QRadar_score_threshold)))
+	if CIDR_index_directory is not None:
+		CIDR_index_directory.cleanup()
+
+	timings["total"] = benchmark_duration
+	return timings
+
+def check_args(arg_sizes):
+	for arg_size in arg_sizes:
+		if not 1000 <= arg_size <= 1000000:
+			raise argparse.ArgumentTypeError("1000 <= size <= 1000000")
+	return
+
+if __name__ == '__main__':
+
+	program_args = argument_parser.parse_args()
+	check_args(program_args.sizes)
+
+	# Only the errors of the synchronization are displayed, the benchmark prints its own report
+	OpenCTI_QRadar.configure_logging("ERRORONLY")
+
+	for size in program_args.sizes:
+		run_benchmark(size, program_args)
@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+class CheckpointJournal:
+
+	"""
+	Journal of the progress of a synchronization run, so a run stopped by an error is resumed by the next one instead of starting over.
+	Each OpenCTI page is appended to a JSON Lines file as soon as it is received, with the request it belongs to and the cursor it was requested after.
+	A resumed run replays the pages of each request and continues the pagination after their last cursor (see iterate_OpenCTI_pages()).
+
+	The writes in QRadar aren't journaled : a resumed run reads the referentials again and plans against them, so the chunks uploaded and the entries deleted before the error aren't planned again.
+	The journal is disabled until open() is called, the functions of the synchronization then record their progress through the run_checkpoint global.
+
+		Attributes:
+			journal_file (str): path of the journal (None if the journal is disabled)
+			run_key (str): parameters of the run, the journal of a run with other parameters isn't resumed
+			started_at (str): start date of the first attempt of the run ("" if the journal is disabled), for example : "2023-03-01T12:00:00.000Z"
+			resumed (bool): True if the journal of a previous attempt has been loaded
+			requests_pages (dict): pages of each request loaded from the journal, by request key
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.journal = None
+		self.journal_file = None
+		self.run_key = ""
+		self.started_at = ""
+		self.resumed = False
+		self.requests_pages = {}
+
+	def open(self, journal_file, run_key):
+
+		"""
+		Function which open the journal of a run, the journal of a previous attempt with the same parameters is loaded to be resumed.
+		A line truncated by an interruption is ignored.
+
+			Parameters:
+				journal_file (str): path of the journal
+				run_key (str): parameters of the run, for example : the dates and the observable types requested
+
+			Returns:
+				bool: True if execution is successful, False otherwise.
+				str: description of the error ("" if execution is successful)
+		"""
+
+		self.close()
+		self.started_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+		try:
+			if os.path.exists(journal_file):
+				self.load(journal_file, run_key)
+
+			# A new journal starts with the parameters of the run, the journal of a resumed run is completed
+			if self.resumed:
+				self.journal = open(journal_file, "a")
+				self.journal.write("\n")
+			else:
+				self.journal = open(journal_file, "w")
+				self.journal.write(json.dumps({"run": run_key, "started_at": self.started_at}) + "\n")
+			self.journal.flush()
+		except OSError as error:
+			self.close()
+			return False, str(error)
+
+		self.journal_file = journal_file
+		self.run_key = run_key
+		return True, ""
+
+	def load(self, journal_file, run_key):
+
+		"""
+		Function which load the pages of a journal if it has been written by a run with the same parameters.
+		The pages of a request are kept from its last first page, so a request walked again from the start doesn't replay its pages twice.
+		"""
+
+		with open(journal_file, "r") as journal:
+			for journal_line in journal:
+				try:
+					journal_record = json.loads(journal_line)
+				except ValueError:
+					continue
+
+				# The first line gives the parameters of the run
+				if "run" in journal_record:
+					if journal_record["run"] != run_key:
+						return
+					self.resumed = True
+					self.started_at = journal_record["started_at"]
+				elif self.resumed and "request" in journal_record:
+					if journal_record["after"] == "":
+						self.requests_pages[journal_record["request"]] = []
+					self.requests_pages.setdefault(journal_record["request"], []).append(journal_record["page"])
+
+	def request_key(self, observable_type, filters, profile):
+
+		"""
+		Function which returns the key of an OpenCTI request in the journal, a digest of the type, the filters and the fields requested.
+		"""
+
+		return hashlib.sha1(json.dumps([observable_type, filters, profile]).encode()).hexdigest()
+
+	def pages(self, request_key):
+
+		"""
+		Function which returns the pages of a request retrieved by the previous attempt, in the order of the pagination (an empty list if there is none).
+		The pages are only replayed once, they are dropped from the memory.
+		"""
+
+		with self.lock:
+			return self.requests_pages.pop(request_key, [])
+
+	def record_page(self, request_key, after, page):
+
+		"""
+		Function which append an OpenCTI page to the journal, nothing is done if the journal is disabled.
+
+			Parameters:
+				request_key (str): key of the request of the page (see request_key())
+				after (str): cursor after which the page has been requested ("" for the first page)
+				page (dict): "stixCyberObservables" part of the API response (see iterate_OpenCTI_pages())
+		"""
+
+		if self.journal is None:
+			return
+
+		journal_line = json.dumps({"request": request_key, "after": after, "page": page}) + "\n"
+		with self.lock:
+			self.journal.write(journal_line)
+			self.journal.flush()
+
+	def close(self, remove = False):
+
+		"""
+		Function which close the journal and disable it.
+
+			Parameters:
+				remove (bool): remove the journal file, when the run is over and doesn't need to be resumed
+		"""
+
+		with self.lock:
+			if self.journal is not None:
+				self.journal.close()
+				if remove:
+					try:
+						os.remove(self.journal_file)
+					except OSError:
+						pass
+			self.journal = None
+			self.journal_file = None
+			self.run_key = ""
+			self.started_at = ""
+			self.resumed = False
+			self.requests_pages = {}
+
+# Journal of the current run, shared by all the functions of the synchronization
+run_checkpoint = CheckpointJournal()
@@ -0,0 +1,218 @@
+import datetime
+import json
+import threading
+import time
+
+from atomic_file import write_file_atomically
+
+# Upper bounds in seconds of the buckets of the request latency histograms
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Prefix of the metrics names in the Prometheus textfile
+PROMETHEUS_PREFIX = "openctixqradar"
+
+# Description of the metrics, used by the HELP lines of the Prometheus textfile
+METRICS_HELP = {
+	"phase_duration_seconds": "Duration of each step of the synchronization",
+	"run_duration_seconds": "Duration of the whole synchronization",
+	"run_start_timestamp_seconds": "Start date of the synchronization",
+	"requests_total": "Number of API responses received, by status code",
+	"request_errors_total": "Number of API requests which didn't get a response",
+	"request_retries_total": "Number of API requests sent again after an error",
+	"request_backoff_seconds_total": "Time waited before the retries of the API requests",
+	"request_throttled_seconds_total": "Time waited by the API requests for the rate limiter",
+	"request_sent_bytes_total": "Size of the API request bodies",
+	"request_received_bytes_total": "Size of the API response bodies",
+	"request_duration_seconds": "Latency of the API requests, body download included",
+	"pages_total": "Number of pages read",
+	"IPv4_retrieved_total": "Number of IPv4 read in OpenCTI and QRadar",
+	"IPv4_planned_total": "Number of IPv4 of the synchronization plans, by action",
+	"IPv4_written_total": "Number of IPv4 uploaded or deleted in QRadar, by result",
+	"stream_events_total": "Number of events read in the OpenCTI live stream, by event type",
+	"stream_reconnections_total": "Number of reconnections to the OpenCTI live stream",
+	"score_cache_total": "Number of observables verified from the score cache (hit) or looked up in OpenCTI (miss)",
+	"CIDR_written_total": "Number of CIDR blocks uploaded or deleted in QRadar reference sets, by result"
+}
+
+class RunMetrics:
+
+	"""
+	Metrics of a synchronization run : durations of the steps, counters and latency histograms.
+	Every function is thread safe, so the metrics can be recorded by the workers of the concurrent requests.
+
+		Attributes:
+			start_time (float): start date of the run (epoch time)
+			phases (dict): duration in seconds of each step, for example : {"QRadar retrieval": 0.5}
+			counters (dict): value of each counter, the keys are the name and the labels of the counter
+			histograms (dict): buckets, sum and count of each histogram, the keys are the name and the labels of the histogram
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.start_time = time.time()
+		self.phases = {}
+		self.counters = {}
+		self.histograms = {}
+
+	def add_phases(self, phases):
+
+		"""
+		Function which record the duration of steps of the run.
+
+			Parameters:
+				phases (dict): duration in seconds of each step, for example : {"QRadar retrieval": 0.5}
+		"""
+
+		with self.lock:
+			self.phases.update(phases)
+
+	def increment(self, name, value = 1, **labels):
+
+		"""
+		Function which add a value to a counter.
+
+			Parameters:
+				name (str): name of the counter, for example : "requests_total"
+				value (int): value added to the counter
+				**labels: labels of the counter, for example : api="QRadar", method="DELETE"
+		"""
+
+		counter_key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			self.counters[counter_key] = self.counters.get(counter_key, 0) + value
+
+	def observe(self, name, value, buckets = REQUEST_DURATION_BUCKETS, **labels):
+
+		"""
+		Function which add a value to a histogram.
+
+			Parameters:
+				name (str): name of the histogram, for example : "request_duration_seconds"
+				value (float): value observed
+				buckets (tuple): upper bounds of the buckets (only used when the histogram is created)
+				**labels: labels of the histogram, for example : api="OpenCTI", method="POST"
+		"""
+
+		histogram_key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			if histogram_key not in self.histograms:
+				self.histograms[histogram_key] = {"buckets": {bucket: 0 for bucket in buckets}, "sum": 0, "count": 0}
+			histogram = self.histograms[histogram_key]
+			for bucket in histogram["buckets"].keys():
+				if value <= bucket:
+					histogram["buckets"][bucket] += 1
+			histogram["sum"] += value
+			histogram["count"] += 1
+
+	def summary(self):
+
+		"""
+		Function which returns the metrics as a JSON serializable run summary.
+
+			Returns:
+				dict: summary of the run :
+					{
+						"start": str,				start date of the run, for example : "2023-03-01T12:00:00"
+						"duration": float,			duration of the run in seconds
+						"phases": {str: float},		duration of each step
+						"counters": {str: [{"labels": {str: str}, "value": int}]},
+						"histograms": {str: [{"labels": {str: str}, "buckets": {str: int}, "sum": float, "count": int}]}
+					}
+		"""
+
+		with self.lock:
+			run_summary = {
+				"start": datetime.datetime.fromtimestamp(self.start_time).isoformat(timespec="seconds"),
+				"duration": time.time() - self.start_time,
+				"phases": dict(self.phases),
+				"counters": {},
+				"histograms": {}
+			}
+			for (name, labels), value in sorted(self.counters.items()):
+				run_summary["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+			for (name, labels), histogram in sorted(self.histograms.items()):
+				run_summary["histograms"].setdefault(name, []).append({
+					"labels": dict(labels),
+					"buckets": {str(bucket): count for bucket, count in histogram["buckets"].items()},
+					"sum": histogram["sum"],
+					"count": histogram["count"]
+				})
+
+		return run_summary
+
+	def to_Prometheus(self):
+
+		"""
+		Function which returns the metrics in the Prometheus text format, to be read by the textfile collector of node_exporter.
+
+			Returns:
+				str: metrics in the Prometheus text format
+		"""
+
+		run_summary = self.summary()
+		Prometheus_lines = []
+
+		def add_metric(name, metric_type, samples):
+			Prometheus_lines.append("# HELP {0}_{1} {2}".format(PROMETHEUS_PREFIX, name, METRICS_HELP.get(name, name)))
+			Prometheus_lines.append("# TYPE {0}_{1} {2}".format(PROMETHEUS_PREFIX, name, metric_type))
+			for sample_suffix, labels, value in samples:
+				Prometheus_lines.append("{0}_{1}{2}{3} {4}".format(PROMETHEUS_PREFIX, name, sample_suffix, format_Prometheus_labels(labels), value))
+
+		add_metric("run_start_timestamp_seconds", "gauge", [("", {}, self.start_time)])
+		add_metric("run_duration_seconds", "gauge", [("", {}, run_summary["duration"])])
+		add_metric("phase_duration_seconds", "gauge", [("", {"phase": phase}, duration) for phase, duration in run_summary["phases"].items()])
+
+		for name, counters in run_summary["counters"].items():
+			add_metric(name, "counter", [("", counter["labels"], counter["value"]) for counter in counters])
+
+		for name, histograms in run_summary["histograms"].items():
+			samples = []
+			for histogram in histograms:
+				for bucket, count in histogram["buckets"].items():
+					samples.append(("_bucket", dict(histogram["labels"], le=bucket), count))
+				samples.append(("_bucket", dict(histogram["labels"], le="+Inf"), histogram["count"]))
+				samples.append(("_sum", histogram["labels"], histogram["sum"]))
+				samples.append(("_count", histogram["labels"], histogram["count"]))
+			add_metric(name, "histogram", samples)
+
+		return "\n".join(Prometheus_lines) + "\n"
+
+	def write(self, metrics_file, metrics_format = "json"):
+
+		"""
+		Function which export the metrics in a file.
+		The file is replaced atomically, so a collector never reads a partial file.
+
+			Parameters:
+				metrics_file (str): path of the file
+				metrics_format (str): "json" for a run summary or "prometheus" for a Prometheus textfile
+
+			Returns:
+				bool: True if execution is successful, False otherwise.
+				str: description of the error ("" if execution is successful)
+		"""
+
+		try:
+			if metrics_format == "prometheus":
+				write_file_atomically(metrics_file, self.to_Prometheus())
+			else:
+				write_file_atomically(metrics_file, json.dumps(self.summary(), indent=2))
+		except OSError as error:
+			return False, str(error)
+
+		return True, ""
+
+def format_Prometheus_labels(labels):
+
+	"""
+	Function which format the labels of a Prometheus sample, for example : {api="QRadar",method="DELETE"}
+	"""
+
+	if len(labels) == 0:
+		return ""
+
+	escaped_labels = ('{0}="{1}"'.format(label, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for label, value in labels.items())
+	return "{" + ",".join(escaped_labels) + "}"
+
+# Metrics of the current run, shared by all the functions of the synchronization
+run_metrics = RunMetrics()
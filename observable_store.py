@@ -0,0 +1,120 @@
+from IPv4_store import IPv4ScoreStore
+
+class ObservableScoreStore:
+
+	"""
+	Store of observables and their score, for the types which can't be kept as integers like IPv4 (IPv6, domains, URLs, file hashes...).
+	It has the same functions as IPv4ScoreStore, so the synchronization functions work with both stores.
+
+		Attributes:
+			scores (dict): score of each observable, for example : {"example.com": 50}
+			updated_at (str): last update date of the observables added ("" if unknown), for example : "2023-03-01T12:00:00.000Z"
+	"""
+
+	def __init__(self, observables = None):
+
+		"""
+			Parameters:
+				observables (dict): observables and their score to add in the store, for example : {"example.com": 50}
+		"""
+
+		self.scores = {}
+		self.updated_at = ""
+
+		if observables is not None:
+			for observable, score in observables.items():
+				self.add(observable, score)
+
+	def add(self, observable, score, updated_at = ""):
+
+		"""
+		Function which add an observable in the store (its score is replaced if it is already in the store).
+
+			Parameters:
+				observable (str): value of the observable, for example : "example.com"
+				score (int or str): score of the observable, for example : 50
+				updated_at (str): last update date of the observable ("" if unknown)
+
+			Returns:
+				bool: True if the observable is added, False if it has no value
+		"""
+
+		if not isinstance(observable, str) or observable == "":
+			return False
+
+		self.scores[observable] = int(score)
+
+		if updated_at and updated_at > self.updated_at:
+			self.updated_at = updated_at
+
+		return True
+
+	def __len__(self):
+		return len(self.scores)
+
+	def __contains__(self, observable):
+		return observable in self.scores
+
+	def __iter__(self):
+		return self.keys()
+
+	def get(self, observable, default = None):
+		return self.scores.get(observable, default)
+
+	def keys(self):
+		return iter(self.scores.keys())
+
+	def items(self):
+		return iter(self.scores.items())
+
+	def update(self, other):
+
+		"""
+		Function which add all the entries of another store, the scores of the other store win.
+		"""
+
+		self.scores.update(other.items())
+		self.updated_at = max(self.updated_at, other.updated_at)
+
+	def difference(self, other):
+
+		"""
+		Function which returns a new store with the entries of this store which aren't in the other store.
+		"""
+
+		return ObservableScoreStore({observable: score for observable, score in self.scores.items() if observable not in other})
+
+	def intersection(self, other):
+
+		"""
+		Function which returns a new store with the entries of this store which are in the other store (with the scores of this store).
+		"""
+
+		return ObservableScoreStore({observable: score for observable, score in self.scores.items() if observable in other})
+
+	def join(self, other, outer = False):
+
+		"""
+		Generator which walks this store and yields the score of each observable in the other one (see IPv4ScoreStore.join()).
+		"""
+
+		for observable, score in self.scores.items():
+			other_score = other.get(observable)
+			if other_score is not None or outer:
+				yield observable, score, other_score
+
+def new_score_store(observable_type = "IPv4-Addr"):
+
+	"""
+	Function which returns an empty store for an OpenCTI observable type, IPv4 are kept in the compact IPv4ScoreStore.
+
+		Parameters:
+			observable_type (str): OpenCTI type of the observables, for example : "IPv4-Addr", "Domain-Name"
+
+		Returns:
+			IPv4ScoreStore or ObservableScoreStore: empty store
+	"""
+
+	if observable_type == "IPv4-Addr":
+		return IPv4ScoreStore()
+	return ObservableScoreStore()
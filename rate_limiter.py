@@ -0,0 +1,112 @@
+import threading
+import time
+
+class AdaptiveRateLimiter:
+
+	"""
+	Rate limiter of the requests sent to an API, every request waits for it before being sent (see send_request()).
+	A token bucket bounds the number of requests per second, with bursts of at most burst requests.
+	The number of requests in flight adapts to the API like the TCP congestion control (AIMD) : it grows by one every concurrency successful requests,
+	and it is halved when a request ends with a congestion (error code 429 or 5xx, connection error, timeout or latency above latency_target).
+	Once back just below the number of requests in flight of the last congestion, it stays there for recovery_time seconds before probing the API again.
+	The API can also pause all the requests, when it answers with a Retry-After header.
+
+		Attributes:
+			rate (float): maximum number of requests per second (None for no limit)
+			burst (int): maximum number of requests sent at once after an idle period
+			concurrency (float): current maximum number of requests in flight
+			max_concurrency (int): maximum number of requests in flight when the API isn't congested
+			latency_target (float): latency in seconds above which the API is considered congested (None to only react to the errors)
+			congested_concurrency (float): maximum number of requests in flight of the last congestion (None if there has been no congestion)
+			recovery_time (float): duration in seconds after a congestion during which the number of requests in flight stays below the one of the congestion
+			in_flight (int): number of requests in flight
+	"""
+
+	def __init__(self, rate = None, burst = 1, max_concurrency = 10, latency_target = None, recovery_time = 30):
+		self.condition = threading.Condition()
+		self.rate = rate
+		self.burst = max(1, burst)
+		self.tokens = self.burst
+		self.refilled_at = time.monotonic()
+		self.paused_until = 0
+		self.concurrency = max_concurrency
+		self.max_concurrency = max_concurrency
+		self.latency_target = latency_target
+		self.congested_concurrency = None
+		self.recovery_time = recovery_time
+		self.decreased_at = 0
+		self.in_flight = 0
+
+	def acquire(self):
+
+		"""
+		Function which wait until a request can be sent, then count it in flight.
+
+			Returns:
+				float: duration in seconds of the wait
+		"""
+
+		wait_start = time.monotonic()
+
+		with self.condition:
+			while True:
+				now = time.monotonic()
+
+				# Refill the bucket with the tokens earned since the last refill
+				if self.rate is not None:
+					self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+				self.refilled_at = now
+
+				# Wait for the end of a pause, for a request to end or for the next token (None waits for a release)
+				if now < self.paused_until:
+					wait = self.paused_until - now
+				elif self.in_flight >= int(self.concurrency):
+					wait = None
+				elif self.rate is not None and self.tokens < 1:
+					wait = (1 - self.tokens) / self.rate
+				else:
+					if self.rate is not None:
+						self.tokens -= 1
+					self.in_flight += 1
+					return now - wait_start
+
+				self.condition.wait(wait)
+
+	def release(self, latency, congested = False):
+
+		"""
+		Function which count the end of a request and adapt the number of requests in flight to its outcome.
+
+			Parameters:
+				latency (float): duration in seconds of the request
+				congested (bool): True if the request ended with an error telling that the API is overloaded
+		"""
+
+		with self.condition:
+			self.in_flight -= 1
+			now = time.monotonic()
+
+			if congested or (self.latency_target is not None and latency > self.latency_target):
+				# The requests in flight at the same time see the same congestion, so it is only halved once per latency
+				if now - self.decreased_at > latency:
+					self.congested_concurrency = self.concurrency
+					self.concurrency = max(1, self.concurrency / 2)
+					self.decreased_at = now
+			# After a congestion, the API is only probed again beyond the number of requests in flight of the congestion once recovery_time has passed
+			elif self.congested_concurrency is None or self.concurrency + 1 < self.congested_concurrency or now - self.decreased_at >= self.recovery_time:
+				self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+			self.condition.notify_all()
+
+	def pause(self, delay):
+
+		"""
+		Function which pause the requests of the API, for example when it answers with a Retry-After header.
+
+			Parameters:
+				delay (float): duration in seconds of the pause
+		"""
+
+		with self.condition:
+			self.paused_until = max(self.paused_until, time.monotonic() + delay)
+			self.condition.notify_all()
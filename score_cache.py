@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+
+from observable_store import new_score_store
+
+class ScoreCache:
+
+	"""
+	On-disk cache of the OpenCTI scores of the observables, in a SQLite database kept between the runs.
+	Every observable retrieved in OpenCTI is recorded with the date of the retrieval, and the verification only looks up in OpenCTI the entries of QRadar which are unknown or older than the TTL.
+	The entries older than the TTL are removed, then the oldest ones while the cache has more than max_entries entries (see evict()).
+	The eviction runs when the cache is closed, and on each reconciliation of the daemon mode which keeps the cache open (see consume_OpenCTI_stream()).
+
+	The cache is disabled until open() is called, the functions of the synchronization then use it through the score_cache global.
+
+		Attributes:
+			connection (sqlite3.Connection): connection to the database (None if the cache is disabled)
+			ttl (float): duration in seconds during which a score is considered up to date
+			max_entries (int): maximum number of entries kept in the cache
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.connection = None
+		self.ttl = 0
+		self.max_entries = 0
+
+	def open(self, cache_file, ttl, max_entries):
+
+		"""
+		Function which open the cache, the database is created if it doesn't exist.
+
+			Parameters:
+				cache_file (str): path of the database
+				ttl (float): duration in seconds during which a score is considered up to date
+				max_entries (int): maximum number of entries kept in the cache
+
+			Returns:
+				bool: True if execution is successful, False otherwise.
+				str: description of the error ("" if execution is successful)
+		"""
+
+		self.close()
+
+		try:
+			connection = sqlite3.connect(cache_file, check_same_thread=False)
+			# A cache lost by a crash is only filled again, so the writes don't wait for the disk
+			connection.execute("PRAGMA journal_mode=WAL")
+			connection.execute("PRAGMA synchronous=NORMAL")
+			# The score is NULL for an observable which doesn't exist in OpenCTI
+			connection.execute("CREATE TABLE IF NOT EXISTS scores (type TEXT NOT NULL, value TEXT NOT NULL, score INTEGER, checked_at REAL NOT NULL, PRIMARY KEY (type, value))")
+			connection.execute("CREATE INDEX IF NOT EXISTS scores_checked_at ON scores (checked_at)")
+			connection.commit()
+		except sqlite3.Error as error:
+			return False, str(error)
+
+		self.connection = connection
+		self.ttl = ttl
+		self.max_entries = max_entries
+		return True, ""
+
+	def get_fresh(self, IPs, observable_type = "IPv4-Addr"):
+
+		"""
+		Function which returns the scores of the cache checked less than ttl seconds ago, for the observables of a store.
+
+			Parameters:
+				IPs (IPv4ScoreStore or ObservableScoreStore): observables looked up in the cache
+				observable_type (str): OpenCTI type of the observables
+
+			Returns:
+				IPv4ScoreStore or ObservableScoreStore: observables of the cache with their OpenCTI score
+				IPv4ScoreStore or ObservableScoreStore: observables of the cache which don't exist in OpenCTI
+		"""
+
+		IPs_cached = new_score_store(observable_type)
+		IPs_cached_missing = new_score_store(observable_type)
+
+		if self.connection is None:
+			return IPs_cached, IPs_cached_missing
+
+		# The cache is only an optimization, the observables are looked up in OpenCTI if it can't be read
+		with self.lock:
+			try:
+				for observable_value, observable_score in self.connection.execute("SELECT value, score FROM scores WHERE type = ? AND checked_at >= ?", (observable_type, time.time() - self.ttl)):
+					if observable_value not in IPs:
+						continue
+					if observable_score is None:
+						IPs_cached_missing.add(observable_value, 0)
+					else:
+						IPs_cached.add(observable_value, observable_score)
+			except sqlite3.Error:
+				return new_score_store(observable_type), new_score_store(observable_type)
+
+		return IPs_cached, IPs_cached_missing
+
+	def put(self, observables, observables_missing = (), observable_type = "IPv4-Addr"):
+
+		"""
+		Function which record the scores retrieved in OpenCTI, nothing is done if the cache is disabled.
+
+			Parameters:
+				observables (iterable): observables retrieved with their score, for example : [("127.0.0.1", 50)]
+				observables_missing (iterable): observables looked up which don't exist in OpenCTI, for example : ["127.0.0.2"]
+				observable_type (str): OpenCTI type of the observables
+
+			Returns:
+				bool: True if execution is successful, False otherwise (the scores are retrieved again on the next run).
+		"""
+
+		if self.connection is None:
+			return True
+
+		checked_at = time.time()
+		with self.lock:
+			try:
+				self.connection.executemany("INSERT OR REPLACE INTO scores (type, value, score, checked_at) VALUES (?, ?, ?, ?)", ((observable_type, observable_value, observable_score, checked_at) for observable_value, observable_score in observables))
+				self.connection.executemany("INSERT OR REPLACE INTO scores (type, value, score, checked_at) VALUES (?, ?, NULL, ?)", ((observable_type, observable_value, checked_at) for observable_value in observables_missing))
+				self.connection.commit()
+			except sqlite3.Error:
+				self.connection.rollback()
+				return False
+
+		return True
+
+	def evict(self):
+
+		"""
+		Function which remove the entries older than the TTL, then the oldest entries beyond max_entries.
+
+			Returns:
+				int: number of entries removed
+		"""
+
+		if self.connection is None:
+			return 0
+
+		with self.lock:
+			try:
+				entries_removed = self.connection.execute("DELETE FROM scores WHERE checked_at < ?", (time.time() - self.ttl,)).rowcount
+				entries_count = self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+				if entries_count > self.max_entries:
+					entries_removed += self.connection.execute("DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY checked_at LIMIT ?)", (entries_count - self.max_entries,)).rowcount
+				self.connection.commit()
+			except sqlite3.Error:
+				self.connection.rollback()
+				return 0
+
+		return entries_removed
+
+	def close(self):
+
+		"""
+		Function which evict the old entries and close the cache.
+		"""
+
+		if self.connection is None:
+			return
+
+		self.evict()
+		with self.lock:
+			self.connection.close()
+			self.connection = None
+
+# Cache of the OpenCTI scores, shared by all the functions of the synchronization
+score_cache = ScoreCache()
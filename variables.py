@@ -2,6 +2,125 @@ OpenCTI_URL = """https://demo.opencti.io/graphql"""
 QRadar_URL = """https://192.168.1.174/api/{0}"""
 QRadar_referential_name = "TEST_IP"
 
+# Other QRadar consoles which can be written by the mappings, the console of QRadar_URL is the "default" one
+# The token of a console is read in the variable of secrets.py given by "token"
+QRadar_instances = {
+    # "tenant_b": {"URL": """https://192.168.1.175/api/{0}""", "token": "QRadar_TOKEN_tenant_b"},
+}
+
+# OpenCTI observable types synchronized and their QRadar referentials, the types are synchronized concurrently
+# A type can be written in several referentials from a single OpenCTI retrieval, each one on its QRadar console ("instance", "default" by default)
+# and with its own score threshold ("threshold", QRadar_score_threshold by default)
+# An IPv4-Addr mapping can aggregate the contiguous IPv4 with the same score in CIDR blocks written in a QRadar reference set of element type CIDR ("cidr_set"),
+# the blocks of at least "cidr_min_size" IPv4 (CIDR_min_size by default) are written in the reference set and the other IPv4 in the referential
+sync_mappings = [
+    {"type": "IPv4-Addr", "map": QRadar_referential_name},
+    # {"type": "IPv4-Addr", "map": "Malicious - IP high", "threshold": 80},
+    # {"type": "IPv4-Addr", "map": "Malicious - IP dense", "cidr_set": "Malicious - CIDR", "cidr_min_size": 16},
+    # {"type": "IPv4-Addr", "map": QRadar_referential_name, "instance": "tenant_b"},
+    # {"type": "IPv6-Addr", "map": "Malicious - IPv6"},
+    # {"type": "Domain-Name", "map": "Malicious - Domain"},
+    # {"type": "Url", "map": "Malicious - URL"},
+    # {"type": "StixFile", "map": "Malicious - File hash"},
+]
+
+# File storing the last update date synchronized by the incremental mode
+watermark_file = "openctixqradar_watermark.json"
+
+# Minimum and maximum number of IPv4 of a CIDR block written in a reference set (16 for a /28, 65536 for a /16), and file storing the score of the blocks written, which makes them reversible to their IPv4
+# Only the blocks of this file are managed, the other blocks of the reference sets (and the blocks larger than CIDR_max_size) are never expanded nor deleted
+CIDR_min_size = 16
+CIDR_max_size = 65536
+CIDR_index_file = "openctixqradar_cidr_index.json"
+
+# Journal of the OpenCTI pages retrieved by a run, kept after an error so the next run resumes it (see the checkpoint argument)
+checkpoint_file = "openctixqradar_checkpoint.jsonl"
+
+# Cache of the OpenCTI scores kept between the runs (None to disable it), duration in seconds during which a cached score is up to date and maximum number of entries kept
+# The verification only looks up in OpenCTI the observables of QRadar which aren't in the cache or are older than the TTL
+score_cache_file = "openctixqradar_score_cache.sqlite"
+score_cache_ttl = 24 * 3600
+score_cache_max_entries = 1000000
+
+# IPv4 with an OpenCTI score bellow or equal this threshold are not kept in QRadar referential
+QRadar_score_threshold = 50
+
+# Delete IPv4 of QRadar referential which don't exist in OpenCTI anymore during the verification
+# They are only counted as "missing" in the plan by default, as the referential can also hold entries added by hand or by other feeds
+QRadar_delete_missing = False
+
+# Number of observables requested per page in OpenCTI
+OpenCTI_page_size = 500
+
+# Ask OpenCTI for gzip compressed responses
+OpenCTI_compression = True
+
+# Number of time windows in which an OpenCTI request is split (1 to walk a single cursor chain) and number of windows retrieved at the same time
+OpenCTI_partitions = 1
+OpenCTI_partitions_workers = 8
+
+# Maximum number of IPv4 looked up per OpenCTI request during the verification and number of requests sent at the same time
+OpenCTI_verify_batch_size = 500
+OpenCTI_verify_workers = 4
+
+# Size of the connection pool of each API session and timeout of the requests in seconds (connection, read)
+HTTP_pool_size = 10
+HTTP_timeout = (10, 300)
+
+# Wait in seconds before the first retry of a request in error (connection error, timeout, error code 429 or 5xx), it doubles at each retry with a random jitter up to HTTP_backoff_max
+# A Retry-After header of the API is respected up to HTTP_backoff_max, and it pauses all the requests of the API
+HTTP_backoff_base = 0.5
+HTTP_backoff_max = 30
+
+# Maximum number of requests per second of each API (None for no limit) and number of requests which can be sent at once after an idle period, each QRadar console has its own limit
+HTTP_rate_limits = {"OpenCTI": None, "QRadar": None}
+HTTP_rate_burst = 10
+
+# Latency in seconds above which an API is considered overloaded (None to only react to the errors) : the number of requests in flight is halved, then it grows again by one up to HTTP_pool_size
+HTTP_latency_target = 30
+
+# Number of retries of an OpenCTI page and of a QRadar referential page in error
+OpenCTI_retries = 3
+QRadar_read_retries = 3
+
+# Number of entries requested per page when reading a QRadar referential
+QRadar_page_size = 10000
+
+# Number of QRadar deletions sent at the same time and number of retries of a deletion in error
+QRadar_delete_workers = 8
+QRadar_delete_retries = 2
+
+# Maximum number of IPv4 per QRadar upload chunk, number of chunks uploaded at the same time and number of retries of a chunk in error
+QRadar_upload_batch_size = 5000
+QRadar_upload_workers = 4
+QRadar_upload_retries = 2
+
+# Maximum number of OpenCTI pages waiting to be synchronized in QRadar in streaming mode
+pipeline_queue_size = 8
+
+# URL of the OpenCTI live stream read by the daemon mode, and timeout of its connection in seconds (connection, wait between two heartbeats)
+OpenCTI_stream_URL = """https://demo.opencti.io/stream"""
+OpenCTI_stream_timeout = (10, 60)
+
+# OpenCTI type of the STIX objects of the live stream, and the hashes used as value of the files (by order of preference)
+stream_types = {
+    "ipv4-addr": "IPv4-Addr",
+    "ipv6-addr": "IPv6-Addr",
+    "domain-name": "Domain-Name",
+    "url": "Url",
+    "file": "StixFile"
+}
+stream_file_hashes = ["SHA-256", "SHA-1", "MD5"]
+
+# Daemon mode : maximum number of observables per micro batch, maximum wait in seconds of an event before its batch is written,
+# maximum number of events waiting in memory, delay in seconds before reconnecting to the live stream and interval in seconds between two full verifications
+daemon_batch_size = 1000
+daemon_batch_interval = 2
+daemon_queue_size = 10000
+daemon_reconnect_delay = 10
+daemon_reconcile_interval = 6 * 3600
+
+
 QRadar_headers = """{{
     'SEC':'{0}',
     'Content-Type':'application/json',
@@ -11,42 +130,54 @@ QRadar_headers = """{{
 query_IPv4 = """query {{
   stixCyberObservables (
     after: "{0}"
-    types: ["IPv4-Addr"]
+    first: {2}
+    types: {5}
     orderBy: created_at
     orderMode: desc
     filters: [{1}]
   )
   {{
     pageInfo {{
-      startCursor
       endCursor
-      hasNextPage
-      hasPreviousPage
-      globalCount
+      hasNextPage{3}
     }}
     edges {{
       node {{
-        id
+{4}
+      }}
+    }}
+  }}
+}}"""
+
+# Fields of pageInfo only requested on the first page of a request, globalCount can be expensive to compute for OpenCTI
+query_IPv4_first_page_fields = """
+      globalCount"""
+
+# Fields of the observables requested by each query profile :
+# "sync" only requests the fields read by the synchronization, "full" adds the labels and creators for label-based filtering
+query_profile = "sync"
+query_profiles = {
+    "sync": """        observable_value
+        x_opencti_score
+        updated_at""",
+    "full": """        id
         entity_type
         created_at
         updated_at
         observable_value
         x_opencti_score
-        creators {{
+        creators {
           entity_type
           name
-        }}
-        objectLabel {{
-          edges {{
-            node {{
+        }
+        objectLabel {
+          edges {
+            node {
               value
-            }}
-          }}
-        }}
-      }}
-    }}
-  }}
-}}"""
+            }
+          }
+        }"""
+}
 
 default_query_filter = """{{
         filterMode: and
@@ -60,4 +191,18 @@ IP_query_filter = """{{
         values: {0}
         operator: "eq"
         key: value
+      }}"""
+
+incremental_query_filter = """{{
+        filterMode: and
+        values: "{0}"
+        operator: "gte"
+        key: updated_at
+      }}"""
+
+window_query_filter = """{{
+        filterMode: and
+        values: "{2}"
+        operator: "{1}"
+        key: {0}
       }}"""
\ No newline at end of file